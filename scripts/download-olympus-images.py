@@ -8,6 +8,8 @@ import sys
 import os
 import json
 import time
+import shutil
+import tempfile
 from pathlib import Path
 
 # Add parent directory to path to import scrapers
@@ -45,41 +47,53 @@ def download_image(url, output_path):
         return False
 
 def process_image(input_path, output_path, size="800x600"):
-    """Resize and format image using ImageMagick"""
+    """Resize and format one image with ImageMagick (fallback when Pillow is missing)"""
     try:
-        from PIL import Image
-        img = Image.open(input_path)
-        # Resize maintaining aspect ratio, then crop to exact size
-        img.thumbnail((800, 600), Image.Resampling.LANCZOS)
-        # Create new image with white background
-        new_img = Image.new('RGB', (800, 600), 'white')
-        # Paste centered
-        x = (800 - img.width) // 2
-        y = (600 - img.height) // 2
-        new_img.paste(img, (x, y))
-        new_img.save(output_path, 'PNG', quality=95)
+        import subprocess
+        cmd = ['magick', 'convert', input_path, '-resize', f'{size}^', 
+               '-gravity', 'center', '-extent', size, 
+               '-background', 'white', '-quality', '90', output_path]
+        subprocess.run(cmd, check=True, capture_output=True)
         print(f"  ✓ Processed: {output_path}")
         return True
-    except ImportError:
-        # Fallback to ImageMagick command line
-        try:
-            import subprocess
-            cmd = ['magick', 'convert', input_path, '-resize', f'{size}^', 
-                   '-gravity', 'center', '-extent', size, 
-                   '-background', 'white', '-quality', '90', output_path]
-            subprocess.run(cmd, check=True, capture_output=True)
-            print(f"  ✓ Processed: {output_path}")
-            return True
-        except Exception as e:
-            print(f"  ✗ Error processing image: {e}")
-            # Just copy the file if processing fails
-            import shutil
-            shutil.copy(input_path, output_path)
-            return False
     except Exception as e:
         print(f"  ✗ Error processing image: {e}")
+        # Just copy the file if processing fails
+        shutil.copy(input_path, output_path)
         return False
 
+def process_images(jobs, work_dir, size="800x600"):
+    """Resize and format downloaded images in one image pipeline run
+    
+    Each source is decoded once (JPEG draft mode) and the sources are
+    processed across a process pool; falls back to ImageMagick one image at
+    a time when Pillow is missing.
+    
+    Args:
+        jobs: List of (input_path, output_path)
+        work_dir: Scratch directory for the pipeline's hash-named outputs (removed by the caller)
+    
+    Returns:
+        List of output paths that were written
+    """
+    from buyee_image_pipeline import run_pipeline, PIL_AVAILABLE
+    if not PIL_AVAILABLE:
+        return [output_path for input_path, output_path in jobs if process_image(input_path, output_path, size)]
+    
+    width, height = (int(v) for v in size.split('x'))
+    # Resize maintaining aspect ratio, centered on a white background
+    variants = {'mockup': (width, height, 'pad', 'PNG')}
+    results = run_pipeline([str(input_path) for input_path, _ in jobs], out_dir=str(work_dir), variants=variants)
+    written = []
+    for (input_path, output_path), result in zip(jobs, results):
+        if result is None:
+            print(f"  ✗ Error processing image: {input_path}")
+            continue
+        shutil.copyfile(result['variants']['mockup'], output_path)
+        print(f"  ✓ Processed: {output_path}")
+        written.append(output_path)
+    return written
+
 def main():
     """Main function to find and download Olympus OM-1N images"""
     search_term = "Olympus OM-1N"
@@ -179,7 +193,7 @@ def main():
     # Download first 4 images (or use first image 4 times if only 1 available)
     images_to_download = all_images[:4] if len(all_images) >= 4 else [all_images[0]] * 4
     
-    image_files = []
+    jobs = []
     for i, img_url in enumerate(images_to_download, 1):
         if i == 1:
             filename = "olympus-om1n.png"
@@ -191,11 +205,14 @@ def main():
         
         # Download
         if download_image(img_url, temp_file):
-            # Process (resize and format)
-            if process_image(temp_file, final_file):
-                image_files.append(final_file)
-                # Clean up temp file
-                temp_file.unlink()
+            jobs.append((temp_file, final_file))
+    
+    # Process (resize and format) all downloads in one pipeline run
+    with tempfile.TemporaryDirectory() as work_dir:
+        image_files = process_images(jobs, Path(work_dir))
+    for temp_file, _ in jobs:
+        # Clean up temp files
+        temp_file.unlink()
     
     print("")
     print("=" * 60)
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Buyee Listing Archive
+
+Columnar (Parquet) archive of normalized listings for price-history analytics.
+
+Each run's listings are appended to a Hive-partitioned dataset:
+    {ARCHIVE_DIR}/date=2026-01-14/shop_name=Mercari/part-<run_id>-0.parquet
+
+Columns are typed (prices as float64, bids as int32, closing time as a
+timestamp) so history can be scanned without re-parsing JSON strings.
+read_archive() pushes filters on date, shop_name (partition pruning) and
+listing_id (row-group statistics) down into the Parquet reader.
+
+Requires pyarrow (pip install pyarrow).
+
+Used by:
+- buyee_details.py (when ARCHIVE_ENABLED is True)
+
+Can also be run directly to archive an existing results file:
+    python buyee_archive.py validation/results/buyee_details_results.json
+"""
+
+import re
+import sys
+import json
+import uuid
+import argparse
+from datetime import datetime, timezone, timedelta
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+from buyee_listing import result_listings
+from buyee_utils import ARCHIVE_DIR, log_info, log_warning, log_error
+
+JST = timezone(timedelta(hours=9))
+
+# "2026.01.20 22:15:00", "2026/01/20 22:15", "2026-01-20 22:15 JST"
+CLOSING_TIME_RE = re.compile(r'(\d{4})[./-](\d{1,2})[./-](\d{1,2})\D+(\d{1,2}):(\d{2})(?::(\d{2}))?')
+BIDS_RE = re.compile(r'\d+')
+
+def archive_schema():
+    """Schema of the data columns (partition columns are added by the dataset)"""
+    return pa.schema([
+        ('run_id', pa.string()),
+        ('scraped_at', pa.timestamp('s', tz='UTC')),
+        ('listing_id', pa.string()),
+        ('title', pa.string()),
+        ('listing_url', pa.string()),
+        ('image_url', pa.string()),
+        ('price', pa.float64()),
+        ('currency', pa.string()),
+        ('price_reference', pa.float64()),
+        ('current_price', pa.float64()),
+        ('buyout_price', pa.float64()),
+        ('bids', pa.int32()),
+        ('status', pa.string()),
+        ('closing_time', pa.timestamp('s', tz='Asia/Tokyo')),
+    ])
+
+def partitioning():
+    """Hive partitioning on date (YYYY-MM-DD) and shop_name"""
+    return ds.partitioning(
+        pa.schema([('date', pa.string()), ('shop_name', pa.string())]),
+        flavor='hive'
+    )
+
+def parse_closing_time(text):
+    """Parse a scraped JST closing time string into an aware datetime (or None)"""
+    if not text:
+        return None
+    match = CLOSING_TIME_RE.search(text)
+    if not match:
+        return None
+    year, month, day, hour, minute, second = match.groups()
+    try:
+        return datetime(int(year), int(month), int(day), int(hour), int(minute),
+                        int(second or 0), tzinfo=JST)
+    except ValueError:
+        return None
+
+def parse_bids(text):
+    """Parse a scraped bid count ("3", "3 bids") into an int (or None)"""
+    if text is None:
+        return None
+    if isinstance(text, int):
+        return text
+    match = BIDS_RE.search(str(text))
+    return int(match.group(0)) if match else None
+
+def listings_to_table(listings, run_id, scraped_at):
+    """Build an Arrow table (data + partition columns) from normalized listings
+
+    Expects listings that went through buyee_prices.normalize_listing_prices.
+    """
+    scraped_at = scraped_at.astimezone(timezone.utc)
+    date = scraped_at.strftime('%Y-%m-%d')
+    columns = {name: [] for name in archive_schema().names}
+    columns['date'] = []
+    columns['shop_name'] = []
+
+    for listing in listings:
+        columns['run_id'].append(run_id)
+        columns['scraped_at'].append(scraped_at)
+        columns['listing_id'].append(listing.get('listing_id'))
+        columns['title'].append(listing.get('title'))
+        columns['listing_url'].append(listing.get('listing_url'))
+        columns['image_url'].append(listing.get('image_url'))
+        columns['price'].append(listing.get('price_amount'))
+        columns['currency'].append(listing.get('price_currency'))
+        columns['price_reference'].append(listing.get('price_reference'))
+        columns['current_price'].append(listing.get('current_price_amount'))
+        columns['buyout_price'].append(listing.get('buyout_price_amount'))
+        columns['bids'].append(parse_bids(listing.get('number_of_bids')))
+        columns['status'].append(listing.get('status'))
+        columns['closing_time'].append(parse_closing_time(listing.get('closing_time_jst')))
+        columns['date'].append(date)
+        columns['shop_name'].append(listing.get('shop_name') or 'Unknown')
+
+    schema = archive_schema().append(pa.field('date', pa.string())).append(pa.field('shop_name', pa.string()))
+    return pa.table(columns, schema=schema)
+
+def append_run(listings, archive_dir=ARCHIVE_DIR, scraped_at=None, run_id=None):
+    """Append one run's listings to the archive
+
+    Args:
+        listings: Normalized listing dicts (any iterable; read once)
+        archive_dir: Dataset root directory
+        scraped_at: Run timestamp (defaults to now); determines the date partition
+        run_id: Unique run identifier (defaults to a timestamp + random suffix)
+
+    Returns:
+        run_id, or None if nothing was written
+    """
+    if not PYARROW_AVAILABLE:
+        log_warning("pyarrow not installed - skipping archive. Install with: pip install pyarrow")
+        return None
+
+    scraped_at = scraped_at or datetime.now(timezone.utc)
+    if scraped_at.tzinfo is None:
+        scraped_at = scraped_at.astimezone()
+    run_id = run_id or f"{scraped_at.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+    table = listings_to_table(listings, run_id, scraped_at)
+    if table.num_rows == 0:
+        return None
+    ds.write_dataset(
+        table,
+        archive_dir,
+        format='parquet',
+        partitioning=partitioning(),
+        basename_template=f"part-{run_id}-{{i}}.parquet",
+        existing_data_behavior='overwrite_or_ignore',
+    )
+    log_info(f"  📦 Archived {table.num_rows} listings to {archive_dir} (run {run_id})")
+    return run_id
+
+def open_archive(archive_dir=ARCHIVE_DIR):
+    """Open the archive as a pyarrow Dataset"""
+    return ds.dataset(archive_dir, format='parquet', partitioning=partitioning(),
+                      schema=archive_schema().append(pa.field('date', pa.string()))
+                                             .append(pa.field('shop_name', pa.string())))
+
+def build_filter(listing_ids=None, start_date=None, end_date=None, shops=None):
+    """Build a dataset filter expression (None if no filters)
+
+    Dates are inclusive and may be 'YYYY-MM-DD' strings or date/datetime objects.
+    """
+    expressions = []
+    if listing_ids is not None:
+        expressions.append(ds.field('listing_id').isin(list(listing_ids)))
+    if start_date is not None:
+        expressions.append(ds.field('date') >= _date_key(start_date))
+    if end_date is not None:
+        expressions.append(ds.field('date') <= _date_key(end_date))
+    if shops is not None:
+        shops = [shops] if isinstance(shops, str) else list(shops)
+        expressions.append(ds.field('shop_name').isin(shops))
+    if not expressions:
+        return None
+    combined = expressions[0]
+    for expression in expressions[1:]:
+        combined = combined & expression
+    return combined
+
+def _date_key(value):
+    if hasattr(value, 'strftime'):
+        return value.strftime('%Y-%m-%d')
+    return str(value)[:10]
+
+def read_archive(listing_ids=None, start_date=None, end_date=None, shops=None,
+                 columns=None, archive_dir=ARCHIVE_DIR):
+    """Read archived listings with filters pushed down to the Parquet scan
+
+    Args:
+        listing_ids: Only these listing IDs
+        start_date / end_date: Inclusive date range (partition pruning)
+        shops: Shop name or list of shop names (partition pruning)
+        columns: Columns to read (default: all)
+        archive_dir: Dataset root directory
+
+    Returns:
+        pyarrow.Table
+    """
+    if not PYARROW_AVAILABLE:
+        raise ImportError("pyarrow is not installed. Install with: pip install pyarrow")
+    dataset = open_archive(archive_dir)
+    return dataset.to_table(
+        columns=columns,
+        filter=build_filter(listing_ids, start_date, end_date, shops)
+    )
+
+def parse_arguments():
+    """Parse command-line arguments"""
+    parser = argparse.ArgumentParser(
+        description='Append a Buyee results file to the columnar listing archive',
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        'input_file',
+        type=str,
+        help='Results JSON from buyee_details.py (sample_data) or buyee_search.py (all_listings_basic)'
+    )
+    parser.add_argument(
+        '-d', '--archive-dir',
+        dest='archive_dir',
+        type=str,
+        default=ARCHIVE_DIR,
+        help=f'Archive directory (default: {ARCHIVE_DIR})'
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    with open(args.input_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    listings = result_listings(data)
+
+    # Older results files predate price normalization
+    if listings and 'price_amount' not in listings[0]:
+        from buyee_prices import normalize_listing_prices
+        normalize_listing_prices(listings)
+
+    scraped_at = None
+    if data.get('test_date'):
+        scraped_at = datetime.fromisoformat(data['test_date'])
+
+    if not append_run(listings, args.archive_dir, scraped_at=scraped_at):
+        log_error("Nothing archived")
+        sys.exit(1)
+    sys.exit(0)
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Buyee Listing Clusters
+
+Groups near-duplicate listings - the same camera listed on Yahoo Japan
+Auctions, Mercari and Rakuma with slightly different translated titles.
+
+Titles are shingled into normalized tokens (buyee_text.tokenize) and
+summarized with MinHash signatures. LSH banding splits each signature into
+bands; listings that share any identical band become candidate pairs, so
+only likely duplicates are compared instead of every pair. Candidates are
+confirmed when they come from different shops, their exact token Jaccard
+similarity is above CLUSTER_MIN_SIMILARITY, their brand/model
+(buyee_entities) agree and, optionally, their thumbnails' perceptual hashes
+match (buyee_image_hash); they are then grouped around the cheapest listing
+of each group.
+
+Every listing gets:
+    cluster_id       listing_id of the cluster's primary listing
+    cluster_size     number of listings in the cluster (1 = no duplicates)
+    cluster_primary  True for the one listing per cluster that Phase 2 scrapes
+
+The primary is the cheapest listing (by price_reference), then the first seen.
+
+Used by:
+- buyee_search.py (when TITLE_CLUSTERING_ENABLED is True)
+- buyee_details.py (when CLUSTER_SKIP_SECONDARY_PHASE2 is True)
+"""
+
+import random
+import hashlib
+from collections import defaultdict
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+from buyee_text import tokenize
+from buyee_utils import (
+    CLUSTER_MINHASH_PERMUTATIONS, CLUSTER_LSH_BANDS, CLUSTER_MIN_SIMILARITY,
+    CLUSTER_CONFIRM_WITH_IMAGE, IMAGE_HASH_MAX_DISTANCE,
+    log_info, log_debug, debug_enabled
+)
+
+# 31-bit prime keeps (a * x + b) within 64 bits for the NumPy path
+MERSENNE_PRIME = (1 << 31) - 1
+
+def title_shingles(title):
+    """Return the set of shingles for a title (normalized tokens)"""
+    return set(tokenize(title))
+
+def _shingle_hash(shingle):
+    digest = hashlib.blake2b(shingle.encode('utf-8'), digest_size=4).digest()
+    return int.from_bytes(digest, 'little') % MERSENNE_PRIME
+
+class MinHasher:
+    """MinHash signatures using a fixed family of universal hash functions
+
+    h_i(x) = (a_i * x + b_i) mod p. The seed makes signatures comparable
+    across runs; NumPy (if installed) computes all permutations at once.
+    """
+
+    def __init__(self, num_perm=CLUSTER_MINHASH_PERMUTATIONS, seed=1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.params = [(rng.randint(1, MERSENNE_PRIME - 1), rng.randint(0, MERSENNE_PRIME - 1))
+                       for _ in range(num_perm)]
+        if NUMPY_AVAILABLE:
+            self._a = np.array([a for a, _ in self.params], dtype=np.uint64).reshape(-1, 1)
+            self._b = np.array([b for _, b in self.params], dtype=np.uint64).reshape(-1, 1)
+
+    def signature(self, shingles):
+        """Return the MinHash signature (tuple of num_perm ints) of a shingle set"""
+        if not shingles:
+            return None
+        hashes = [_shingle_hash(s) for s in shingles]
+        if NUMPY_AVAILABLE:
+            x = np.array(hashes, dtype=np.uint64).reshape(1, -1)
+            return tuple(((self._a * x + self._b) % np.uint64(MERSENNE_PRIME)).min(axis=1).tolist())
+        return tuple(
+            min((a * x + b) % MERSENNE_PRIME for x in hashes)
+            for a, b in self.params
+        )
+
+def candidate_pairs(signatures, bands=CLUSTER_LSH_BANDS):
+    """Return index pairs (i, j), i < j, that share at least one LSH band
+
+    Args:
+        signatures: list of signatures (None entries are skipped)
+        bands: Number of bands; rows per band = len(signature) // bands
+    """
+    pairs = set()
+    if not signatures:
+        return pairs
+    length = next((len(s) for s in signatures if s), 0)
+    rows = max(1, length // bands)
+    for band in range(bands):
+        start = band * rows
+        if start >= length:
+            break
+        buckets = defaultdict(list)
+        for i, signature in enumerate(signatures):
+            if signature:
+                buckets[signature[start:start + rows]].append(i)
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            for x in range(len(members)):
+                for y in range(x + 1, len(members)):
+                    pairs.add((members[x], members[y]))
+    return pairs
+
+def jaccard(a, b):
+    """Jaccard similarity of two sets"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def _entities(listing):
+    """brand/model of a listing (tagged in Phase 1, or extracted now without modifying it)"""
+    if 'brand' in listing:
+        return listing
+    from buyee_entities import get_extractor
+    return get_extractor().extract(listing.get('title', ''))
+
+def same_camera(entities_a, entities_b, shingles_a, shingles_b):
+    """True if two titles can describe the same camera
+
+    Extracted brands must not differ. With a model on both sides the models
+    must be equal; otherwise no differing token may look like a model
+    name (contain a digit), so "FM2" vs "FE2" or "F1.4" vs "F1.8" never match.
+    """
+    brand_a, brand_b = entities_a.get('brand'), entities_b.get('brand')
+    if brand_a and brand_b and brand_a != brand_b:
+        return False
+    model_a, model_b = entities_a.get('model'), entities_b.get('model')
+    if model_a and model_b:
+        return model_a == model_b
+    return not any(any(char.isdigit() for char in token) for token in shingles_a ^ shingles_b)
+
+def _image_hashes(listings, indexes):
+    """Thumbnail perceptual hashes for the listings at the given indexes"""
+    from buyee_image_hash import ImageHashIndex
+    from buyee_image_store import save_index
+    hasher = ImageHashIndex.load()
+    hashes = {}
+    for i in indexes:
+        image_url = listings[i].get('image_url')
+        if image_url:
+            hashes[i] = hasher.hash_image_url(image_url)[0]
+    save_index()  # Image store index, once for the whole batch
+    return hashes
+
+def assign_clusters(listings, min_similarity=CLUSTER_MIN_SIMILARITY,
+                    confirm_with_image=CLUSTER_CONFIRM_WITH_IMAGE, minhasher=None):
+    """Cluster near-duplicate listings and tag each one with its cluster
+
+    Args:
+        listings: Listing dicts (modified in place)
+        min_similarity: Title token Jaccard similarity a duplicate must exceed
+        confirm_with_image: Also require near-identical thumbnails (downloads thumbnails)
+        minhasher: MinHasher to use (default: one built from the config)
+
+    Returns:
+        Number of clusters with more than one listing
+    """
+    if not listings:
+        return 0
+    minhasher = minhasher or MinHasher()
+    shingles = [title_shingles(listing.get('title', '')) for listing in listings]
+    signatures = [minhasher.signature(s) for s in shingles]
+    pairs = sorted(candidate_pairs(signatures))
+
+    # Cross-shop duplicates only: one shop listing two similar titles is two items
+    confirmed = [
+        (i, j) for i, j in pairs
+        if jaccard(shingles[i], shingles[j]) > min_similarity
+        and not (listings[i].get('shop_name') and listings[i].get('shop_name') == listings[j].get('shop_name'))
+    ]
+    if confirmed:
+        entities = {i: _entities(listings[i]) for i in {i for pair in confirmed for i in pair}}
+        confirmed = [(i, j) for i, j in confirmed
+                     if same_camera(entities[i], entities[j], shingles[i], shingles[j])]
+    if confirm_with_image and confirmed:
+        from buyee_image_hash import hamming_distance
+        hashes = _image_hashes(listings, {i for pair in confirmed for i in pair})
+        confirmed = [
+            (i, j) for i, j in confirmed
+            if hashes.get(i) is not None and hashes.get(j) is not None
+            and hamming_distance(hashes[i], hashes[j]) <= IMAGE_HASH_MAX_DISTANCE
+        ]
+
+    neighbours = defaultdict(set)
+    for i, j in confirmed:
+        neighbours[i].add(j)
+        neighbours[j].add(i)
+
+    # Leader clustering: cheapest unassigned listing first, joined by its
+    # unassigned confirmed duplicates. Unlike transitive merging, A~B and
+    # B~C don't pull A and C together unless A~C too.
+    def sort_key(i):
+        price = listings[i].get('price_reference')
+        return (price is None, price if price is not None else 0, i)
+
+    assigned = set()
+    duplicate_clusters = 0
+    for primary in sorted(range(len(listings)), key=sort_key):
+        if primary in assigned:
+            continue
+        indexes = [primary] + sorted(j for j in neighbours.get(primary, ()) if j not in assigned)
+        assigned.update(indexes)
+        cluster_id = listings[primary].get('listing_id') or f"cluster-{primary}"
+        for i in indexes:
+            listings[i]['cluster_id'] = cluster_id
+            listings[i]['cluster_size'] = len(indexes)
+            listings[i]['cluster_primary'] = i == primary
+        if len(indexes) > 1:
+            duplicate_clusters += 1
+            if debug_enabled():
+                log_debug("  Cluster %s: %s", cluster_id, [listings[i].get('listing_id') for i in indexes])
+
+    log_info(f"  📊 Title clusters: {duplicate_clusters} duplicate clusters "
+             f"({len(pairs)} LSH candidates, {len(confirmed)} confirmed pairs, {len(listings)} listings)")
+    return duplicate_clusters
+
+def split_cluster_secondaries(listings):
+    """Split listings into (primaries, secondaries) by their cluster fields
+
+    Listings from a Phase 1 file without cluster fields are clustered first.
+    """
+    if listings and any('cluster_id' not in listing for listing in listings):
+        assign_clusters(listings)
+    primaries = [l for l in listings if l.get('cluster_primary', True)]
+    secondaries = [l for l in listings if not l.get('cluster_primary', True)]
+    log_info(f"  📊 Clusters: {len(secondaries)} duplicate listings skipped, {len(primaries)} to scrape")
+    return primaries, secondaries
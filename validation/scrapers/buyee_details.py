@@ -13,8 +13,11 @@ import sys
 import argparse
 import os
 from datetime import datetime
+from collections import deque
+from itertools import chain
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from threading import Lock
+from contextlib import nullcontext
 
 try:
     from playwright.sync_api import sync_playwright
@@ -27,18 +30,32 @@ except ImportError:
 # Import shared utilities
 from buyee_utils import (
     BASE_URL,
-    PHASE2_PARALLEL, PHASE2_MAX_WORKERS, PHASE2_RETRY_ATTEMPTS,
-    PHASE2_DELAY_BETWEEN_REQUESTS, PHASE2_RATE_LIMIT_THRESHOLD, PHASE2_FAILURE_THRESHOLD,
+    PHASE2_PARALLEL, PHASE2_RETRY_ATTEMPTS, PHASE2_SHARDS, PHASE2_PER_SHOP_LIMITS,
     FILTER_NEW_LISTINGS_ONLY,
+    IMAGE_DEDUP_ENABLED, IMAGE_DEDUP_SKIP_PHASE2, CLUSTER_SKIP_SECONDARY_PHASE2,
+    PHASE2_TRUST_PHASE1_JPY_PRICES,
+    ARCHIVE_ENABLED, SAVED_SEARCH_MATCHING_ENABLED, SAVED_SEARCH_RECORD_BATCH_SIZE,
+    SEARCH_INDEX_ENABLED, PRICE_SERIES_ENABLED,
+    COMPACT_LISTING_RECORDS, COLLECTION_VALUATION_ENABLED,
+    MEMORY_BOUNDED_MODE, MEMORY_RECYCLE_AFTER_NAVIGATIONS, MEMORY_PHASE2_BATCH_SIZE, RUN_REPORT_ENABLED,
     LOG_ENABLED,
-    setup_logging, log_info, log_warning, log_error, log_success,
+    collect_timings, setup_logging, log_info, log_warning, log_error, log_success,
     translate_japanese, contains_japanese, extract_listing_id,
-    validate_listing_details, download_image, mark_listing_as_scraped
+    validate_listing_details, download_image, mark_listing_as_scraped, get_saved_searches,
+    record_saved_search_matches, IMAGE_VARIANTS
 )
+from buyee_image_urls import canonical_image_key, sized_image_url
+from buyee_prices import normalize_listing_prices
+from buyee_listing import ListingWriter, json_default, iter_result_listings, iter_listings, iter_batches
+from buyee_memory import MemoryMonitor, PageRecycler
+from buyee_run_report import RunReport, finish_report
+from buyee_rate_limit import get_shop_limiter, allocate_workers, phase2_limiter_summary
+from buyee_throttle import ThrottledError, EmptyResultError, check_response, get_watcher
+from buyee_timing import StageTimer
 
 import logging
 
-def scrape_listing_details(page, listing_url):
+def scrape_listing_details(page, listing_url, skip_prices=False, limiter=None):
     """Phase 2: Scrape detailed information from a single listing's detail page
     
     Extracts additional fields not available in search results:
@@ -59,19 +76,39 @@ def scrape_listing_details(page, listing_url):
     
     Note: Also re-extracts shop_name, listing_id, and title from detail page
     (these may be more complete/accurate than search results)
+    
+    Set skip_prices=True to keep the Phase 1 prices (see has_authoritative_price)
+    and skip the buyout/current price regex cascades.
+    
+    With a limiter, a slot is held around the navigation and the description
+    wait only (see buyee_rate_limit.py).
     """
     from bs4 import BeautifulSoup
     import re
     
+    timer = StageTimer('details')
     try:
-        log_info(f"  Navigating to: {listing_url}")
-        page.goto(listing_url, wait_until='domcontentloaded', timeout=30000)
-        time.sleep(4)  # Wait for page to fully load
+        # Only the navigation and the description load hold a limiter slot; the fixed
+        # waits and the parsing/translation below run after it is released
+        with limiter.slot() if limiter else nullcontext():
+            log_info(f"  Navigating to: {listing_url}")
+            response = page.goto(listing_url, wait_until='domcontentloaded', timeout=30000)
+            check_response(page, response, get_watcher())
+            timer.mark('goto')
+            
+            # Wait for itemDescription section to load (which contains the iframe)
+            try:
+                page.wait_for_selector('section#itemDescription, #itemDescription, [id="itemDescription"]', timeout=10000)
+                description_loaded = True
+            except:
+                description_loaded = False
+            timer.mark('wait_description')
+            # The description iframe is loaded by now: a 429/5xx on it means throttling, not a missing description
+            check_response(page, None, get_watcher())
         
-        # Wait for itemDescription section to load (which contains the iframe)
-        try:
-            page.wait_for_selector('section#itemDescription, #itemDescription, [id="itemDescription"]', timeout=10000)
-        except:
+        time.sleep(4)  # Wait for page to fully load
+        timer.mark('sleep')
+        if not description_loaded:
             # Try scrolling to trigger lazy loading
             try:
                 page.evaluate('window.scrollTo(0, document.body.scrollHeight / 2)')
@@ -79,6 +116,7 @@ def scrape_listing_details(page, listing_url):
                 page.wait_for_selector('section#itemDescription, #itemDescription, [id="itemDescription"]', timeout=5000)
             except:
                 pass  # Continue if not found
+            timer.mark('scroll_retry')
         
         # Use JavaScript to extract images (more reliable for dynamic content)
         images_js = page.evaluate(r'''
@@ -101,8 +139,11 @@ def scrape_listing_details(page, listing_url):
             }
         ''')
         
+        timer.mark('evaluate_images')
         html_content = page.content()
+        timer.mark('page_content')
         soup = BeautifulSoup(html_content, 'html.parser')
+        del html_content  # The parse tree is all that's needed from here on
         
         # Remove script and style tags to get cleaner text
         for script in soup(['script', 'style', 'noscript']):
@@ -110,6 +151,7 @@ def scrape_listing_details(page, listing_url):
         
         detail = {}
         full_text = soup.get_text()
+        timer.mark('parse_html')
         
         # Extract Shop name from store-name div
         shop_name = None
@@ -217,6 +259,8 @@ def scrape_listing_details(page, listing_url):
                     log_warning(f"    Translation error for title: {e}")
                     detail['title'] = title_text
         
+        timer.mark('extract_title')
+        
         # Extract description from section#item-description (Buyee's specific container)
         # Description is inside an iframe, which is inside section#itemDescription
         description_text = None
@@ -286,6 +330,7 @@ def scrape_listing_details(page, listing_url):
                 log_warning("No iframe found inside section#itemDescription")
         except Exception as e:
             log_warning(f"Could not access iframe for description: {e}")
+        timer.mark('iframe_description')
         
         # Fallback: Try to find in main page if not found in iframe
         if not description_text:
@@ -377,77 +422,81 @@ def scrape_listing_details(page, listing_url):
             else:
                 detail['description'] = description_text
         
+        timer.mark('extract_description')
+        
         # Extract shop-specific fields only for Yahoo Japan Auctions
         if shop_name == 'Yahoo Japan Auctions':
-            # Extract Buyout Price (即決価格)
-            buyout_price = None
-            # Prioritize JPY (¥, 円) prices - try JPY patterns first
-            jpy_patterns = [
-                r'Buyout Price[^\d]*((?:¥|円)\s*[\d,]+\.?\d*)',
-                r'即決価格[^\d]*((?:¥|円)\s*[\d,]+\.?\d*)',
-                r'Buyout[^\d]*((?:¥|円)\s*[\d,]+\.?\d*)',
-            ]
-            for pattern in jpy_patterns:
-                match = re.search(pattern, full_text, re.I)
-                if match:
-                    buyout_price = match.group(1).strip()
-                    if buyout_price and re.search(r'\d', buyout_price):
-                        break
-            
-            # Fallback: try other currencies if JPY not found
-            if not buyout_price:
-                buyout_patterns = [
-                    r'Buyout Price[^\d]*((?:¥|円|YEN|BRL|USD)\s*[\d,]+\.?\d*)',
-                    r'即決価格[^\d]*((?:¥|円|YEN|BRL|USD)\s*[\d,]+\.?\d*)',
-                    r'Buyout[^\d]*((?:¥|円|YEN|BRL|USD)\s*[\d,]+\.?\d*)',
-                    r'Buyout Price[^\d]*([\d,]+\.?\d*)\s*(?:¥|円|YEN|BRL|USD)',
-                    r'即決価格[^\d]*([\d,]+\.?\d*)\s*(?:¥|円|YEN|BRL|USD)',
+            # Phase 1 prices are authoritative when the page was verified to show JPY - skip the cascades
+            if not skip_prices:
+                # Extract Buyout Price (即決価格)
+                buyout_price = None
+                # Prioritize JPY (¥, 円) prices - try JPY patterns first
+                jpy_patterns = [
+                    r'Buyout Price[^\d]*((?:¥|円)\s*[\d,]+\.?\d*)',
+                    r'即決価格[^\d]*((?:¥|円)\s*[\d,]+\.?\d*)',
+                    r'Buyout[^\d]*((?:¥|円)\s*[\d,]+\.?\d*)',
                 ]
-                for pattern in buyout_patterns:
+                for pattern in jpy_patterns:
                     match = re.search(pattern, full_text, re.I)
                     if match:
                         buyout_price = match.group(1).strip()
                         if buyout_price and re.search(r'\d', buyout_price):
                             break
             
-            # Extract Current Price (現在価格/入札価格)
-            current_price = None
-            # Prioritize JPY (¥, 円) prices - try JPY patterns first
-            jpy_patterns = [
-                r'Current Price[^\d]*((?:¥|円)\s*[\d,]+\.?\d*)',
-                r'現在価格[^\d]*((?:¥|円)\s*[\d,]+\.?\d*)',
-                r'入札価格[^\d]*((?:¥|円)\s*[\d,]+\.?\d*)',
-                r'Current[^\d]*((?:¥|円)\s*[\d,]+\.?\d*)',
-            ]
-            for pattern in jpy_patterns:
-                match = re.search(pattern, full_text, re.I)
-                if match:
-                    current_price = match.group(1).strip()
-                    if current_price and re.search(r'\d', current_price):
-                        break
+                # Fallback: try other currencies if JPY not found
+                if not buyout_price:
+                    buyout_patterns = [
+                        r'Buyout Price[^\d]*((?:¥|円|YEN|BRL|USD)\s*[\d,]+\.?\d*)',
+                        r'即決価格[^\d]*((?:¥|円|YEN|BRL|USD)\s*[\d,]+\.?\d*)',
+                        r'Buyout[^\d]*((?:¥|円|YEN|BRL|USD)\s*[\d,]+\.?\d*)',
+                        r'Buyout Price[^\d]*([\d,]+\.?\d*)\s*(?:¥|円|YEN|BRL|USD)',
+                        r'即決価格[^\d]*([\d,]+\.?\d*)\s*(?:¥|円|YEN|BRL|USD)',
+                    ]
+                    for pattern in buyout_patterns:
+                        match = re.search(pattern, full_text, re.I)
+                        if match:
+                            buyout_price = match.group(1).strip()
+                            if buyout_price and re.search(r'\d', buyout_price):
+                                break
             
-            # Fallback: try other currencies if JPY not found
-            if not current_price:
-                current_patterns = [
-                    r'Current Price[^\d]*((?:¥|円|YEN|BRL|USD)\s*[\d,]+\.?\d*)',
-                    r'現在価格[^\d]*((?:¥|円|YEN|BRL|USD)\s*[\d,]+\.?\d*)',
-                    r'入札価格[^\d]*((?:¥|円|YEN|BRL|USD)\s*[\d,]+\.?\d*)',
-                    r'Current[^\d]*((?:¥|円|YEN|BRL|USD)\s*[\d,]+\.?\d*)',
-                    r'Current Price[^\d]*([\d,]+\.?\d*)\s*(?:¥|円|YEN|BRL|USD)',
-                    r'現在価格[^\d]*([\d,]+\.?\d*)\s*(?:¥|円|YEN|BRL|USD)',
+                # Extract Current Price (現在価格/入札価格)
+                current_price = None
+                # Prioritize JPY (¥, 円) prices - try JPY patterns first
+                jpy_patterns = [
+                    r'Current Price[^\d]*((?:¥|円)\s*[\d,]+\.?\d*)',
+                    r'現在価格[^\d]*((?:¥|円)\s*[\d,]+\.?\d*)',
+                    r'入札価格[^\d]*((?:¥|円)\s*[\d,]+\.?\d*)',
+                    r'Current[^\d]*((?:¥|円)\s*[\d,]+\.?\d*)',
                 ]
-                for pattern in current_patterns:
+                for pattern in jpy_patterns:
                     match = re.search(pattern, full_text, re.I)
                     if match:
                         current_price = match.group(1).strip()
                         if current_price and re.search(r'\d', current_price):
                             break
             
-            # Store prices separately
-            if buyout_price:
-                detail['buyout_price'] = buyout_price[:100]
-            if current_price:
-                detail['current_price'] = current_price[:100]
+                # Fallback: try other currencies if JPY not found
+                if not current_price:
+                    current_patterns = [
+                        r'Current Price[^\d]*((?:¥|円|YEN|BRL|USD)\s*[\d,]+\.?\d*)',
+                        r'現在価格[^\d]*((?:¥|円|YEN|BRL|USD)\s*[\d,]+\.?\d*)',
+                        r'入札価格[^\d]*((?:¥|円|YEN|BRL|USD)\s*[\d,]+\.?\d*)',
+                        r'Current[^\d]*((?:¥|円|YEN|BRL|USD)\s*[\d,]+\.?\d*)',
+                        r'Current Price[^\d]*([\d,]+\.?\d*)\s*(?:¥|円|YEN|BRL|USD)',
+                        r'現在価格[^\d]*([\d,]+\.?\d*)\s*(?:¥|円|YEN|BRL|USD)',
+                    ]
+                    for pattern in current_patterns:
+                        match = re.search(pattern, full_text, re.I)
+                        if match:
+                            current_price = match.group(1).strip()
+                            if current_price and re.search(r'\d', current_price):
+                                break
+            
+                # Store prices separately
+                if buyout_price:
+                    detail['buyout_price'] = buyout_price[:100]
+                if current_price:
+                    detail['current_price'] = current_price[:100]
             
             # Extract condition, number of bids, and closing time from section#itemDetail_sec
             # They are in a table structure: itemDetail__listName (label) and itemDetail__listValue (value)
@@ -586,6 +635,8 @@ def scrape_listing_details(page, listing_url):
                             detail['closing_time_jst'] = closing_time[:200]
                             break
         
+        timer.mark('extract_auction_fields')
+        
         # Check if sold/available
         if re.search(r'売り切れ|sold out|この商品は売り切れ|終了', full_text, re.I):
             detail['status'] = 'sold'
@@ -640,14 +691,17 @@ def scrape_listing_details(page, listing_url):
             else:
                 detail['shipping_info'] = shipping_text
         
+        timer.mark('extract_status_seller_shipping')
+        
         # Extract ALL images using JavaScript result (filtered for product images)
+        # Deduplicate by canonical key so proxy/origin/size variants of one image count once
         image_urls = []
         seen_urls = set()
         
         for src in images_js:
             if not src.startswith('http'):
                 src = 'https:' + src if src.startswith('//') else BASE_URL + src
-            url_key = src.split('?')[0]
+            url_key = canonical_image_key(src)
             if url_key not in seen_urls:
                 seen_urls.add(url_key)
                 image_urls.append(src)
@@ -659,21 +713,30 @@ def scrape_listing_details(page, listing_url):
                        ('buyee' in src and 'common/icon' not in src and 'common/logo' not in src)):
                 if not src.startswith('http'):
                     src = 'https:' + src if src.startswith('//') else BASE_URL + src
-                url_key = src.split('?')[0]
+                url_key = canonical_image_key(src)
                 if url_key not in seen_urls:
                     seen_urls.add(url_key)
                     image_urls.append(src)
         
         if image_urls:
-            detail['all_images'] = image_urls
+            # Request proxy images at the size the detail page renders (origin URLs can't be resized)
+            detail_width, detail_height = IMAGE_VARIANTS['detail'][:2]
+            detail['all_images'] = [sized_image_url(u, detail_width, detail_height) for u in image_urls]
         
         # Validate detail data
         shop_name = detail.get('shop_name', 'Unknown')
         is_valid, errors = validate_listing_details(detail, shop_name)
         if errors:
             log_warning(f"Validation warnings: {', '.join(errors[:2])}")  # Show first 2 warnings
+        timer.mark('extract_images')
+        if MEMORY_BOUNDED_MODE:
+            # Free the parse tree now instead of waiting for the cycle collector
+            soup.decompose()
+        timer.finish()
         
         return detail
+    except ThrottledError:
+        raise  # Let the caller's retry loop and the rate limiter see it
     except Exception as e:
         log_error(f"Error extracting detail: {e}")
         import traceback
@@ -682,6 +745,308 @@ def scrape_listing_details(page, listing_url):
         traceback.print_exc()
         return {}
 
+def has_authoritative_price(listing):
+    """True if the Phase 1 price can be trusted without re-extracting it
+
+    That is the case when the search page was verified to render JPY
+    (listing['currency'] == 'JPY'; None when unverified) and Phase 1 found
+    a price.
+    """
+    if not PHASE2_TRUST_PHASE1_JPY_PRICES or listing.get('currency') != 'JPY':
+        return False
+    return bool(listing.get('price') or listing.get('current_price') or listing.get('buyout_price'))
+
+def group_by_shop(listings):
+    """Listings per shop_name, shops in order of first appearance"""
+    groups = {}
+    for listing in listings:
+        groups.setdefault(listing.get('shop_name'), []).append(listing)
+    return groups
+
+def interleave_by_shop(listings):
+    """Round-robin the listings across shops (A1 B1 C1 A2 B2 ...), keeping each shop's order"""
+    lanes = [deque(group) for group in group_by_shop(listings).values()]
+    ordered = []
+    while lanes:
+        for lane in lanes:
+            ordered.append(lane.popleft())
+        lanes = [lane for lane in lanes if lane]
+    return ordered
+
+def scrape_details(listings_to_process, results, report=None, on_done=None):
+    """Scrape the detail pages of listings_to_process in place with one browser
+    
+    Uses the PHASE2_* worker settings and the rate limiters (one per shop
+    with PHASE2_PER_SHOP_LIMITS). Records memory, rate limiter and throttle
+    figures in results.
+    
+    With on_done (memory-bounded mode), listings_to_process may be any
+    iterable: it is worked through MEMORY_PHASE2_BATCH_SIZE listings at a
+    time and on_done(listing) is called (one call at a time) as soon as each
+    listing is scraped or has failed, so the caller can write it out and
+    drop it.
+    
+    Returns:
+        int: Number of listings that failed after all retries
+    """
+    with sync_playwright() as p:
+        log_info("Launching browser...")
+        browser = p.chromium.launch(headless=True)
+        monitor = MemoryMonitor()
+        recycle_after = MEMORY_RECYCLE_AFTER_NAVIGATIONS if MEMORY_BOUNDED_MODE else None
+        watcher = get_watcher()
+        
+        def on_page(new_page):
+            # Every page (including recycled ones) reports throttled responses and transfer stats
+            watcher.attach(new_page)
+            if report:
+                report.attach(new_page)
+        
+        recycler = PageRecycler(browser, recycle_after, monitor=monitor, on_page=on_page)
+        
+        try:
+            total = None if on_done else len(listings_to_process)
+            if total is None:
+                log_info(f"\nPhase 2: Scraping detail pages in batches of {MEMORY_PHASE2_BATCH_SIZE} listings...")
+            else:
+                log_info(f"\nPhase 2: Scraping detail pages for {total} listings...")
+            
+            completed_lock = Lock()
+            completed_count = [0]
+            failed_count = [0]
+            
+            def finish(listing_data):
+                """Count a finished listing and hand it to on_done; returns the progress label"""
+                completed_count[0] += 1
+                if on_done:
+                    on_done(listing_data)
+                return f"{completed_count[0]}/{total}" if total else str(completed_count[0])
+            
+            def scrape_with_retry(listing_data, worker_recycler):
+                """Scrape a single listing with retries, paced by the adaptive rate limiter"""
+                listing_url = listing_data['listing_url']
+                listing_title = listing_data.get('title', 'N/A')[:50]
+                limiter = get_shop_limiter(listing_data.get('shop_name'))
+                
+                for attempt in range(1, PHASE2_RETRY_ATTEMPTS + 1):
+                    if attempt > 1 and report:
+                        report.count('retries')
+                    try:
+                        # The navigation waits for a token and a free concurrency slot; throttling
+                        # shrinks the shared rate/window instead of each worker sleeping on its own
+                        with worker_recycler.use() as page_instance:
+                            detail = scrape_listing_details(page_instance, listing_url,
+                                                            skip_prices=has_authoritative_price(listing_data),
+                                                            limiter=limiter)
+                            if not detail.get('title') and not detail.get('description'):
+                                raise EmptyResultError("Detail page yielded no data")
+                        listing_data.update(detail)
+                        
+                        with completed_lock:
+                            log_success(f"  [{finish(listing_data)}] {listing_title}")
+                        return True
+                    except ThrottledError as e:
+                        if report:
+                            report.count('rate_limited')
+                        log_warning(f"{e.reason} on attempt {attempt} for {listing_title}")
+                    except EmptyResultError:
+                        if report:
+                            report.count('empty_results')
+                        log_warning(f"Empty detail page on attempt {attempt} for {listing_title}")
+                    except Exception as e:
+                        log_warning(f"Attempt {attempt} failed for {listing_title}: {str(e)[:100]}")
+                
+                if report:
+                    report.count('failed')
+                with completed_lock:
+                    failed_count[0] += 1
+                    log_error(f"[{finish(listing_data)}] Failed after {PHASE2_RETRY_ATTEMPTS} attempts: {listing_title}")
+                return False
+            
+            # A list is scraped as one batch; a stream one batch at a time (lanes refill per batch)
+            batches = iter_batches(listings_to_process, MEMORY_PHASE2_BATCH_SIZE) if on_done else [listings_to_process]
+            worker_recyclers = []
+            for batch in batches:
+                if PHASE2_PARALLEL and len(batch) > 1:
+                    # Parallel processing: one lane of workers per shop (or one lane for all shops), so a slow
+                    # backend only ties up its own workers; the limiter's AIMD window decides how many are active
+                    if PHASE2_PER_SHOP_LIMITS:
+                        lanes = {shop: deque(group) for shop, group in group_by_shop(batch).items()}
+                    else:
+                        lanes = {None: deque(batch)}
+                    lane_workers = allocate_workers({shop: len(lane) for shop, lane in lanes.items()})
+                    worker_count = sum(lane_workers.values())
+                    # Lanes left without a worker (more shops than PHASE2_MAX_WORKERS)
+                    spare_lanes = [lanes[shop] for shop, workers in lane_workers.items() if not workers]
+                    log_info(f"  Using parallel processing with {worker_count} workers (adaptive rate limit): "
+                             + ', '.join(f"{shop or 'all shops'} {workers}" for shop, workers in lane_workers.items()))
+                    
+                    # A browser context for each worker (kept across batches)
+                    while len(worker_recyclers) < worker_count:
+                        worker_recyclers.append(PageRecycler(browser, recycle_after, monitor=monitor, on_page=on_page))
+                    
+                    def run_lane(lane, worker_recycler):
+                        """Scrape listings from one shop's lane until it is empty, then from the spare lanes"""
+                        for current in [lane] + spare_lanes:
+                            while True:
+                                try:
+                                    listing = current.popleft()
+                                except IndexError:
+                                    break
+                                scrape_with_retry(listing, worker_recycler)
+                    
+                    with ThreadPoolExecutor(max_workers=worker_count) as executor:
+                        recyclers = iter(worker_recyclers)
+                        futures = [
+                            executor.submit(run_lane, lanes[shop], next(recyclers))
+                            for shop, workers in lane_workers.items() for _ in range(workers)
+                        ]
+                        for future in as_completed(futures):
+                            future.result()
+                
+                else:
+                    # Sequential processing (safer, slower)
+                    if not PHASE2_PARALLEL:
+                        log_info("  Using sequential processing (parallel disabled)")
+                    else:
+                        log_info("  Using sequential processing (only 1 listing)")
+                    
+                    # Alternate between shops so consecutive requests go to different backends
+                    ordered = interleave_by_shop(batch) if PHASE2_PER_SHOP_LIMITS else batch
+                    for listing in ordered:
+                        scrape_with_retry(listing, recycler)
+            
+            # Close worker contexts
+            for worker_recycler in worker_recyclers:
+                recycler.recycles += worker_recycler.recycles
+                worker_recycler.close()
+            
+            if failed_count[0] > 0:
+                log_warning(f"\n{failed_count[0]} listing(s) failed to scrape")
+            
+            return failed_count[0]
+        finally:
+            results['memory'] = monitor.report()
+            results['memory']['context_recycles'] = recycler.recycles
+            results['rate_limiter'] = phase2_limiter_summary()
+            results['throttle_signals'] = dict(watcher.counts)
+            browser.close()
+
+def run_worker(output_file=None, queue_file=None):
+    """Worker mode: scrape detail tasks from the work queue until it is drained
+    
+    Keeps polling while search workers still have pages queued (they
+    produce detail tasks). Retries and dead-lettering are handled by the
+    queue (WORK_QUEUE_MAX_ATTEMPTS) instead of PHASE2_RETRY_ATTEMPTS. The
+    listings this worker scraped are written to output_file; use
+    `buyee_work_queue.py export` to collect the listings of all workers,
+    then `buyee_details.py --postprocess FILE` (run_postprocess) to run the
+    post-processing steps (archive, search index, ...) on the exported file.
+    
+    Returns:
+        dict: Worker results (scraped listings, queue counts)
+    """
+    from buyee_work_queue import open_queue, work, worker_name, SEARCH_PAGE, DETAIL
+    
+    if output_file is None:
+        output_file = 'validation/results/buyee_details_worker_results.json'
+    
+    log_filepath = setup_logging()
+    if not PLAYWRIGHT_AVAILABLE:
+        log_error("Playwright is not available. Please install it first.")
+        return {'error': 'Playwright not available'}
+    
+    worker_id = worker_name()
+    queue = open_queue(queue_file)
+    log_info("=" * 60)
+    log_info(f"Buyee Details Scraper - Queue Worker {worker_id}")
+    log_info("=" * 60)
+    log_info(f"Queue: {queue.path}")
+    if log_filepath:
+        log_info(f"Log file: {log_filepath}")
+    
+    results = {
+        'test_date': datetime.now().isoformat(),
+        'worker': worker_id,
+        'input_file': queue.path,
+        'challenges': [],
+        'notes': [],
+        'sample_data': []
+    }
+    scraped = results['sample_data']
+    
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        monitor = MemoryMonitor()
+        watcher = get_watcher()
+        recycler = PageRecycler(browser, MEMORY_RECYCLE_AFTER_NAVIGATIONS if MEMORY_BOUNDED_MODE else None,
+                                monitor=monitor, on_page=watcher.attach)
+        
+        # Saved searches are compiled once; matches are recorded in batches
+        matcher = None
+        pending_matches = []
+        if SAVED_SEARCH_MATCHING_ENABLED:
+            from buyee_saved_search import SavedSearchMatcher
+            saved_searches = get_saved_searches()
+            if saved_searches:
+                matcher = SavedSearchMatcher(saved_searches)
+        
+        def record_matches():
+            if pending_matches:
+                record_saved_search_matches(pending_matches)
+                results.setdefault('saved_search_matches', []).extend(
+                    {'search_id': search_id, 'listing_id': listing_id} for search_id, listing_id in pending_matches
+                )
+                pending_matches.clear()
+        
+        def scrape_task(task):
+            listing = task.payload
+            limiter = get_shop_limiter(listing.get('shop_name'))
+            with recycler.use() as page_instance:
+                detail = scrape_listing_details(page_instance, listing['listing_url'],
+                                                skip_prices=has_authoritative_price(listing), limiter=limiter)
+                if not detail.get('title') and not detail.get('description'):
+                    raise EmptyResultError("Detail page yielded no data")
+            listing.update(detail)
+            normalize_listing_prices([listing])
+            if matcher:
+                pending_matches.extend(matcher.match([listing]))
+                if len(pending_matches) >= SAVED_SEARCH_RECORD_BATCH_SIZE:
+                    record_matches()
+            if FILTER_NEW_LISTINGS_ONLY and listing.get('listing_id'):
+                mark_listing_as_scraped(listing['listing_id'])
+            scraped.append(listing)
+            log_success(f"  [{len(scraped)}] {listing.get('title', 'N/A')[:50]}")
+            return listing
+        
+        try:
+            results['queue'] = work(queue, DETAIL, scrape_task, worker_id, wait_for=(SEARCH_PAGE,))
+        except Exception as e:
+            results['challenges'].append(f"Error during scraping: {str(e)}")
+            log_error(f"Error: {e}")
+            import traceback
+            if LOG_ENABLED:
+                logging.exception("Full traceback:")
+            traceback.print_exc()
+        finally:
+            record_matches()
+            results['listings_found'] = len(scraped)
+            results['memory'] = monitor.report()
+            results['memory']['context_recycles'] = recycler.recycles
+            results['rate_limiter'] = phase2_limiter_summary()
+            results['throttle_signals'] = dict(watcher.counts)
+            browser.close()
+            queue.close()
+    
+    results['timings'] = collect_timings('details')
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False, default=json_default)
+    
+    log_success(f"\nWorker done: {len(scraped)} listings scraped")
+    log_info(f"Results saved to: {output_file}")
+    return results
+
 def parse_arguments():
     """Parse command-line arguments"""
     parser = argparse.ArgumentParser(
@@ -699,18 +1064,220 @@ def parse_arguments():
         '-o', '--output',
         dest='output_file',
         type=str,
-        default='validation/results/buyee_details_results.json',
-        help='Output JSON file path'
+        default=None,
+        help='Output JSON file path (default: validation/results/buyee_details_results.json, '
+             'buyee_details_worker_results.json with --worker, the input file with --postprocess)'
+    )
+    parser.add_argument(
+        '--shards',
+        type=int,
+        default=None,
+        help=f'Worker processes for detail pages, each with its own browser (default: {PHASE2_SHARDS})'
+    )
+    parser.add_argument(
+        '--worker',
+        action='store_true',
+        help='Scrape detail tasks from the work queue until it is drained (see buyee_work_queue.py)'
+    )
+    parser.add_argument(
+        '--queue',
+        dest='queue_file',
+        type=str,
+        default=None,
+        help='Work queue database (default: WORK_QUEUE_FILE)'
+    )
+    parser.add_argument(
+        '--postprocess',
+        dest='postprocess_file',
+        type=str,
+        default=None,
+        help='Only run post-processing (archive, search index, ...) on a results file, '
+             'e.g. from buyee_work_queue.py export'
     )
     return parser.parse_args()
 
 
-def main(input_file=None, output_file=None):
+def stream_details(listings, results, listings_file, output_file, shards=1, report=None):
+    """Memory-bounded Phase 2: scrape a stream of listings, writing each one out when it is done
+    
+    listings (e.g. iter_listings() over the Phase 1 JSON lines file) are
+    pre-filtered (image dedup, cluster secondaries) MEMORY_PHASE2_BATCH_SIZE
+    at a time, and every listing is price-normalized and written to
+    listings_file as soon as it is scraped, fails or is skipped. Only the
+    batches in flight are held in memory.
+    
+    Returns:
+        int: Number of listings written
+    """
+    writer = ListingWriter(listings_file)
+    write_lock = Lock()
+    
+    def finish(listing):
+        # Detail pages may have replaced the Phase 1 price strings
+        normalize_listing_prices([listing])
+        with write_lock:
+            writer.write(listing)
+    
+    image_index = None
+    if IMAGE_DEDUP_ENABLED:
+        from buyee_image_hash import ImageHashIndex, split_known_relists
+        image_index = ImageHashIndex.load()
+        if IMAGE_DEDUP_SKIP_PHASE2:
+            results['known_relists'] = 0
+    if CLUSTER_SKIP_SECONDARY_PHASE2:
+        from buyee_clusters import split_cluster_secondaries
+        results['cluster_secondaries_skipped'] = 0
+    
+    def to_scrape():
+        for batch in iter_batches(listings, MEMORY_PHASE2_BATCH_SIZE):
+            if image_index is not None:
+                new_listings, known_relists = split_known_relists(batch, image_index)
+                if IMAGE_DEDUP_SKIP_PHASE2:
+                    # Known relists keep their Phase 1 data plus 'relist_of'
+                    batch = new_listings
+                    results['known_relists'] += len(known_relists)
+                    for listing in known_relists:
+                        finish(listing)
+            if CLUSTER_SKIP_SECONDARY_PHASE2:
+                # Secondary cluster members keep their Phase 1 data plus 'cluster_id'
+                batch, cluster_secondaries = split_cluster_secondaries(batch)
+                results['cluster_secondaries_skipped'] += len(cluster_secondaries)
+                for listing in cluster_secondaries:
+                    finish(listing)
+            yield from batch
+    
+    try:
+        if shards > 1:
+            # One browser per process, listings split by listing_id hash (see buyee_shards.py)
+            from buyee_shards import scrape_sharded
+            scrape_sharded(to_scrape(), results, output_file, shards, report, on_done=finish)
+        else:
+            scrape_details(to_scrape(), results, report, on_done=finish)
+    finally:
+        if image_index is not None:
+            image_index.save()
+        writer.close()
+    return writer.count
+
+def postprocess_listings(listing_batches, results):
+    """Run the enabled post-processing steps on the scraped listings
+    
+    listing_batches() returns a fresh iterable of listing lists (the whole
+    run as one list, or batches read back from the memory-bounded listings
+    file); each step makes its own pass.
+    """
+    def all_listings():
+        return (listing for batch in listing_batches() for listing in batch)
+    
+    # Match against saved searches with the detail-page data (if enabled)
+    if SAVED_SEARCH_MATCHING_ENABLED:
+        from buyee_saved_search import match_saved_searches
+        results['saved_search_matches'] = [
+            {'search_id': search_id, 'listing_id': listing_id}
+            for search_id, listing_id in match_saved_searches(all_listings())
+        ]
+    
+    # Append this run to the columnar archive (if enabled)
+    if ARCHIVE_ENABLED:
+        from buyee_archive import append_run
+        results['archive_run_id'] = append_run(all_listings())
+    
+    # Record prices into the per-model market price series (if enabled)
+    if PRICE_SERIES_ENABLED:
+        from buyee_price_series import record_run
+        from buyee_entities import tag_listings
+        
+        def tagged_listings():
+            for batch in listing_batches():
+                if batch and 'brand' not in batch[0]:
+                    tag_listings(batch)
+                yield from batch
+        
+        results['price_series_updated'] = record_run(tagged_listings())
+    
+    # Revalue collection cameras whose models got new prices (if enabled)
+    if COLLECTION_VALUATION_ENABLED:
+        from buyee_valuation import run_valuation
+        results['collection_items_valued'] = run_valuation()
+    
+    # Add/refresh listings in the full-text search index (if enabled)
+    if SEARCH_INDEX_ENABLED:
+        from buyee_search_index import open_index, index_listings
+        index_conn = open_index()
+        added = updated = unchanged = 0
+        for batch in listing_batches():
+            batch_added, batch_updated, batch_unchanged = index_listings(index_conn, batch)
+            added += batch_added
+            updated += batch_updated
+            unchanged += batch_unchanged
+        index_conn.close()
+        log_info(f"  🔎 Search index: {added} added, {updated} updated, {unchanged} unchanged")
+        results['search_index'] = {'added': added, 'updated': updated, 'unchanged': unchanged}
+    
+    # Mark listings as scraped in database (if enabled)
+    if FILTER_NEW_LISTINGS_ONLY:
+        log_info("\n💾 Marking listings as scraped in database...")
+        marked = 0
+        for listing in all_listings():
+            listing_id = listing.get('listing_id')
+            if listing_id:
+                mark_listing_as_scraped(listing_id)
+                marked += 1
+        log_success(f"Marked {marked} listings as scraped")
+
+def run_postprocess(input_file, output_file=None):
+    """Run the post-processing steps on a results file scraped elsewhere
+    
+    For listings collected by queue workers (`buyee_work_queue.py export`),
+    which skip postprocess_listings. The step outputs (archive run ID,
+    saved search matches, ...) are added to the results, which are written
+    to output_file (default: input_file).
+    
+    Returns:
+        dict: The results with the post-processing outputs
+    """
+    output_file = output_file or input_file
+    log_filepath = setup_logging()
+    log_info("=" * 60)
+    log_info("Buyee Details Scraper - Post-processing")
+    log_info("=" * 60)
+    log_info(f"Input: {input_file}")
+    if log_filepath:
+        log_info(f"Log file: {log_filepath}")
+    
+    try:
+        with open(input_file, 'r', encoding='utf-8') as f:
+            results = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        log_error(f"Could not read {input_file}: {e}")
+        return {'error': str(e)}
+    results.setdefault('challenges', [])
+    
+    def listing_batches():
+        return iter_batches(iter_result_listings(results, compact=COMPACT_LISTING_RECORDS),
+                            MEMORY_PHASE2_BATCH_SIZE)
+    
+    try:
+        postprocess_listings(listing_batches, results)
+    except Exception as e:
+        results['challenges'].append(f"Error during post-processing: {str(e)}")
+        log_error(f"Error: {e}")
+        if LOG_ENABLED:
+            logging.exception("Full traceback:")
+    
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False, default=json_default)
+    log_info(f"Results saved to: {output_file}")
+    return results
+
+def main(input_file=None, output_file=None, shards=None):
     """Main scraping function - Phase 2 only
     
     Args:
         input_file (str, optional): Input JSON file from buyee_search.py. If None, uses default.
         output_file (str, optional): Output JSON file path. If None, uses default.
+        shards (int, optional): Worker processes for detail pages (see buyee_shards.py). If None, uses PHASE2_SHARDS.
     
     Returns:
         dict: Results dictionary with scraping results
@@ -719,6 +1286,8 @@ def main(input_file=None, output_file=None):
         input_file = 'validation/results/buyee_search_results.json'
     if output_file is None:
         output_file = 'validation/results/buyee_details_results.json'
+    if shards is None:
+        shards = PHASE2_SHARDS
     
     # Setup logging first
     log_filepath = setup_logging()
@@ -738,6 +1307,8 @@ def main(input_file=None, output_file=None):
         log_info(f"Log file: {log_filepath}")
     log_info("")
     
+    report = RunReport('details') if RUN_REPORT_ENABLED else None
+    
     # Read input JSON from Phase 1
     try:
         with open(input_file, 'r', encoding='utf-8') as f:
@@ -751,225 +1322,118 @@ def main(input_file=None, output_file=None):
         return {'error': f'Invalid JSON file: {input_file}'}
     
     # Extract listings from Phase 1 results
-    listings_to_process = phase1_results.get('all_listings_basic', [])
-    if not listings_to_process:
+    # (all_listings_basic, or the JSON lines file written in memory-bounded mode)
+    listings_to_process = iter_result_listings(phase1_results, compact=COMPACT_LISTING_RECORDS)
+    first_listing = next(listings_to_process, None)
+    if first_listing is None:
         log_warning("No listings found in input file")
         return {'error': 'No listings found in input file'}
-    
-    log_info(f"Found {len(listings_to_process)} listings from Phase 1")
+    listings_to_process = chain([first_listing], listings_to_process)
     
     results = {
         'test_date': datetime.now().isoformat(),
         'input_file': input_file,
-        'listings_found': len(listings_to_process),
+        'listings_found': 0,
         'challenges': [],
         'notes': [],
         'sample_data': []
     }
     
-    with sync_playwright() as p:
-        log_info("Launching browser...")
-        browser = p.chromium.launch(headless=True)
-        context = browser.new_context(
-            user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            locale='ja-JP',
-            timezone_id='Asia/Tokyo',
-            extra_http_headers={
-                'Accept-Language': 'ja,ja-JP;q=0.9,en;q=0.8'
-            }
-        )
-        page = context.new_page()
+    if MEMORY_BOUNDED_MODE:
+        # Listings stream from the Phase 1 file to a JSON lines file next to the results (see stream_details)
+        listings_file = os.path.splitext(output_file)[0] + '.listings.jsonl'
+        log_info(f"Streaming listings from Phase 1 to {listings_file}")
+    else:
+        listings_to_process = list(listings_to_process)
+        if COMPACT_LISTING_RECORDS:
+            phase1_results.pop('all_listings_basic', None)
+        log_info(f"Found {len(listings_to_process)} listings from Phase 1")
+        results['listings_found'] = len(listings_to_process)
         
-        try:
-            log_info(f"\nPhase 2: Scraping detail pages for {len(listings_to_process)} listings...")
-            
-            if PHASE2_PARALLEL and len(listings_to_process) > 1:
-                # Parallel processing with rate limiting detection and automatic fallback
-                log_info(f"  Using parallel processing with {PHASE2_MAX_WORKERS} workers")
-                log_info(f"  Delay between requests: {PHASE2_DELAY_BETWEEN_REQUESTS}s")
-                log_info(f"  Rate limit threshold: {PHASE2_RATE_LIMIT_THRESHOLD} errors before fallback")
-                
-                # Create a new browser context for each worker
-                contexts = []
-                pages = []
-                for i in range(PHASE2_MAX_WORKERS):
-                    ctx = browser.new_context(
-                        user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                        locale='ja-JP',
-                        timezone_id='Asia/Tokyo',
-                        extra_http_headers={
-                            'Accept-Language': 'ja,ja-JP;q=0.9,en;q=0.8'
-                        }
-                    )
-                    contexts.append(ctx)
-                    pages.append(ctx.new_page())
-                
-                # Thread-safe counters and rate limit tracking
-                completed_lock = Lock()
-                completed_count = [0]
-                failed_count = [0]
-                rate_limit_count = [0]
-                is_rate_limited = [False]
-                
-                def scrape_with_retry(listing_data, page_instance, listing_index):
-                    """Scrape a single listing with retry logic and rate limit detection"""
-                    listing_url = listing_data['listing_url']
-                    listing_title = listing_data.get('title', 'N/A')[:50]
-                    
-                    for attempt in range(1, PHASE2_RETRY_ATTEMPTS + 1):
-                        try:
-                            # Add delay to avoid rate limiting
-                            if attempt > 1:
-                                time.sleep(2 * attempt)  # Exponential backoff on retry
-                            else:
-                                time.sleep(PHASE2_DELAY_BETWEEN_REQUESTS)
-                            
-                            detail = scrape_listing_details(page_instance, listing_url)
-                            listing_data.update(detail)
-                            
-                            with completed_lock:
-                                completed_count[0] += 1
-                                log_success(f"  [{completed_count[0]}/{len(listings_to_process)}] {listing_title}")
-                            
-                            return True
-                        except Exception as e:
-                            error_str = str(e).lower()
-                            is_rate_limit_error = (
-                                '429' in error_str or 
-                                'rate limit' in error_str or 
-                                'too many requests' in error_str or
-                                'timeout' in error_str
-                            )
-                            
-                            if is_rate_limit_error:
-                                with completed_lock:
-                                    rate_limit_count[0] += 1
-                                    if rate_limit_count[0] >= PHASE2_RATE_LIMIT_THRESHOLD:
-                                        is_rate_limited[0] = True
-                                        log_warning(f"\nRate limiting detected ({rate_limit_count[0]} errors)")
-                                        log_info("Switching to sequential processing with increased delays...")
-                            
-                            if attempt < PHASE2_RETRY_ATTEMPTS and not is_rate_limited[0]:
-                                if is_rate_limit_error:
-                                    log_warning(f"Rate limit error on attempt {attempt} for {listing_title}, waiting longer...")
-                                    time.sleep(5 * attempt)  # Longer wait for rate limits
-                                else:
-                                    log_warning(f"Attempt {attempt} failed for {listing_title}, retrying...")
-                                continue
-                            else:
-                                with completed_lock:
-                                    failed_count[0] += 1
-                                    completed_count[0] += 1
-                                
-                                if is_rate_limited[0]:
-                                    return False
-                                else:
-                                    log_error(f"[{completed_count[0]}/{len(listings_to_process)}] Failed after {PHASE2_RETRY_ATTEMPTS} attempts: {listing_title}")
-                                    log_error(f"     Error: {str(e)[:100]}")
-                                return False
-                    return False
-                
-                # Distribute listings across workers
-                with ThreadPoolExecutor(max_workers=PHASE2_MAX_WORKERS) as executor:
-                    futures = []
-                    for idx, listing in enumerate(listings_to_process):
-                        if is_rate_limited[0]:
-                            break
-                        
-                        # Round-robin assignment of listings to pages
-                        page_idx = idx % PHASE2_MAX_WORKERS
-                        future = executor.submit(scrape_with_retry, listing, pages[page_idx], idx)
-                        futures.append(future)
-                    
-                    # Wait for all to complete
-                    for future in as_completed(futures):
-                        if is_rate_limited[0]:
-                            for f in futures:
-                                f.cancel()
-                            break
-                        future.result()
-                
-                # Close worker contexts
-                for ctx in contexts:
-                    ctx.close()
-                
-                # If rate limited or too many failures, fall back to sequential
-                failure_rate = failed_count[0] / len(listings_to_process) if listings_to_process else 0
-                remaining_listings = [l for l in listings_to_process if 'description' not in l or not l.get('description')]
-                
-                if is_rate_limited[0] or (failure_rate > PHASE2_FAILURE_THRESHOLD and remaining_listings):
-                    log_warning(f"\nParallel processing issues detected:")
-                    if is_rate_limited[0]:
-                        log_warning(f"     - Rate limiting: {rate_limit_count[0]} errors")
-                    if failure_rate > PHASE2_FAILURE_THRESHOLD:
-                        log_warning(f"     - High failure rate: {failed_count[0]}/{len(listings_to_process)} ({failure_rate*100:.1f}%)")
-                    
-                    if remaining_listings:
-                        log_info(f"\nProcessing {len(remaining_listings)} remaining listings sequentially with increased delays...")
-                        increased_delay = PHASE2_DELAY_BETWEEN_REQUESTS * 3
-                        
-                        for i, listing in enumerate(remaining_listings, 1):
-                            if 'description' in listing and listing.get('description'):
-                                continue
-                            
-                            log_info(f"  [{i}/{len(remaining_listings)}] Sequential: {listing.get('title', 'N/A')[:50]}")
-                            try:
-                                time.sleep(increased_delay)
-                                detail = scrape_listing_details(page, listing['listing_url'])
-                                listing.update(detail)
-                            except Exception as e:
-                                log_error(f"    Error: {str(e)[:100]}")
-                                continue
-                
-                if failed_count[0] > 0:
-                    log_warning(f"\n{failed_count[0]} listing(s) failed to scrape")
+        # Skip detail scraping for listings whose thumbnail was already seen (if enabled)
+        known_relists = []
+        if IMAGE_DEDUP_ENABLED:
+            from buyee_image_hash import ImageHashIndex, split_known_relists
+            log_info("\n🔍 Checking thumbnails against known listings...")
+            image_index = ImageHashIndex.load()
+            to_scrape, known_relists = split_known_relists(listings_to_process, image_index)
+            image_index.save()
+            if IMAGE_DEDUP_SKIP_PHASE2:
+                listings_to_process = to_scrape
+                results['known_relists'] = len(known_relists)
+        
+        # Only scrape one listing per cross-shop duplicate cluster (if enabled)
+        cluster_secondaries = []
+        if CLUSTER_SKIP_SECONDARY_PHASE2:
+            from buyee_clusters import split_cluster_secondaries
+            log_info("\n🔍 Skipping secondary listings of duplicate clusters...")
+            listings_to_process, cluster_secondaries = split_cluster_secondaries(listings_to_process)
+            results['cluster_secondaries_skipped'] = len(cluster_secondaries)
+    
+    if report:
+        report.mark('setup', listings=None if MEMORY_BOUNDED_MODE else len(listings_to_process))
+    
+    try:
+        if MEMORY_BOUNDED_MODE:
+            results['listings_found'] = stream_details(listings_to_process, results, listings_file,
+                                                       output_file, shards, report)
+            results['listings_file'] = listings_file
+            del listings_to_process
             
+            def listing_batches():
+                # Post-processing reads the written listings back a batch at a time
+                return iter_batches(iter_listings(listings_file, compact=COMPACT_LISTING_RECORDS),
+                                    MEMORY_PHASE2_BATCH_SIZE)
+        else:
+            if shards > 1 and len(listings_to_process) > 1:
+                # One browser per process, listings split by listing_id hash (see buyee_shards.py)
+                from buyee_shards import scrape_sharded
+                listings_to_process = scrape_sharded(listings_to_process, results, output_file, shards, report)
             else:
-                # Sequential processing (safer, slower)
-                if not PHASE2_PARALLEL:
-                    log_info("  Using sequential processing (parallel disabled)")
-                else:
-                    log_info("  Using sequential processing (only 1 listing)")
-                
-                for i, listing in enumerate(listings_to_process, 1):
-                    log_info(f"\n[{i}/{len(listings_to_process)}] Scraping details for: {listing.get('title', 'N/A')[:50]}")
-                    try:
-                        detail = scrape_listing_details(page, listing['listing_url'])
-                        listing.update(detail)
-                        time.sleep(PHASE2_DELAY_BETWEEN_REQUESTS)
-                    except Exception as e:
-                        log_error(f"Error scraping {listing.get('listing_url')}: {e}")
-                        continue
+                scrape_details(listings_to_process, results, report)
             
+            if IMAGE_DEDUP_ENABLED and IMAGE_DEDUP_SKIP_PHASE2:
+                # Known relists keep their Phase 1 data plus 'relist_of'
+                listings_to_process = listings_to_process + known_relists
+            if cluster_secondaries:
+                # Secondary cluster members keep their Phase 1 data plus 'cluster_id'
+                listings_to_process = listings_to_process + cluster_secondaries
+            # Re-parse prices: detail pages may have replaced the Phase 1 price strings
+            normalize_listing_prices(listings_to_process)
             results['listings_found'] = len(listings_to_process)
             results['sample_data'] = listings_to_process
-            log_success(f"\nPhase 2 complete: Processed {len(listings_to_process)} listings")
             
-            # Mark listings as scraped in database (if enabled)
-            if FILTER_NEW_LISTINGS_ONLY:
-                log_info("\n💾 Marking listings as scraped in database...")
-                for listing in listings_to_process:
-                    listing_id = listing.get('listing_id')
-                    if listing_id:
-                        mark_listing_as_scraped(listing_id)
-                log_success(f"Marked {len(listings_to_process)} listings as scraped")
+            def listing_batches():
+                return [listings_to_process]
         
-        except Exception as e:
-            results['challenges'].append(f"Error during scraping: {str(e)}")
-            log_error(f"Error: {e}")
-            import traceback
-            if LOG_ENABLED:
-                logging.exception("Full traceback:")
-            traceback.print_exc()
-        finally:
-            browser.close()
+        if report:
+            report.mark('scrape', listings=results['listings_found'])
+        log_success(f"\nPhase 2 complete: Processed {results['listings_found']} listings")
+        
+        postprocess_listings(listing_batches, results)
+        
+        if report:
+            report.mark('postprocess', listings=results['listings_found'])
+    except Exception as e:
+        results['challenges'].append(f"Error during scraping: {str(e)}")
+        log_error(f"Error: {e}")
+        import traceback
+        if LOG_ENABLED:
+            logging.exception("Full traceback:")
+        traceback.print_exc()
+    finally:
+        if report:
+            results['run_report'] = finish_report(report, results.get('memory'))
+    
+    # Per-stage timing summary (p50/p95/max) plus optional Prometheus/trace exports
+    results['timings'] = collect_timings('details')
     
     # Ensure output directory exists
     os.makedirs(os.path.dirname(output_file), exist_ok=True)
     
     # Save results to JSON
     with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(results, f, indent=2, ensure_ascii=False)
+        json.dump(results, f, indent=2, ensure_ascii=False, default=json_default)
     
     log_info(f"\n{'='*60}")
     log_info("Phase 2 Complete")
@@ -984,8 +1448,16 @@ if __name__ == "__main__":
     # Parse command-line arguments
     args = parse_arguments()
     
+    if args.worker:
+        results = run_worker(output_file=args.output_file, queue_file=args.queue_file)
+        sys.exit(1 if results.get('error') or results['challenges'] else 0)
+    
+    if args.postprocess_file:
+        results = run_postprocess(args.postprocess_file, output_file=args.output_file)
+        sys.exit(1 if results.get('error') or results['challenges'] else 0)
+    
     # Run main function
-    results = main(input_file=args.input_file, output_file=args.output_file)
+    results = main(input_file=args.input_file, output_file=args.output_file, shards=args.shards)
     
     # Exit with appropriate code
     if results.get('error'):
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+Buyee Title Entity Extractor
+
+Tags listing titles with structured camera fields:
+
+    "NA AB Rank Maintained Nikon New FM2 Black Model Ai 50mm F1.4"
+        brand: Nikon   model: New FM2   lens: Ai 50mm F1.4   rank: AB   condition_grade: Good
+
+All dictionary terms (brands, models, lens series and shop grading ranks,
+in English and Japanese) are compiled once into a single Aho-Corasick
+automaton, so each title is scanned in one pass regardless of dictionary
+size. Overlapping matches resolve to the leftmost-longest term ("new fm2"
+beats "fm2"); latin terms must sit on word boundaries so "fe" does not match
+inside "fe2". Focal length and aperture are picked up by a regex and
+appended to the lens series.
+
+Text is normalized like buyee_text (NFKC, lowercase, hyphens folded), so
+"AE-1", "ＡＥ１" and "ae1" are the same term.
+
+condition_grade maps shop ranks onto the app's condition scale
+(Mint, Excellent, Good, Fair, Poor).
+
+Used by:
+- buyee_search.py (tags Phase 1 listings when ENTITY_EXTRACTION_ENABLED is True)
+- buyee_saved_search.py (brand/model filters)
+"""
+
+import re
+from collections import deque
+
+from buyee_text import normalize_text
+
+# ====================================================================
+# DICTIONARY
+# ====================================================================
+
+# Brand -> aliases (canonical name is always included)
+BRANDS = {
+    'Nikon': ['nikon', 'ニコン'],
+    'Canon': ['canon', 'キヤノン', 'キャノン'],
+    'Pentax': ['pentax', 'asahi pentax', 'ペンタックス'],
+    'Olympus': ['olympus', 'オリンパス'],
+    'Minolta': ['minolta', 'ミノルタ'],
+    'Leica': ['leica', 'leitz', 'ライカ'],
+    'Contax': ['contax', 'コンタックス'],
+    'Yashica': ['yashica', 'ヤシカ'],
+    'Mamiya': ['mamiya', 'マミヤ'],
+    'Fujifilm': ['fujifilm', 'fujica', 'fuji', '富士フイルム', 'フジカ'],
+    'Konica': ['konica', 'コニカ'],
+    'Ricoh': ['ricoh', 'リコー'],
+    'Hasselblad': ['hasselblad', 'ハッセルブラッド'],
+    'Rollei': ['rollei', 'rolleiflex', 'ローライ'],
+    'Voigtlander': ['voigtlander', 'voigtländer', 'フォクトレンダー'],
+    'Zenza Bronica': ['bronica', 'zenza bronica', 'ブロニカ'],
+}
+
+# Brand -> model -> extra aliases (the model name itself is always an alias)
+MODELS = {
+    'Nikon': {
+        'F': [], 'F2': [], 'F3': [], 'F4': [], 'F5': [], 'F6': [], 'F100': [], 'F80': [],
+        'FM': [], 'FM2': [], 'New FM2': ['ニューfm2'], 'FM3A': [], 'FE': [], 'FE2': [], 'FA': [],
+        'EM': [], 'FG': [], 'FG-20': [], 'Nikomat': ['ニコマート'], 'S2': [], 'SP': [],
+    },
+    'Canon': {
+        'AE-1': [], 'AE-1 Program': [], 'A-1': [], 'AV-1': [], 'AT-1': [], 'F-1': [], 'New F-1': [],
+        'FTb': [], 'T70': [], 'T90': [], 'EOS 1': [], 'EOS 5': [], 'Canonet QL17': ['ql17'],
+        '7': [], 'P': [],
+    },
+    'Pentax': {
+        'K1000': [], 'KX': [], 'KM': [], 'MX': [], 'ME': [], 'ME Super': [], 'LX': [],
+        'Spotmatic': ['sp', 'spotmatic sp', 'sp ii', 'spii'], 'SV': [], 'S2': [],
+        '67': ['6x7'], 'MZ-3': [], 'Z-1': [],
+    },
+    'Olympus': {
+        'OM-1': [], 'OM-1N': [], 'OM-2': [], 'OM-2N': [], 'OM-3': [], 'OM-4': [], 'OM-4Ti': [],
+        'OM-10': [], 'OM-30': [], 'Pen F': ['pen-f', 'penf'], 'Pen FT': [], 'Trip 35': [],
+        'XA': [], 'XA2': [], 'mju II': ['μ ii', 'mju-ii', 'mju2', 'stylus epic'],
+    },
+    'Minolta': {
+        'X-700': [], 'X-570': [], 'X-500': [], 'XD': [], 'XE': [], 'XG-M': [], 'SRT101': ['srt 101'],
+        'SR-T': [], 'CLE': [], 'Alpha 7': ['α-7', 'a7'], 'Alpha 9': ['α-9', 'a9'], 'Hi-Matic': [],
+    },
+    'Leica': {
+        'M2': [], 'M3': [], 'M4': [], 'M4-2': [], 'M4-P': [], 'M5': [], 'M6': [], 'M6 TTL': [],
+        'M7': [], 'MP': [], 'CL': [], 'R4': [], 'R6': [], 'IIIf': ['iiif'], 'IIIg': ['iiig'],
+    },
+    'Contax': {
+        'RTS': [], 'RTS II': [], 'RTS III': [], 'ST': [], 'RX': [], 'Aria': [], '139 Quartz': [],
+        '167MT': [], 'G1': [], 'G2': [], 'T2': [], 'T3': [], 'TVS': [],
+    },
+    'Yashica': {'FX-3': [], 'FX-3 Super 2000': [], 'Electro 35': [], 'Mat-124G': ['124g'], 'T4': []},
+    'Mamiya': {'RB67': [], 'RZ67': [], 'C330': [], 'M645': [], '645 Pro': [], '7': [], '7 II': []},
+    'Fujifilm': {'GW690': [], 'GSW690': [], 'GA645': [], 'Klasse': [], 'Natura': [], 'ST801': []},
+    'Konica': {'Hexar': [], 'Hexar RF': [], 'C35': [], 'Big Mini': []},
+    'Ricoh': {'GR1': [], 'GR1s': [], 'GR1v': [], 'XR-500': [], 'KR-5': []},
+    'Hasselblad': {'500C': [], '500C/M': ['500cm'], '503CW': [], 'SWC': []},
+    'Rollei': {'35': [], '35 S': [], '2.8F': [], '3.5F': []},
+    'Voigtlander': {'Bessa R': [], 'Bessa R2': [], 'Bessa R3A': [], 'Vitessa': []},
+    'Zenza Bronica': {'SQ-A': [], 'SQ-Ai': [], 'ETRS': [], 'ETRSi': []},
+}
+
+# Lens series / mount designations -> aliases
+LENS_SERIES = {
+    'Nikkor': ['nikkor', 'ニッコール'],
+    'Ai': ['ai'],
+    'Ai-S': ['ais', 'ai s'],
+    'AF': ['af'],
+    'AF-S': [],
+    'AF-D': ['af d'],
+    'FD': ['fd'],
+    'New FD': ['nfd'],
+    'EF': ['ef'],
+    'Takumar': ['takumar', 'タクマー'],
+    'SMC Pentax': ['smc'],
+    'Zuiko': ['zuiko', 'ズイコー'],
+    'Rokkor': ['rokkor', 'ロッコール'],
+    'MD': ['md'],
+    'Summicron': ['summicron', 'ズミクロン'],
+    'Summilux': ['summilux', 'ズミルックス'],
+    'Elmar': ['elmar', 'エルマー'],
+    'Planar': ['planar', 'プラナー'],
+    'Sonnar': ['sonnar', 'ゾナー'],
+    'Distagon': ['distagon', 'ディスタゴン'],
+    'Tessar': ['tessar', 'テッサー'],
+    'Hexanon': ['hexanon', 'ヘキサノン'],
+    'Fujinon': ['fujinon', 'フジノン'],
+    'Sekor': ['sekor', 'セコール'],
+}
+
+# Shop grading rank -> aliases (matched as "rank ab", "ab rank", "ランクab", ...)
+RANKS = {
+    'S': ['新品同様', '未使用'],
+    'SA': [],
+    'A': ['極美品'],
+    'AB': ['美品'],
+    'B': ['並品'],
+    'BC': [],
+    'C': ['難あり', '訳あり'],
+    'J': ['junk', 'ジャンク', 'for parts'],
+}
+
+# Shop rank -> CollectionCamera condition scale
+RANK_CONDITIONS = {
+    'S': 'Mint', 'SA': 'Mint',
+    'A': 'Excellent',
+    'AB': 'Good', 'B': 'Good',
+    'BC': 'Fair', 'C': 'Fair',
+    'J': 'Poor',
+}
+
+# "50mm F1.4", "35mm f/2", "28-70mm F3.5-4.5", "50/1.4"
+FOCAL_APERTURE_RE = re.compile(
+    r'(\d{1,4}(?:[-~]\d{1,4})?)\s*mm\s*(?:f\s*/?\s*(\d{1,2}(?:\.\d{1,2})?(?:-\d{1,2}(?:\.\d{1,2})?)?))?'
+    r'|(\d{1,4})\s*/\s*(\d(?:\.\d{1,2})?)(?![\d.])'
+)
+
+def normalize_term(text):
+    """Normalize text for matching (NFKC, lowercase, hyphens folded)"""
+    return normalize_text(text).replace('-', '')
+
+# ====================================================================
+# AHO-CORASICK AUTOMATON
+# ====================================================================
+
+class AhoCorasick:
+    """Multi-pattern matcher: finds every dictionary term in one pass over the text
+
+    Build with add() then build(); iter_matches() may then be called any number of
+    times (the automaton is read-only after build(), so it is safe to share
+    between threads).
+    """
+
+    def __init__(self):
+        self.goto = [{}]   # state -> {char: next state}
+        self.fail = [0]    # state -> failure link
+        self.output = [[]] # state -> [(length, value)] of terms ending here
+        self.built = False
+
+    def add(self, term, value):
+        """Add a (normalized) term that yields value when matched"""
+        state = 0
+        for char in term:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            state = next_state
+        self.output[state].append((len(term), value))
+        self.built = False
+
+    def build(self):
+        """Compute failure links (breadth-first) and merge outputs along them"""
+        queue = deque(self.goto[0].values())
+        for state in queue:
+            self.fail[state] = 0
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[next_state] = target if target != next_state else 0
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+        self.built = True
+        return self
+
+    def iter_matches(self, text):
+        """Yield (start, end, value) for every term occurrence (overlaps included)"""
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, value in output[state]:
+                yield position + 1 - length, position + 1, value
+
+    def __len__(self):
+        return len(self.goto)
+
+def _is_word_char(char):
+    return char.isascii() and char.isalnum()
+
+def _on_word_boundary(text, start, end):
+    """Latin terms must not continue into neighbouring letters/digits"""
+    if _is_word_char(text[start]) and start > 0 and _is_word_char(text[start - 1]):
+        return False
+    if _is_word_char(text[end - 1]) and end < len(text) and _is_word_char(text[end]):
+        return False
+    return True
+
+# "f/1.4": the aperture's "f" is not Nikon's F body
+APERTURE_AFTER_RE = re.compile(r'\s*/\s*\d')
+
+def _in_lens_spec(text, start, end, spec_spans):
+    """True if a match is part of a focal length/aperture ("50mm f/1.4", "f/2")"""
+    if any(start < span_end and span_start < end for span_start, span_end in spec_spans):
+        return True
+    return APERTURE_AFTER_RE.match(text, end) is not None
+
+def _is_ambiguous_model(model):
+    """Single-letter or numeric model names ("F", "7", "67") only count next to their brand"""
+    term = normalize_term(model).replace(' ', '')
+    return len(term) <= 1 or term.isdigit()
+
+def _lens(text, series):
+    """Combine the lens series with the first focal length/aperture in the title"""
+    spec = None
+    match = FOCAL_APERTURE_RE.search(text)
+    if match:
+        focal, aperture = (match.group(1), match.group(2)) if match.group(1) else (match.group(3), match.group(4))
+        spec = f"{focal}mm" + (f" F{aperture}" if aperture else '')
+    parts = [part for part in (series, spec) if part]
+    return ' '.join(parts) or None
+
+# ====================================================================
+# EXTRACTOR
+# ====================================================================
+
+class EntityExtractor:
+    """Dictionary-driven brand/model/lens/rank tagger for listing titles"""
+
+    def __init__(self, brands=BRANDS, models=MODELS, lens_series=LENS_SERIES, ranks=RANKS):
+        self.automaton = AhoCorasick()
+        for brand, aliases in brands.items():
+            for alias in {brand, *aliases}:
+                self._add(alias, ('brand', brand))
+        for brand, brand_models in models.items():
+            for model, aliases in brand_models.items():
+                for alias in {model, *aliases}:
+                    self._add(alias, ('model', (brand, model)))
+        for series, aliases in lens_series.items():
+            for alias in {series, *aliases}:
+                self._add(alias, ('lens', series))
+        for rank, aliases in ranks.items():
+            for pattern in (f"rank {rank}", f"{rank} rank", f"{rank}rank", f"ランク{rank}", f"{rank}ランク"):
+                self._add(pattern, ('rank', rank))
+            for alias in aliases:
+                self._add(alias, ('rank', rank))
+        self.automaton.build()
+
+    def _add(self, term, value):
+        term = normalize_term(term)
+        if term:
+            self.automaton.add(term, value)
+
+    def _terms(self, text):
+        """Leftmost-longest, non-overlapping dictionary matches in text
+
+        Returns (start, end, values): every value of the terms at that span
+        ("sp" is both Nikon SP and Pentax Spotmatic), in dictionary order.
+        """
+        spec_spans = [match.span() for match in FOCAL_APERTURE_RE.finditer(text)]
+        spans = {}
+        for start, end, value in self.automaton.iter_matches(text):
+            if not _on_word_boundary(text, start, end):
+                continue
+            if value[0] == 'model' and _in_lens_spec(text, start, end, spec_spans):
+                continue
+            values = spans.setdefault((start, end), [])
+            if value not in values:
+                values.append(value)
+        selected = []
+        last_end = 0
+        for start, end in sorted(spans, key=lambda span: (span[0], -(span[1] - span[0]))):
+            if start >= last_end:
+                selected.append((start, end, spans[(start, end)]))
+                last_end = end
+        return selected
+
+    def extract(self, title):
+        """Extract structured fields from a title
+
+        Returns:
+            dict with brand, model, lens, rank, condition_grade (None when not found)
+        """
+        text = normalize_term(title)
+        brands = []
+        models = []
+        lens_series = None
+        rank = None
+        for start, end, values in self._terms(text):
+            span_models = []
+            for kind, value in values:
+                if kind == 'brand':
+                    brands.append(value)
+                elif kind == 'model':
+                    span_models.append(value)
+                elif kind == 'lens' and lens_series is None:
+                    lens_series = value
+                elif kind == 'rank' and rank is None:
+                    rank = value
+            if span_models:
+                models.append(span_models)
+
+        brand = brands[0] if brands else None
+        model = None
+        for candidates in models:
+            if brand is not None:
+                # Every model at the span is a candidate; the brand picks one
+                model = next((name for model_brand, name in candidates if model_brand == brand), None)
+                if model is not None:
+                    break
+            elif len(candidates) == 1 and not _is_ambiguous_model(candidates[0][1]):
+                # The model implies the brand ("FM2" -> Nikon), unless several brands share the term
+                brand, model = candidates[0]
+                break
+
+        lens = _lens(normalize_text(title), lens_series)
+        return {
+            'brand': brand,
+            'model': model,
+            'lens': lens,
+            'rank': rank,
+            'condition_grade': RANK_CONDITIONS.get(rank),
+        }
+
+_extractor = None
+
+def get_extractor():
+    """Return the shared extractor (the automaton is compiled on first use)"""
+    global _extractor
+    if _extractor is None:
+        _extractor = EntityExtractor()
+    return _extractor
+
+def tag_listings(listings, extractor=None):
+    """Add brand/model/lens/rank/condition_grade fields to each listing (in place)
+
+    Returns:
+        Number of listings with a recognized brand or model
+    """
+    extractor = extractor or get_extractor()
+    tagged = 0
+    for listing in listings:
+        fields = extractor.extract(listing.get('title', ''))
+        listing.update(fields)
+        if fields['brand'] or fields['model']:
+            tagged += 1
+    return tagged
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Buyee Recorded Fixtures
+
+Record Buyee pages once, then replay them offline to benchmark the scrapers
+without network variance or rate limits.
+
+Recording runs the real scrapers against buyee.jp with Playwright's HAR
+recorder on: one search results page plus the detail pages of its first
+listings, including the description iframe documents and every XHR the
+pages make. Replaying serves those responses from the HAR through
+context.route_from_har(); anything not in the recording is aborted, so a
+replay never touches the network. Images, media and fonts are blocked in
+both modes (FIXTURE_BLOCKED_RESOURCES) - the scrapers only read their URLs.
+
+Layout:
+    {FIXTURES_DIR}/<name>/recording.har    recorded responses (embedded)
+    {FIXTURES_DIR}/<name>/manifest.json    search URL, detail URLs, recorded_at
+    {FIXTURES_DIR}/<name>/baseline.json    benchmark baseline (--save-baseline)
+
+The benchmark times scrape_search_results and scrape_listing_details end to
+end and per stage (buyee_timing), fingerprints the extracted data, and can
+compare both against the stored baseline: stages whose p50 got slower than
+BENCHMARK_REGRESSION_THRESHOLD, and any change in extracted output, are
+reported (exit code 1).
+
+Usage:
+    python buyee_fixtures.py record nikon-fm2 --search-term "Nikon FM2" --details 5
+    python buyee_fixtures.py bench nikon-fm2 --iterations 3 --skip-sleeps --save-baseline
+    python buyee_fixtures.py bench nikon-fm2 --iterations 3 --skip-sleeps --compare
+"""
+
+import os
+import sys
+import json
+import time
+import types
+import hashlib
+import argparse
+from contextlib import contextmanager
+from datetime import datetime
+from urllib.parse import quote_plus
+
+try:
+    from playwright.sync_api import sync_playwright
+    PLAYWRIGHT_AVAILABLE = True
+except ImportError:
+    PLAYWRIGHT_AVAILABLE = False
+
+from buyee_utils import (
+    BASE_URL, DEFAULT_SEARCH_TERM, FIXTURES_DIR, FIXTURE_BLOCKED_RESOURCES,
+    BENCHMARK_REGRESSION_THRESHOLD,
+    create_browser_context, log_info, log_warning, log_error, log_success
+)
+from buyee_listing import json_default
+from buyee_timing import TIMINGS
+import buyee_search
+import buyee_details
+
+HAR_FILE = 'recording.har'
+MANIFEST_FILE = 'manifest.json'
+BASELINE_FILE = 'baseline.json'
+
+def fixture_path(name, filename=None, fixtures_dir=FIXTURES_DIR):
+    path = os.path.join(fixtures_dir, name)
+    return os.path.join(path, filename) if filename else path
+
+def _block_resources(context):
+    """Abort requests for resource types the scrapers never read"""
+    def handler(route):
+        if route.request.resource_type in FIXTURE_BLOCKED_RESOURCES:
+            route.abort()
+        else:
+            route.fallback()
+    context.route('**/*', handler)
+
+def _load_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False, default=json_default)
+
+# ====================================================================
+# RECORD / REPLAY
+# ====================================================================
+
+def record_fixture(name, search_term=DEFAULT_SEARCH_TERM, detail_count=5, fixtures_dir=FIXTURES_DIR):
+    """Record a search page and detail pages into a HAR fixture
+
+    Returns:
+        The fixture manifest dict
+    """
+    har_path = fixture_path(name, HAR_FILE, fixtures_dir)
+    os.makedirs(os.path.dirname(har_path), exist_ok=True)
+    search_url = f"{BASE_URL}/item/crosssearch/query/{quote_plus(search_term)}?conversionType=top_page_search&suggest=1"
+
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        context = create_browser_context(browser, record_har_path=har_path, record_har_content='embed')
+        _block_resources(context)
+        page = context.new_page()
+
+        log_info(f"Recording search page: {search_url}")
+        page.goto(search_url, wait_until='domcontentloaded', timeout=60000)
+        listings = buyee_search.scrape_search_results(page)[0]
+        detail_urls = [listing['listing_url'] for listing in listings[:detail_count]]
+        for url in detail_urls:
+            log_info(f"Recording detail page: {url}")
+            buyee_details.scrape_listing_details(page, url)
+
+        context.close()  # The HAR file is written when the context closes
+        browser.close()
+
+    manifest = {
+        'name': name,
+        'search_term': search_term,
+        'search_url': search_url,
+        'detail_urls': detail_urls,
+        'listings_found': len(listings),
+        'recorded_at': datetime.now().isoformat(),
+    }
+    _write_json(fixture_path(name, MANIFEST_FILE, fixtures_dir), manifest)
+    log_success(f"Recorded fixture '{name}': 1 search page, {len(detail_urls)} detail pages -> {har_path}")
+    return manifest
+
+def replay_context(browser, name, fixtures_dir=FIXTURES_DIR):
+    """Browser context that serves every request from a recorded fixture"""
+    context = create_browser_context(browser)
+    context.route_from_har(fixture_path(name, HAR_FILE, fixtures_dir), not_found='abort')
+    # Registered last so it runs first; everything else falls back to the HAR
+    _block_resources(context)
+    return context
+
+@contextmanager
+def replay_shortcuts(skip_sleeps=False, skip_translation=False):
+    """Optionally skip the scrapers' fixed sleeps and translation calls during a replay
+
+    Fixed sleeps wait for the live site to settle and translation calls an
+    external API; neither is needed when pages come from a recording, and
+    both would dominate the timings being measured.
+    """
+    modules = (buyee_search, buyee_details)
+    saved = [(module, module.time, module.translate_japanese) for module in modules]
+    if skip_sleeps:
+        fast_time = types.ModuleType('time')
+        fast_time.__dict__.update(time.__dict__)
+        fast_time.sleep = lambda seconds: None
+        for module in modules:
+            module.time = fast_time
+    if skip_translation:
+        for module in modules:
+            module.translate_japanese = lambda text, target_lang='en': text
+    try:
+        yield
+    finally:
+        for module, original_time, original_translate in saved:
+            module.time = original_time
+            module.translate_japanese = original_translate
+
+# ====================================================================
+# BENCHMARK
+# ====================================================================
+
+def _stats(values_ms):
+    ordered = sorted(values_ms)
+    if not ordered:
+        return {'count': 0}
+    return {
+        'count': len(ordered),
+        'p50_ms': round(ordered[len(ordered) // 2], 1),
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1),
+        'max_ms': round(ordered[-1], 1),
+    }
+
+def output_fingerprint(listings, details):
+    """Stable hash of the extracted data (detects behavior changes between runs)"""
+    payload = json.dumps({'listings': listings, 'details': details}, sort_keys=True,
+                         ensure_ascii=False, default=json_default)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def run_benchmark(name, iterations=3, skip_sleeps=False, skip_translation=False, fixtures_dir=FIXTURES_DIR):
+    """Replay a fixture through both scrapers and time them
+
+    Returns:
+        Report dict: end-to-end search/detail timings, per-stage timings,
+        and the output fingerprint of the first iteration
+    """
+    manifest = _load_json(fixture_path(name, MANIFEST_FILE, fixtures_dir))
+    TIMINGS.reset()
+    TIMINGS.configure(enabled=True, keep_events=False)
+    search_ms = []
+    details_ms = []
+    fingerprint = None
+    listings_found = details_found = 0
+
+    with replay_shortcuts(skip_sleeps, skip_translation), sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        context = replay_context(browser, name, fixtures_dir)
+        page = context.new_page()
+        try:
+            for iteration in range(iterations):
+                start = time.perf_counter()
+                page.goto(manifest['search_url'], wait_until='domcontentloaded', timeout=60000)
+                listings = buyee_search.scrape_search_results(page)[0]
+                search_ms.append((time.perf_counter() - start) * 1000)
+
+                details = []
+                for url in manifest['detail_urls']:
+                    start = time.perf_counter()
+                    details.append(buyee_details.scrape_listing_details(page, url))
+                    details_ms.append((time.perf_counter() - start) * 1000)
+
+                if iteration == 0:
+                    fingerprint = output_fingerprint(listings, details)
+                    listings_found = len(listings)
+                    details_found = sum(1 for detail in details if detail)
+                log_info(f"  Iteration {iteration + 1}/{iterations}: {len(listings)} listings, {len(details)} details")
+        finally:
+            browser.close()
+
+    return {
+        'fixture': name,
+        'run_at': datetime.now().isoformat(),
+        'iterations': iterations,
+        'skip_sleeps': skip_sleeps,
+        'skip_translation': skip_translation,
+        'search_page': _stats(search_ms),
+        'detail_page': _stats(details_ms),
+        'stages': TIMINGS.summary(),
+        'output': {'listings': listings_found, 'details': details_found, 'fingerprint': fingerprint},
+    }
+
+def compare_to_baseline(report, baseline, threshold=BENCHMARK_REGRESSION_THRESHOLD):
+    """Compare a report's p50 timings and output against a baseline report
+
+    Returns:
+        dict with 'regressions' and 'improvements' (stage, baseline_ms, current_ms,
+        change) and 'output_changed'
+    """
+    def p50s(data):
+        values = {f"{key}.end_to_end": data[key].get('p50_ms') for key in ('search_page', 'detail_page')}
+        values.update({stage: stats['p50_ms'] for stage, stats in data.get('stages', {}).items()})
+        return values
+
+    current, base = p50s(report), p50s(baseline)
+    regressions, improvements = [], []
+    for stage, current_ms in sorted(current.items()):
+        base_ms = base.get(stage)
+        if not base_ms or current_ms is None:
+            continue
+        change = (current_ms - base_ms) / base_ms
+        entry = {'stage': stage, 'baseline_ms': base_ms, 'current_ms': current_ms, 'change': round(change, 3)}
+        if change > threshold:
+            regressions.append(entry)
+        elif change < -threshold:
+            improvements.append(entry)
+
+    if report.get('skip_sleeps') != baseline.get('skip_sleeps'):
+        log_warning("Baseline was recorded with a different --skip-sleeps setting; timings are not comparable")
+    return {
+        'regressions': regressions,
+        'improvements': improvements,
+        'output_changed': report['output']['fingerprint'] != baseline['output']['fingerprint'],
+    }
+
+def parse_arguments():
+    """Parse command-line arguments"""
+    parser = argparse.ArgumentParser(
+        description='Record Buyee pages and benchmark the scrapers offline against them',
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--fixtures-dir', dest='fixtures_dir', default=FIXTURES_DIR,
+                        help=f'Fixtures directory (default: {FIXTURES_DIR})')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = subparsers.add_parser('record', help='Record a fixture from buyee.jp')
+    record_parser.add_argument('name', help='Fixture name')
+    record_parser.add_argument('-s', '--search-term', default=DEFAULT_SEARCH_TERM,
+                               help=f'Search term (default: {DEFAULT_SEARCH_TERM})')
+    record_parser.add_argument('--details', type=int, default=5, help='Detail pages to record (default: 5)')
+
+    bench_parser = subparsers.add_parser('bench', help='Benchmark the scrapers against a fixture')
+    bench_parser.add_argument('name', help='Fixture name')
+    bench_parser.add_argument('-n', '--iterations', type=int, default=3, help='Replay iterations (default: 3)')
+    bench_parser.add_argument('--skip-sleeps', action='store_true', help="Skip the scrapers' fixed sleeps")
+    bench_parser.add_argument('--skip-translation', action='store_true', help='Skip translation API calls')
+    bench_parser.add_argument('--save-baseline', action='store_true', help='Store this run as the baseline')
+    bench_parser.add_argument('--compare', action='store_true', help='Compare against the stored baseline')
+    bench_parser.add_argument('--threshold', type=float, default=BENCHMARK_REGRESSION_THRESHOLD,
+                              help=f'Regression threshold (default: {BENCHMARK_REGRESSION_THRESHOLD})')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    if not PLAYWRIGHT_AVAILABLE:
+        log_error("Playwright is required. Install with: pip install playwright && playwright install chromium")
+        sys.exit(1)
+    args = parse_arguments()
+
+    if args.command == 'record':
+        record_fixture(args.name, args.search_term, args.details, args.fixtures_dir)
+        sys.exit(0)
+
+    report = run_benchmark(args.name, args.iterations, args.skip_sleeps, args.skip_translation, args.fixtures_dir)
+    exit_code = 0
+    if args.compare:
+        baseline_path = fixture_path(args.name, BASELINE_FILE, args.fixtures_dir)
+        if not os.path.exists(baseline_path):
+            log_error(f"No baseline at {baseline_path} - run with --save-baseline first")
+            sys.exit(1)
+        comparison = compare_to_baseline(report, _load_json(baseline_path), args.threshold)
+        report['comparison'] = comparison
+        for entry in comparison['regressions']:
+            log_warning(f"  Slower: {entry['stage']} {entry['baseline_ms']} -> {entry['current_ms']} ms "
+                        f"({entry['change']:+.0%})")
+        if comparison['output_changed']:
+            log_warning("  Extracted output differs from the baseline")
+        if comparison['regressions'] or comparison['output_changed']:
+            exit_code = 1
+    if args.save_baseline:
+        _write_json(fixture_path(args.name, BASELINE_FILE, args.fixtures_dir), report)
+        log_success(f"Baseline saved for '{args.name}'")
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    sys.exit(exit_code)
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Buyee Image Hash Index
+
+Perceptual hashing of listing thumbnails for cross-listing duplicate detection.
+
+The same camera is often relisted, or listed on several marketplaces, with
+identical photos. Each Phase 1 thumbnail (`image_url`) is reduced to a 64-bit
+perceptual hash (pHash or dHash), and hashes are kept in a BK-tree so that
+"is there a known image within Hamming distance N?" is answered without
+comparing against every stored hash.
+
+Used by:
+- buyee_details.py (skip detail scraping for known relists)
+"""
+
+import os
+import json
+import math
+from datetime import datetime
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+from buyee_utils import (
+    IMAGE_HASH_ALGORITHM, IMAGE_HASH_MAX_DISTANCE, IMAGE_HASH_INDEX_FILE,
+    log_info, log_warning, log_debug
+)
+
+# ====================================================================
+# HASH FUNCTIONS
+# ====================================================================
+
+def hamming_distance(a, b):
+    """Number of differing bits between two integer hashes"""
+    return bin(a ^ b).count('1')
+
+def _bits_to_int(bits):
+    value = 0
+    for bit in bits:
+        value = (value << 1) | (1 if bit else 0)
+    return value
+
+def dhash(img, hash_size=8):
+    """Difference hash: compares horizontally adjacent pixels of a tiny grayscale image"""
+    small = img.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+    pixels = list(small.getdata())
+    width = hash_size + 1
+    bits = []
+    for row in range(hash_size):
+        offset = row * width
+        for col in range(hash_size):
+            bits.append(pixels[offset + col] > pixels[offset + col + 1])
+    return _bits_to_int(bits)
+
+# DCT-II cosine table, computed once per (size, coefficients) pair
+_dct_tables = {}
+
+def _dct_table(size, coefficients):
+    key = (size, coefficients)
+    if key not in _dct_tables:
+        _dct_tables[key] = [
+            [math.cos(math.pi * k * (2 * n + 1) / (2 * size)) for n in range(size)]
+            for k in range(coefficients)
+        ]
+    return _dct_tables[key]
+
+def phash(img, hash_size=8, highfreq_factor=4):
+    """DCT perceptual hash
+
+    The image is reduced to a (hash_size * highfreq_factor)^2 grayscale square,
+    and only the hash_size x hash_size lowest-frequency DCT coefficients are
+    computed (separable transform). Each bit records whether a coefficient is
+    above the median.
+    """
+    size = hash_size * highfreq_factor
+    small = img.convert('L').resize((size, size), Image.Resampling.LANCZOS)
+    pixels = list(small.getdata())
+    table = _dct_table(size, hash_size)
+
+    # Rows: size rows x hash_size coefficients
+    row_coeffs = []
+    for r in range(size):
+        row = pixels[r * size:(r + 1) * size]
+        row_coeffs.append([sum(c * p for c, p in zip(table[k], row)) for k in range(hash_size)])
+
+    # Columns: hash_size x hash_size low-frequency block
+    coeffs = []
+    for v in range(hash_size):
+        cos_v = table[v]
+        for u in range(hash_size):
+            coeffs.append(sum(cos_v[r] * row_coeffs[r][u] for r in range(size)))
+
+    # Median excludes the DC term, which dominates and carries no structure
+    median = sorted(coeffs[1:])[len(coeffs[1:]) // 2]
+    return _bits_to_int(c > median for c in coeffs)
+
+HASH_FUNCTIONS = {
+    'phash': phash,
+    'dhash': dhash,
+}
+
+def hash_image_file(path, algorithm=IMAGE_HASH_ALGORITHM):
+    """Compute the perceptual hash of an image file"""
+    if not PIL_AVAILABLE:
+        raise ImportError("Pillow is not installed. Install with: pip install Pillow")
+    with Image.open(path) as img:
+        # Thumbnails only need a few pixels - let the JPEG decoder downscale
+        if img.format == 'JPEG':
+            img.draft('L', (64, 64))
+        return HASH_FUNCTIONS[algorithm](img)
+
+# ====================================================================
+# BK-TREE
+# ====================================================================
+
+class BKTree:
+    """BK-tree over integer hashes with Hamming distance
+
+    Each node is [hash, items, children] where children maps the distance
+    from this node to a child node. A radius-r search only descends into
+    children whose edge distance is within [d - r, d + r].
+    """
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, hash_value, item):
+        """Insert an item under a hash (items with equal hashes share a node)"""
+        self.size += 1
+        if self.root is None:
+            self.root = [hash_value, [item], {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming_distance(hash_value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [hash_value, [item], {}]
+                return
+            node = child
+
+    def search(self, hash_value, max_distance):
+        """Return [(distance, hash, items)] for all nodes within max_distance, closest first"""
+        if self.root is None:
+            return []
+        matches = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            distance = hamming_distance(hash_value, node[0])
+            if distance <= max_distance:
+                matches.append((distance, node[0], node[1]))
+            low, high = distance - max_distance, distance + max_distance
+            for edge, child in node[2].items():
+                if low <= edge <= high:
+                    stack.append(child)
+        matches.sort(key=lambda m: m[0])
+        return matches
+
+    def __len__(self):
+        return self.size
+
+# ====================================================================
+# INDEX
+# ====================================================================
+
+class ImageHashIndex:
+    """Persistent perceptual-hash index of listing thumbnails
+
+    Entries map a hash to the listings that used that image. The content
+    SHA-256 (from the image store) is remembered so that an image already
+    hashed is never decoded again.
+    """
+
+    def __init__(self, path=IMAGE_HASH_INDEX_FILE, algorithm=IMAGE_HASH_ALGORITHM,
+                 max_distance=IMAGE_HASH_MAX_DISTANCE):
+        self.path = path
+        self.algorithm = algorithm
+        self.max_distance = max_distance
+        self.tree = BKTree()
+        self.entries = []
+        self.by_sha256 = {}
+        self.first_seen = {}  # listing_id -> added_at of its first entry
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path=IMAGE_HASH_INDEX_FILE, **kwargs):
+        """Load an index from disk (an empty index if the file doesn't exist)"""
+        index = cls(path=path, **kwargs)
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('algorithm', index.algorithm) != index.algorithm:
+                    log_warning(f"Image hash index {path} uses {data.get('algorithm')}, "
+                                f"expected {index.algorithm} - starting a new index")
+                    return index
+                for entry in data.get('entries', []):
+                    index._insert(entry)
+            except (json.JSONDecodeError, OSError) as e:
+                log_warning(f"Could not read image hash index {path}: {e}")
+        index.dirty = False
+        return index
+
+    def save(self):
+        """Write the index to disk if it changed"""
+        if not self.dirty or not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'algorithm': self.algorithm, 'entries': self.entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+    def _insert(self, entry):
+        hash_value = int(entry['hash'], 16)
+        self.entries.append(entry)
+        self.tree.add(hash_value, entry)
+        if entry.get('sha256'):
+            self.by_sha256[entry['sha256']] = hash_value
+        if entry.get('listing_id'):
+            self.first_seen.setdefault(entry['listing_id'], entry.get('added_at') or '')
+        self.dirty = True
+
+    def hash_image_url(self, image_url):
+        """Fetch an image (through the image store) and return (hash, sha256), or (None, None)
+
+        The image store index is not saved here; callers save it once per batch.
+        """
+        from buyee_image_store import fetch_image
+        entry = fetch_image(image_url)
+        if not entry:
+            return None, None
+        sha256 = entry['sha256']
+        if sha256 in self.by_sha256:
+            return self.by_sha256[sha256], sha256
+        try:
+            return hash_image_file(entry['path'], self.algorithm), sha256
+        except Exception as e:
+            log_warning(f"Could not hash image {image_url}: {e}")
+            return None, sha256
+
+    def find(self, hash_value, exclude_listing_id=None, added_before=None):
+        """Return the closest known entry within max_distance as (distance, entry), or None
+
+        With added_before (an ISO timestamp), only entries added earlier count.
+        """
+        for distance, _, items in self.tree.search(hash_value, self.max_distance):
+            for item in items:
+                if item.get('listing_id') == exclude_listing_id:
+                    continue
+                if added_before is not None and (item.get('added_at') or '') >= added_before:
+                    continue
+                return distance, item
+        return None
+
+    def seen_before(self, listing):
+        """Check a Phase 1 listing's thumbnail against the index
+
+        Returns:
+            (hash, match) where match is (distance, entry) for a different
+            listing with a near-identical image, or None. A listing already in
+            the index is only matched against entries added before it was
+            first seen, so the original of a relist is never flagged as a
+            relist of its copy on a later run.
+        """
+        image_url = listing.get('image_url')
+        if not image_url:
+            return None, None
+        hash_value, sha256 = self.hash_image_url(image_url)
+        listing['_image_sha256'] = sha256
+        if hash_value is None:
+            return None, None
+        listing_id = listing.get('listing_id')
+        added_before = self.first_seen.get(listing_id) if listing_id else None
+        return hash_value, self.find(hash_value, exclude_listing_id=listing_id, added_before=added_before)
+
+    def add_listing(self, listing, hash_value):
+        """Record a listing's thumbnail hash (once per listing_id)"""
+        listing_id = listing.get('listing_id')
+        if hash_value is None or (listing_id and listing_id in self.first_seen):
+            return
+        self._insert({
+            'hash': f"{hash_value:016x}",
+            'listing_id': listing_id,
+            'shop_name': listing.get('shop_name'),
+            'image_url': listing.get('image_url'),
+            'sha256': listing.get('_image_sha256'),
+            'added_at': datetime.now().isoformat(),
+        })
+
+    def __len__(self):
+        return len(self.entries)
+
+def split_known_relists(listings, index):
+    """Split Phase 1 listings into (to_scrape, relists) using the hash index
+
+    Relists are listings whose thumbnail is within the index's max distance
+    of an image seen on a different listing. They get 'relist_of' and
+    'relist_distance' fields. Every listing's hash is added to the index
+    (the caller saves it).
+    """
+    from buyee_image_store import save_index
+    to_scrape = []
+    relists = []
+    for listing in listings:
+        hash_value, match = index.seen_before(listing)
+        if match:
+            distance, entry = match
+            listing['relist_of'] = entry.get('listing_id')
+            listing['relist_distance'] = distance
+            relists.append(listing)
+            log_debug("  Known image: %s ~ %s (distance %s)", listing.get('listing_id'), entry.get('listing_id'), distance)
+        else:
+            to_scrape.append(listing)
+        index.add_listing(listing, hash_value)
+        listing.pop('_image_sha256', None)
+    save_index()  # Image store index, once for the whole batch
+    log_info(f"  📊 Image dedup: {len(relists)} known relists, {len(to_scrape)} to scrape")
+    return to_scrape, relists
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Buyee Image Pipeline
+
+Generates every configured image variant (card thumbnail, detail, retina)
+from a single decode of each source image.
+
+- JPEG sources are decoded with PIL draft mode, so the decoder downscales by
+  1/2, 1/4 or 1/8 while decoding instead of materializing full resolution.
+- Variants are produced largest-first, each one resized from the decoded
+  source only once.
+- Sources are processed across a process pool (PIL work is CPU-bound).
+- Outputs are named by the SHA-256 of the input, and a source whose variants
+  already exist is skipped without being decoded.
+
+Variant definitions live in buyee_utils.IMAGE_VARIANTS.
+
+Used by:
+- scripts/download-olympus-images.py
+"""
+
+import os
+import re
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+from buyee_utils import (
+    IMAGE_VARIANTS, IMAGE_VARIANTS_DIR, IMAGE_VARIANT_QUALITY, IMAGE_PIPELINE_MAX_WORKERS,
+    log_info, log_warning, log_error
+)
+
+_SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+FORMAT_EXTENSIONS = {
+    'JPEG': '.jpg',
+    'PNG': '.png',
+    'WEBP': '.webp',
+}
+
+def source_hash(path):
+    """Return the SHA-256 of a source image
+
+    Objects from the image store (buyee_image_store.py) are already named by
+    their hash, so the file is only read when the name is not a hash.
+    """
+    stem = os.path.splitext(os.path.basename(path))[0]
+    if _SHA256_RE.match(stem):
+        return stem
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def variant_path(out_dir, input_hash, name, variants=None):
+    """Return the output path for one variant of an input hash"""
+    variants = variants or IMAGE_VARIANTS
+    fmt = variants[name][3]
+    ext = FORMAT_EXTENSIONS.get(fmt, '.jpg')
+    return os.path.join(out_dir, input_hash[:2], f"{input_hash}_{name}{ext}")
+
+def variant_paths(out_dir, input_hash, variants=None):
+    """Return {variant name: output path} for an input hash"""
+    variants = variants or IMAGE_VARIANTS
+    return {name: variant_path(out_dir, input_hash, name, variants) for name in variants}
+
+def is_processed(out_dir, input_hash, variants=None):
+    """True if every variant for this input hash already exists"""
+    return all(os.path.exists(p) for p in variant_paths(out_dir, input_hash, variants).values())
+
+def decode_source(path, max_size):
+    """Open and decode an image once, letting the JPEG decoder downscale
+
+    Args:
+        path: Source image path
+        max_size: (width, height) of the largest variant that will be produced
+
+    Returns:
+        RGB PIL image, at least max_size in each dimension where the source allows
+    """
+    if not PIL_AVAILABLE:
+        raise ImportError("Pillow is not installed. Install with: pip install Pillow")
+    img = Image.open(path)
+    if img.format == 'JPEG':
+        # draft() picks the smallest DCT scale that still covers max_size
+        img.draft('RGB', max_size)
+    img.load()
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    return img
+
+def make_variant(img, width, height, mode='fit'):
+    """Resize a decoded image to one variant size
+
+    'fit' keeps the aspect ratio within width x height; 'pad' additionally
+    centers the result on a white width x height canvas.
+    """
+    out = img.copy()
+    out.thumbnail((width, height), Image.Resampling.LANCZOS)
+    if mode == 'pad':
+        canvas = Image.new('RGB', (width, height), 'white')
+        canvas.paste(out, ((width - out.width) // 2, (height - out.height) // 2))
+        return canvas
+    return out
+
+def process_source(src_path, out_dir=IMAGE_VARIANTS_DIR, variants=None, input_hash=None):
+    """Produce every variant for one source image (single decode)
+
+    Runs inside a worker process. Variants already on disk are not rewritten.
+
+    Returns:
+        dict with 'source', 'sha256', 'variants' ({name: path}) and 'skipped'
+    """
+    variants = variants or IMAGE_VARIANTS
+    input_hash = input_hash or source_hash(src_path)
+    paths = variant_paths(out_dir, input_hash, variants)
+    result = {'source': src_path, 'sha256': input_hash, 'variants': paths, 'skipped': False}
+
+    missing = [name for name, p in paths.items() if not os.path.exists(p)]
+    if not missing:
+        result['skipped'] = True
+        return result
+
+    max_size = (max(variants[n][0] for n in missing), max(variants[n][1] for n in missing))
+    img = decode_source(src_path, max_size)
+
+    # Largest first: later (smaller) variants reuse the same decoded source
+    for name in sorted(missing, key=lambda n: variants[n][0] * variants[n][1], reverse=True):
+        width, height, mode, fmt = variants[name]
+        out = make_variant(img, width, height, mode)
+        path = paths[name]
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.part"
+        if fmt == 'JPEG':
+            out.save(tmp_path, fmt, quality=IMAGE_VARIANT_QUALITY, optimize=True, progressive=True)
+        else:
+            out.save(tmp_path, fmt)
+        os.replace(tmp_path, path)
+    return result
+
+def run_pipeline(sources, out_dir=IMAGE_VARIANTS_DIR, variants=None, max_workers=IMAGE_PIPELINE_MAX_WORKERS):
+    """Generate variants for many source images across a process pool
+
+    Sources whose variants already exist (by input hash) are skipped in the
+    parent process and never sent to a worker; identical sources are
+    processed once.
+
+    Args:
+        sources: Iterable of source image paths
+        out_dir: Output directory for variants
+        variants: Variant definitions (defaults to IMAGE_VARIANTS)
+        max_workers: Worker process count (None = CPU count)
+
+    Returns:
+        List of result dicts from process_source, in input order
+    """
+    if not PIL_AVAILABLE:
+        log_error("Pillow is not installed. Install with: pip install Pillow")
+        return []
+
+    variants = variants or IMAGE_VARIANTS
+    sources = list(sources)
+    results = [None] * len(sources)
+    pending = []
+    queued = {}  # input hash -> index of the source that produces its variants
+    duplicates = []
+
+    for i, src in enumerate(sources):
+        input_hash = source_hash(src)
+        if input_hash in queued:
+            duplicates.append((i, queued[input_hash]))
+        elif is_processed(out_dir, input_hash, variants):
+            results[i] = {'source': src, 'sha256': input_hash,
+                          'variants': variant_paths(out_dir, input_hash, variants), 'skipped': True}
+        else:
+            queued[input_hash] = i
+            pending.append((i, src, input_hash))
+
+    log_info(f"Image pipeline: {len(pending)} to process, {len(sources) - len(pending)} already done or duplicate")
+
+    if len(pending) <= 1 or max_workers == 1:
+        for i, src, input_hash in pending:
+            try:
+                results[i] = process_source(src, out_dir, variants, input_hash)
+            except Exception as e:
+                log_warning(f"Error processing image {src}: {e}")
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(process_source, src, out_dir, variants, input_hash): (i, src)
+                for i, src, input_hash in pending
+            }
+            for future in as_completed(futures):
+                i, src = futures[future]
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    log_warning(f"Error processing image {src}: {e}")
+
+    for i, first in duplicates:
+        if results[first] is not None:
+            results[i] = dict(results[first], source=sources[i])
+    return results
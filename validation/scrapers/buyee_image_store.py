@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Buyee Image Store
+
+Content-addressed storage for downloaded listing images.
+
+Images are stored once under the SHA-256 of their bytes, so the same CDN image
+referenced by several listings (or fetched again on the next run) takes up
+disk space only once. A URL -> hash index remembers the ETag / Last-Modified
+validators returned by the CDN, and later fetches of the same URL are sent as
+conditional requests (If-None-Match / If-Modified-Since). A 304 response skips
+the download entirely.
+
+Layout:
+    {store_dir}/objects/ab/abcdef...0123.jpg   (image bytes, named by SHA-256)
+    {store_dir}/index.json                      (URL -> hash + validators)
+
+Used by:
+- buyee_utils.download_image (when IMAGE_STORE_ENABLED is True)
+"""
+
+import json
+import os
+import atexit
+import hashlib
+import tempfile
+import requests
+from datetime import datetime
+from urllib.parse import urlparse
+from threading import Lock
+
+from buyee_utils import USER_AGENT, IMAGE_STORE_DIR, IMAGE_STORE_INDEX_FILE, log_debug, log_warning
+
+# Index is shared between worker threads - guard reads/writes
+_index_lock = Lock()
+_index_cache = {}
+_dirty_stores = set()  # Stores whose cached index has entries not yet written to disk
+
+def _index_path(store_dir):
+    return os.path.join(store_dir, IMAGE_STORE_INDEX_FILE)
+
+def object_path(store_dir, sha256, ext='.jpg'):
+    """Return the on-disk path for a content hash
+
+    Objects are fanned out by the first two hex characters of the hash
+    to keep directory sizes manageable.
+    """
+    return os.path.join(store_dir, 'objects', sha256[:2], f"{sha256}{ext}")
+
+def load_index(store_dir=IMAGE_STORE_DIR):
+    """Load the URL -> hash index for a store (cached per store directory)
+
+    Returns:
+        dict mapping image URL to an entry dict with keys:
+        sha256, path, etag, last_modified, content_type, fetched_at
+    """
+    with _index_lock:
+        if store_dir in _index_cache:
+            return _index_cache[store_dir]
+        index = {}
+        path = _index_path(store_dir)
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+            except (json.JSONDecodeError, OSError) as e:
+                log_warning(f"Could not read image index {path}: {e}")
+                index = {}
+        _index_cache[store_dir] = index
+        return index
+
+def save_index(store_dir=IMAGE_STORE_DIR):
+    """Write the cached index for a store back to disk (atomic replace)
+
+    Call once per batch of fetches (the index is rewritten as a whole);
+    does nothing if no fetch changed it since the last save. Unsaved
+    changes are also written at interpreter exit.
+    """
+    with _index_lock:
+        index = _index_cache.get(store_dir)
+        if index is None or store_dir not in _dirty_stores:
+            return
+        _dirty_stores.discard(store_dir)
+        os.makedirs(store_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=store_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, _index_path(store_dir))
+
+def save_all_indexes():
+    """Write every store index with unsaved changes"""
+    for store_dir in list(_dirty_stores):
+        save_index(store_dir)
+
+atexit.register(save_all_indexes)
+
+def _guess_extension(image_url, content_type=None):
+    """Pick a file extension from the URL path, falling back to Content-Type"""
+    ext = os.path.splitext(urlparse(image_url).path)[1].lower()
+    if ext in ('.jpg', '.jpeg', '.png', '.gif', '.webp'):
+        return ext
+    if content_type:
+        content_type = content_type.split(';')[0].strip().lower()
+        return {
+            'image/jpeg': '.jpg',
+            'image/png': '.png',
+            'image/gif': '.gif',
+            'image/webp': '.webp',
+        }.get(content_type, '.jpg')
+    return '.jpg'
+
+def _write_object(store_dir, data, ext):
+    """Write image bytes under their SHA-256, skipping if already stored
+
+    Returns (sha256, path).
+    """
+    sha256 = hashlib.sha256(data).hexdigest()
+    path = object_path(store_dir, sha256, ext)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    return sha256, path
+
+def fetch_image(image_url, store_dir=IMAGE_STORE_DIR, timeout=10, session=None):
+    """Fetch an image into the store, revalidating against the CDN if already known
+
+    If the URL is in the index and its object is still on disk, the request is
+    sent with If-None-Match / If-Modified-Since; a 304 returns the stored entry
+    without downloading anything.
+
+    Args:
+        image_url: Image URL to fetch
+        store_dir: Store root directory
+        timeout: Request timeout in seconds
+        session: Optional requests.Session to reuse connections
+
+    Returns:
+        Index entry dict (with 'sha256', 'path', 'not_modified') or None on failure
+    """
+    index = load_index(store_dir)
+    with _index_lock:
+        entry = dict(index.get(image_url) or {})
+
+    headers = {'User-Agent': USER_AGENT}
+    known = bool(entry.get('path')) and os.path.exists(entry['path'])
+    if known:
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+    http = session or requests
+    try:
+        response = http.get(image_url, headers=headers, timeout=timeout)
+    except Exception as e:
+        log_warning(f"Error downloading image {image_url}: {e}")
+        return None
+
+    if response.status_code == 304 and known:
+        log_debug("  Image not modified (304): %s", image_url)
+        entry['not_modified'] = True
+        return entry
+
+    if response.status_code != 200:
+        log_warning(f"Image download failed ({response.status_code}): {image_url}")
+        return None
+
+    content_type = response.headers.get('Content-Type')
+    ext = _guess_extension(image_url, content_type)
+    sha256, path = _write_object(store_dir, response.content, ext)
+
+    entry = {
+        'sha256': sha256,
+        'path': path,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'content_type': content_type,
+        'fetched_at': datetime.now().isoformat(),
+    }
+    with _index_lock:
+        index[image_url] = entry
+        _dirty_stores.add(store_dir)
+
+    result = dict(entry)
+    result['not_modified'] = False
+    return result
+
+def lookup(image_url, store_dir=IMAGE_STORE_DIR):
+    """Return the stored entry for a URL without touching the network (or None)"""
+    index = load_index(store_dir)
+    with _index_lock:
+        entry = index.get(image_url)
+    if entry and os.path.exists(entry.get('path', '')):
+        return dict(entry)
+    return None
+
+def link_to(entry, dest_path):
+    """Materialize a stored object at dest_path (hard link, falling back to copy)"""
+    if os.path.exists(dest_path):
+        os.remove(dest_path)
+    try:
+        os.link(entry['path'], dest_path)
+    except OSError:
+        import shutil
+        shutil.copyfile(entry['path'], dest_path)
+    return dest_path
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Buyee Image URL Utilities
+
+Canonicalization and size selection for listing image URLs.
+
+Buyee serves thumbnails through a resizing CDN proxy, e.g.:
+    https://cdnyauction-pctr.buyee.jp/i/auctions.c.yimg.jp/images.auctions.yahoo.co.jp/
+        image/dr000/auc0201/user/<hash>/i-img1200x1200-<id>.jpg?pri=l&w=300&h=300&up=0&nf_src=...
+while detail pages reference the origin image directly:
+    https://auctions.c.yimg.jp/images.auctions.yahoo.co.jp/image/dr000/auc0201/user/<hash>/i-img1200x1200-<id>.jpg
+
+Both refer to the same picture. canonical_image_key() collapses proxy and
+origin variants (and Mercari thumbnail/original variants) to one key, and
+sized_image_url() rewrites a proxy URL to request exactly the size we render.
+
+Used by:
+- buyee_search.py (thumbnail size selection)
+- buyee_details.py (image deduplication, detail image size selection)
+"""
+
+import re
+from urllib.parse import urlparse, parse_qsl, urlencode, urlunparse
+
+# Buyee's resizing proxy hosts: /i/<origin host>/<origin path>?w=..&h=..
+PROXY_HOST_RE = re.compile(r'^cdn[a-z]*-pctr\.buyee\.jp$')
+
+# Mercari image paths: thumbnails and originals share the trailing photos/<file>
+# e.g. /c!/w=240,f=webp/thumb/photos/m123_1.jpg, /item/detail/orig/photos/m123_1.jpg
+MERCARI_PHOTO_RE = re.compile(r'/photos/([^/?#]+)$')
+
+def _normalize_url(url):
+    """Make protocol-relative URLs absolute (https)"""
+    if url.startswith('//'):
+        return 'https:' + url
+    return url
+
+def is_proxy_url(url):
+    """True if the URL goes through Buyee's resizing image proxy"""
+    if not url:
+        return False
+    host = urlparse(_normalize_url(url)).netloc.lower()
+    return bool(PROXY_HOST_RE.match(host))
+
+def origin_image_url(url):
+    """Return the origin URL behind a Buyee proxy URL (other URLs unchanged, minus query)"""
+    if not url:
+        return url
+    parsed = urlparse(_normalize_url(url))
+    if PROXY_HOST_RE.match(parsed.netloc.lower()) and parsed.path.startswith('/i/'):
+        origin = parsed.path[len('/i/'):]
+        return f"https://{origin}"
+    return urlunparse((parsed.scheme or 'https', parsed.netloc, parsed.path, '', '', ''))
+
+def canonical_image_key(url):
+    """Return a key that is identical for all size/proxy variants of one image
+
+    - Buyee proxy URLs collapse to their origin host + path
+    - Query strings and fragments are dropped
+    - Mercari thumbnail/original paths collapse to mercari:<file>
+    - Scheme and host case are ignored
+    """
+    if not url:
+        return url
+    origin = origin_image_url(url)
+    parsed = urlparse(origin)
+    host = parsed.netloc.lower()
+    path = parsed.path
+
+    if host.endswith('mercdn.net'):
+        match = MERCARI_PHOTO_RE.search(path)
+        if match:
+            return f"mercari:{match.group(1)}"
+
+    return f"{host}{path}"
+
+def sized_image_url(url, width, height):
+    """Rewrite a Buyee proxy URL to request a specific size
+
+    Only the proxy's w/h parameters are changed; other parameters (priority,
+    no-upscale, fallback image) are kept. Non-proxy URLs are returned unchanged
+    since the origins don't resize.
+    """
+    if not url or not is_proxy_url(url):
+        return url
+    parsed = urlparse(_normalize_url(url))
+    size = {'w': str(width), 'h': str(height)}
+    params = []
+    for key, value in parse_qsl(parsed.query, keep_blank_values=True):
+        if key in size:
+            value = size.pop(key)
+        params.append((key, value))
+    params.extend(size.items())  # Any size parameter that wasn't present
+    return urlunparse((parsed.scheme, parsed.netloc, parsed.path, '', urlencode(params, safe='/'), ''))
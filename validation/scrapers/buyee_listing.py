@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Buyee Listing Record
+
+Compact in-memory record for scraped listings.
+
+A plain dict per listing carries a hash table sized for its keys plus its
+own copy of every repeated string ("Yahoo Japan Auctions" once per
+listing). Listing stores the fields every listing has in __slots__, interns
+the repeated strings (shop name, currency), and only allocates a dict for
+the optional fields (detail-page data, normalized prices, tags) once one is
+set.
+
+Listing behaves like a mutable mapping, so the existing pipeline code
+(listing.get('title'), listing['cluster_id'] = ..., listing.update(detail))
+works unchanged. Conversion to plain dicts happens at the JSON boundary:
+pass json_default to json.dump, or call to_dict().
+
+Used by:
+- buyee_search.py / buyee_details.py (when COMPACT_LISTING_RECORDS is True)
+- buyee_search.py / buyee_details.py (ListingWriter, when MEMORY_BOUNDED_MODE is True)
+
+Memory benchmark:
+    python buyee_listing.py --listings 50000
+"""
+
+import os
+import sys
+import json
+import random
+import argparse
+import tracemalloc
+from itertools import islice
+from collections.abc import MutableMapping
+
+# Fields every Phase 1 listing has, in output order
+CORE_FIELDS = ('listing_id', 'title', 'listing_url', 'image_url', 'shop_name', 'currency',
+               'price', 'current_price', 'buyout_price')
+# Low-cardinality string fields worth interning
+INTERNED_FIELDS = frozenset(['shop_name', 'currency', 'price_currency', 'status', 'condition_grade',
+                             'brand', 'model', 'rank'])
+
+_MISSING = object()
+
+class Listing(MutableMapping):
+    """Slotted listing record with a dict-compatible interface"""
+
+    __slots__ = CORE_FIELDS + ('_extra',)
+
+    def __init__(self, data=None, **fields):
+        self._extra = None
+        if data:
+            self.update(data)
+        if fields:
+            self.update(fields)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a record from a plain dict (e.g. a listing loaded from JSON)"""
+        return cls(data)
+
+    def to_dict(self):
+        """Plain dict copy for JSON output (core fields first)"""
+        return dict(self.items())
+
+    def __getitem__(self, key):
+        if key in CORE_FIELDS:
+            value = getattr(self, key, _MISSING)
+        elif self._extra is not None:
+            value = self._extra.get(key, _MISSING)
+        else:
+            value = _MISSING
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key in INTERNED_FIELDS and type(value) is str:
+            value = sys.intern(value)
+        if key in CORE_FIELDS:
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in CORE_FIELDS:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self._extra is not None and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        if key in CORE_FIELDS:
+            return hasattr(self, key)
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self):
+        for name in CORE_FIELDS:
+            if hasattr(self, name):
+                yield name
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def get(self, key, default=None):
+        # Faster than MutableMapping.get (no exception on a miss)
+        if key in CORE_FIELDS:
+            return getattr(self, key, default)
+        if self._extra is None:
+            return default
+        return self._extra.get(key, default)
+
+    def __eq__(self, other):
+        if isinstance(other, (Listing, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Listing({self.to_dict()!r})"
+
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        self._extra = None
+        self.update(state)
+
+def json_default(obj):
+    """json.dump default= hook: serialize Listing records as plain dicts"""
+    if isinstance(obj, Listing):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def to_records(listings):
+    """Convert plain listing dicts to Listing records (records are kept as-is)"""
+    return [l if isinstance(l, Listing) else Listing.from_dict(l) for l in listings]
+
+# ====================================================================
+# STREAMING (JSON lines)
+# ====================================================================
+
+class ListingWriter:
+    """Appends listings to a JSON lines file as they are produced
+
+    Used by the memory-bounded mode: listings are written out page by page
+    instead of being collected into the results JSON.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._file = open(path, 'w', encoding='utf-8')
+
+    def write(self, listing):
+        self._file.write(json.dumps(listing, ensure_ascii=False, default=json_default))
+        self._file.write('\n')
+        self.count += 1
+
+    def write_all(self, listings):
+        for listing in listings:
+            self.write(listing)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+def iter_listings(path, compact=True):
+    """Read listings back from a JSON lines file one at a time"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                data = json.loads(line)
+                yield Listing.from_dict(data) if compact else data
+
+def result_listings(results, compact=False):
+    """Listings of a results JSON (Phase 2 'sample_data', Phase 1 'all_listings_basic',
+    or the 'listings_file' written in memory-bounded mode)"""
+    listings = results.get('sample_data') or results.get('all_listings_basic')
+    if listings:
+        return to_records(listings) if compact else listings
+    if results.get('listings_file') and os.path.exists(results['listings_file']):
+        return list(iter_listings(results['listings_file'], compact))
+    return []
+
+def iter_result_listings(results, compact=False):
+    """Like result_listings, one listing at a time (a listings_file is read lazily)"""
+    listings = results.get('sample_data') or results.get('all_listings_basic')
+    if listings:
+        if compact:
+            return (l if isinstance(l, Listing) else Listing.from_dict(l) for l in listings)
+        return iter(listings)
+    if results.get('listings_file') and os.path.exists(results['listings_file']):
+        return iter_listings(results['listings_file'], compact)
+    return iter(())
+
+def iter_batches(listings, size):
+    """Group an iterable of listings into lists of up to size listings"""
+    listings = iter(listings)
+    while True:
+        batch = list(islice(listings, size))
+        if not batch:
+            return
+        yield batch
+
+# ====================================================================
+# BENCHMARK
+# ====================================================================
+
+def _synthetic_listing_dicts(count, seed=0):
+    """Phase 1-shaped listing dicts with realistic string values
+
+    Values are built per listing (as scraping or json.load would), so
+    repeated strings are separate objects, like in a real run.
+    """
+    rng = random.Random(seed)
+    shops = ['Yahoo Japan Auctions', 'Yahoo Japan Fleamarket', 'Mercari', 'Rakuma']
+    listings = []
+    for i in range(count):
+        shop = ''.join(rng.choice(shops))  # fresh string object per listing
+        listing_id = f"x{rng.randrange(10**9, 10**10)}"
+        listing = {
+            'title': f"Nikon New FM2 Black Body Ai 50mm F1.4 Film Camera #{i}",
+            'image_url': f"https://cdnimg-pctr.buyee.jp/?url=https%3A%2F%2Fauctions.c.yimg.jp%2Fimages%2F{listing_id}.jpg&w=400&h=300",
+            'listing_url': f"https://buyee.jp/item/jdirectitems/auction/{listing_id}",
+            'listing_id': listing_id,
+            'shop_name': shop,
+            'currency': ''.join('JPY'),
+        }
+        if shop == 'Yahoo Japan Auctions':
+            listing['buyout_price'] = f"{rng.randint(1000, 90000):,} YEN"
+            listing['current_price'] = f"{rng.randint(1000, 90000):,} YEN"
+        else:
+            listing['price'] = f"{rng.randint(1000, 90000):,} YEN"
+        listings.append(listing)
+    return listings
+
+def _measure(build):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = build()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return result, size
+
+def benchmark(listing_count=50000, seed=0):
+    """Compare the memory held by plain dicts vs Listing records (tracemalloc)
+
+    Both variants start from the same JSON text, so string values are
+    allocated the same way json.load would allocate them in Phase 2.
+
+    Returns:
+        dict with bytes held by each representation and per-listing sizes
+    """
+    text = json.dumps(_synthetic_listing_dicts(listing_count, seed))
+
+    dicts, dict_bytes = _measure(lambda: json.loads(text))
+    del dicts
+    records, record_bytes = _measure(lambda: to_records(json.loads(text)))
+    del records
+
+    return {
+        'listings': listing_count,
+        'dict_bytes': dict_bytes,
+        'record_bytes': record_bytes,
+        'dict_bytes_per_listing': round(dict_bytes / listing_count),
+        'record_bytes_per_listing': round(record_bytes / listing_count),
+        'saved_percent': round(100 * (1 - record_bytes / dict_bytes), 1),
+    }
+
+def parse_arguments():
+    """Parse command-line arguments"""
+    parser = argparse.ArgumentParser(
+        description='Memory benchmark: plain dict listings vs compact Listing records',
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--listings', type=int, default=50000, help='Number of listings (default: 50000)')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    print(json.dumps(benchmark(args.listings), indent=2))
+    sys.exit(0)
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Buyee Local Stand-in Server
+
+Serves synthetic Buyee pages locally so the scrapers can be driven through
+thousands of listings for load, concurrency and rate-limit testing without
+touching buyee.jp.
+
+Pages mirror the markup the scrapers read:
+    /                                   homepage with the keyword search form
+    /item/crosssearch?keyword=...       search results (same as below, page 1)
+    /item/crosssearch/query/<term>      search results: li.itemCard cards and
+                                        div.page_navi pagination (?page=N);
+                                        "No items found" past the last page
+    /item/jdirectitems/auction/<id>     Yahoo Japan Auctions detail page
+    /mercari/item/<id>                  Mercari detail page (also /rakuma/item,
+                                        /paypayfleamarket/item)
+    /item/description/<id>              description iframe document
+    /static/buyee/item/<id>.gif         thumbnail / product image (1x1 GIF)
+    /__stats                            request counters (JSON)
+
+Detail pages have div.store-name, section#itemDetail_sec (condition, bids,
+closing time) and section#itemDescription with the description iframe.
+Listings are generated deterministically from their ID, so repeated runs
+see the same data.
+
+Load knobs: per-request latency with jitter, number of result pages and
+cards per page, and injected 429 responses (a random fraction, or bursts
+after every N requests) with a Retry-After header.
+
+Usage:
+    python buyee_local_server.py --port 8765 --pages 50 --per-page 100 --latency-ms 150 --rate-429 0.02
+    BUYEE_BASE_URL=http://127.0.0.1:8765 python buyee_search.py "Nikon FM2"
+"""
+
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from datetime import datetime, timedelta
+from html import escape
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, quote_plus, unquote_plus
+
+from buyee_search_index import BENCHMARK_VOCABULARY
+
+# (shop_name, card store label, detail store-name classes, URL path prefix, ID prefix)
+SHOPS = [
+    ('Yahoo Japan Auctions', 'JDirectItems Auction', 'store-name yauc store-name--jdiaution',
+     '/item/jdirectitems/auction', 'x'),
+    ('Mercari', 'Mercari', 'store-name mercari', '/mercari/item', 'm'),
+    ('Rakuma', 'Rakuten Rakuma', 'store-name rakuma', '/rakuma/item', 'r'),
+    ('Yahoo Japan Fleamarket', 'JDirectItems Fleamarket', 'store-name jdifleamarket',
+     '/paypayfleamarket/item', 'f'),
+]
+SHOP_BY_PREFIX = {shop[4]: shop for shop in SHOPS}
+DETAIL_PATH_RE = re.compile(r'^(?:/item/jdirectitems/auction|/mercari/item|/rakuma/item|/paypayfleamarket/item)/([a-z]\d+)$')
+CONDITIONS = ['Unused', 'Like new', 'No noticeable scratches or stains', 'Some scratches or stains', 'Junk']
+
+# Smallest valid GIF (1x1 transparent)
+PIXEL_GIF = (b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00'
+             b',\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;')
+
+class StandinConfig:
+    """Server knobs (shared by all handler threads)"""
+
+    def __init__(self, pages=5, per_page=50, latency_ms=0, jitter_ms=0, rate_429=0.0,
+                 burst_every=0, burst_length=0, retry_after=5, seed=0):
+        self.pages = pages
+        self.per_page = per_page
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_429 = rate_429
+        self.burst_every = burst_every
+        self.burst_length = burst_length
+        self.retry_after = retry_after
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'search_pages': 0, 'detail_pages': 0, 'descriptions': 0,
+                      'images': 0, 'throttled': 0, 'not_found': 0}
+        self.rng = random.Random(seed)
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+            return self.stats['requests']
+
+    def should_throttle(self, request_number):
+        """Decide whether this request gets a 429"""
+        if self.burst_every and self.burst_length:
+            if request_number % self.burst_every < self.burst_length and request_number >= self.burst_every:
+                return True
+        with self.lock:
+            return self.rate_429 > 0 and self.rng.random() < self.rate_429
+
+def listing_for(listing_id, seed=0):
+    """Deterministic synthetic listing for an ID like 'x0000123'"""
+    rng = random.Random(f"{seed}:{listing_id}")
+    v = BENCHMARK_VOCABULARY
+    shop = SHOP_BY_PREFIX.get(listing_id[0], SHOPS[0])
+    price = rng.randint(30, 3000) * 100
+    return {
+        'listing_id': listing_id,
+        'shop': shop,
+        'title': ' '.join([rng.choice(v['words']), rng.choice(v['brands']), rng.choice(v['models']),
+                           rng.choice(v['lenses']), rng.choice(v['words'])]),
+        'price': price,
+        'buyout_price': price + rng.randint(0, 50) * 100,
+        'bids': rng.randint(0, 30),
+        'condition': rng.choice(CONDITIONS),
+        'closing_time': (datetime(2026, 1, 1) + timedelta(minutes=rng.randint(0, 60 * 24 * 30))).strftime('%Y.%m.%d %H:%M:%S'),
+        'description': ' '.join(rng.choice(v['words']) for _ in range(rng.randint(20, 60))),
+        'seller': f"seller_{rng.randint(1000, 9999)}",
+        'sold': rng.random() < 0.1,
+    }
+
+def search_listing_ids(term, page, per_page, seed=0):
+    """IDs on one results page (stable for a given term and page)"""
+    rng = random.Random(f"{seed}:{term}:{page}")
+    ids = []
+    for i in range(per_page):
+        prefix = rng.choice(SHOPS)[4]
+        ids.append(f"{prefix}{(page - 1) * per_page + i:07d}")
+    return ids
+
+# ====================================================================
+# PAGE TEMPLATES
+# ====================================================================
+
+def render_home():
+    return """<!DOCTYPE html><html><head><title>Buyee (local stand-in)</title></head><body>
+<form action="/item/crosssearch" method="get">
+  <input type="text" name="keyword" id="search-keyword" placeholder="Search">
+  <button type="submit">Search</button>
+</form></body></html>"""
+
+def render_search(base_url, term, page, config):
+    cards = []
+    per_page = config.per_page if page <= config.pages else 0
+    for listing_id in search_listing_ids(term, page, per_page, config.seed):
+        listing = listing_for(listing_id, config.seed)
+        shop_name, store_label, _, path, _ = listing['shop']
+        url = f"{base_url}{path}/{listing_id}"
+        if shop_name == 'Yahoo Japan Auctions':
+            prices = (f'<div class="itemCard__buyoutPrice">Buyout Price ¥{listing["buyout_price"]:,}</div>'
+                      f'<div class="itemCard__currentPrice">Current Price ¥{listing["price"]:,}</div>')
+        else:
+            prices = f'<div class="price">¥{listing["price"]:,}</div>'
+        cards.append(f"""<li class="itemCard">
+  <a href="{url}"><img src="{base_url}/static/buyee/item/{listing_id}.gif" alt="item"></a>
+  <div class="itemCard__itemName"><a href="{url}">{escape(listing['title'])}</a></div>
+  <div class="itemCard__storeName"><font>{store_label}</font></div>
+  {prices}
+</li>""")
+
+    links = []
+    query_path = f"/item/crosssearch/query/{quote_plus(term)}"
+    if page > 1:
+        links.append(f'<a class="prev" href="{query_path}?page={page - 1}">前へ</a>')
+    for number in range(max(1, page - 2), min(config.pages, page + 2) + 1):
+        links.append(f'<a href="{query_path}?page={number}">{number}</a>')
+    if page < config.pages:
+        links.append(f'<a class="next" href="{query_path}?page={page + 1}">次へ</a>')
+
+    return f"""<!DOCTYPE html><html><head><title>{escape(term)} | Buyee (local stand-in)</title></head><body>
+<p class="result-count">{config.pages * config.per_page} results</p>
+<ul class="itemCardList">
+{''.join(cards)}
+</ul>
+{'' if cards else '<p class="no-results">No items found</p>'}
+<div class="page_navi">{' '.join(links)}</div>
+</body></html>"""
+
+def render_detail(base_url, listing):
+    shop_name, _, store_classes, _, _ = listing['shop']
+    listing_id = listing['listing_id']
+    rows = [('Item Condition', listing['condition'])]
+    price_block = f"<div>Price ¥{listing['price']:,}</div>"
+    if shop_name == 'Yahoo Japan Auctions':
+        rows += [('Number of Bids', str(listing['bids'])), ('Closing Time', f"{listing['closing_time']} JST")]
+        price_block = (f"<div>Current Price ¥{listing['price']:,}</div>\n"
+                       f"<div>Buyout Price ¥{listing['buyout_price']:,}</div>")
+    detail_rows = ''.join(
+        f'<li><div class="itemDetail__listName">{name}</div><div class="itemDetail__listValue">{escape(value)}</div></li>'
+        for name, value in rows
+    )
+    images = ''.join(f'<img src="{base_url}/static/buyee/item/{listing_id}-{i}.gif" alt="photo">' for i in range(4))
+    return f"""<!DOCTYPE html><html><head><title>{escape(listing['title'])} | Buyee</title></head><body>
+<div class="{store_classes}">{shop_name}</div>
+<h1 class="itemTitle">{escape(listing['title'])}</h1>
+{price_block}
+<p>{'Sold out' if listing['sold'] else 'Available'}</p>
+<section id="itemDetail_sec"><ul>{detail_rows}</ul></section>
+<div class="itemPhotos">{images}</div>
+<p>Seller: {listing['seller']}</p>
+<p>Shipping: Domestic shipping ¥{800 + listing['bids'] * 10:,}</p>
+<section id="itemDescription"><iframe src="/item/description/{listing_id}" width="100%" height="400"></iframe></section>
+</body></html>"""
+
+def render_description(listing):
+    return f"""<!DOCTYPE html><html><head><title>description</title></head><body>
+<section id="item-description">{escape(listing['description'])}</section>
+</body></html>"""
+
+# ====================================================================
+# SERVER
+# ====================================================================
+
+class StandinHandler(BaseHTTPRequestHandler):
+    """Routes requests to the page templates, applying latency and 429 injection"""
+
+    server_version = 'BuyeeStandin/1.0'
+
+    def log_message(self, format, *args):
+        pass  # Keep the scraper's console output readable
+
+    def _send(self, status, body, content_type='text/html; charset=utf-8', headers=None):
+        data = body if isinstance(body, bytes) else body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        config = self.server.config
+        request_number = config.count('requests')
+        parsed = urlparse(self.path)
+        path = parsed.path
+        query = parse_qs(parsed.query)
+
+        if path == '/__stats':
+            with config.lock:
+                self._send(200, json.dumps(config.stats), 'application/json')
+            return
+
+        if config.latency_ms or config.jitter_ms:
+            time.sleep(max(0.0, config.latency_ms + random.uniform(-config.jitter_ms, config.jitter_ms)) / 1000)
+
+        is_image = path.startswith('/static/')
+        if not is_image and config.should_throttle(request_number):
+            config.count('throttled')
+            self._send(429, '<html><head><title>429 Too Many Requests</title></head>'
+                            '<body><h1>Too Many Requests</h1></body></html>',
+                       headers={'Retry-After': str(config.retry_after)})
+            return
+
+        base_url = f"http://{self.headers.get('Host', '127.0.0.1')}"
+        if path == '/':
+            self._send(200, render_home())
+        elif path == '/item/crosssearch' or path.startswith('/item/crosssearch/query/'):
+            term = query.get('keyword', [''])[0] or unquote_plus(path.rsplit('/', 1)[-1])
+            page = int(query.get('page', ['1'])[0] or 1)
+            if page > config.pages:
+                config.count('not_found')
+                self._send(404, '<html><head><title>Not Found</title></head><body></body></html>')
+                return
+            config.count('search_pages')
+            self._send(200, render_search(base_url, term, page, config))
+        elif path.startswith('/item/description/'):
+            config.count('descriptions')
+            self._send(200, render_description(listing_for(path.rsplit('/', 1)[-1], config.seed)))
+        elif path.startswith('/static/'):
+            config.count('images')
+            self._send(200, PIXEL_GIF, 'image/gif', headers={'Cache-Control': 'max-age=86400'})
+        elif DETAIL_PATH_RE.match(path):
+            config.count('detail_pages')
+            listing_id = DETAIL_PATH_RE.match(path).group(1)
+            self._send(200, render_detail(base_url, listing_for(listing_id, config.seed)))
+        else:
+            config.count('not_found')
+            self._send(404, '<html><head><title>Not Found</title></head><body></body></html>')
+
+def start_server(host='127.0.0.1', port=8765, config=None, background=False):
+    """Start the stand-in server
+
+    Args:
+        background: Serve from a daemon thread and return the server
+                    (call server.shutdown() to stop); otherwise block.
+    """
+    server = ThreadingHTTPServer((host, port), StandinHandler)
+    server.daemon_threads = True
+    server.config = config or StandinConfig()
+    if background:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return server
+
+def parse_arguments():
+    """Parse command-line arguments"""
+    parser = argparse.ArgumentParser(
+        description='Local Buyee stand-in server for load and rate-limit testing',
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--host', default='127.0.0.1', help='Bind address (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8765, help='Port (default: 8765)')
+    parser.add_argument('--pages', type=int, default=5, help='Search result pages (default: 5)')
+    parser.add_argument('--per-page', type=int, default=50, help='Cards per results page (default: 50)')
+    parser.add_argument('--latency-ms', type=float, default=0, help='Added latency per request (default: 0)')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='Random +/- latency jitter (default: 0)')
+    parser.add_argument('--rate-429', type=float, default=0.0, help='Fraction of page requests answered 429 (default: 0)')
+    parser.add_argument('--burst-every', type=int, default=0, help='Start a 429 burst every N requests (default: off)')
+    parser.add_argument('--burst-length', type=int, default=0, help='Requests per 429 burst (default: 0)')
+    parser.add_argument('--retry-after', type=int, default=5, help='Retry-After seconds on 429 (default: 5)')
+    parser.add_argument('--seed', type=int, default=0, help='Data seed (default: 0)')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    config = StandinConfig(pages=args.pages, per_page=args.per_page, latency_ms=args.latency_ms,
+                           jitter_ms=args.jitter_ms, rate_429=args.rate_429, burst_every=args.burst_every,
+                           burst_length=args.burst_length, retry_after=args.retry_after, seed=args.seed)
+    print(f"Buyee stand-in serving {args.pages} pages x {args.per_page} listings on http://{args.host}:{args.port}")
+    print(f"Run the scrapers with: BUYEE_BASE_URL=http://{args.host}:{args.port}")
+    start_server(args.host, args.port, config)
+    sys.exit(0)
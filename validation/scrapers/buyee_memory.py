@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Buyee Memory-Bounded Mode
+
+Helpers that keep long scraping runs at a flat memory footprint:
+
+- PageRecycler: hands out one page and closes/recreates its browser context
+  after MEMORY_RECYCLE_AFTER_NAVIGATIONS navigations. Chromium renderer and
+  V8 heaps grow with every page a context has visited; a fresh context
+  returns that memory. Recycling waits until the page is not in use.
+- MemoryMonitor: samples the RSS of this process and of the browser
+  processes (Playwright driver + Chromium) and reports the peaks per run.
+
+Listings are streamed to a JSON lines file with buyee_listing.ListingWriter
+instead of being held in the results JSON, and raw page HTML is dropped as
+soon as it has been parsed (MEMORY_KEEP_RAW_HTML keeps it).
+
+Used by:
+- buyee_search.py / buyee_details.py (when MEMORY_BOUNDED_MODE is True)
+
+Optional: psutil for browser process RSS (pip install psutil); without it
+only this process's peak RSS is reported.
+"""
+
+import sys
+import threading
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Windows
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+from buyee_utils import create_browser_context, log_debug
+
+MB = 1024 * 1024
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (from getrusage), or None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / MB if sys.platform == 'darwin' else peak / 1024, 1)
+
+class MemoryMonitor:
+    """Tracks current and peak RSS of this process and its browser processes"""
+
+    def __init__(self):
+        self.samples = 0
+        self.browser_peak_mb = 0.0
+        self.total_peak_mb = 0.0
+        self._process = psutil.Process() if PSUTIL_AVAILABLE else None
+
+    def sample(self):
+        """Take one RSS sample (call after each navigation); returns total MB or None"""
+        if self._process is None:
+            return None
+        try:
+            own = self._process.memory_info().rss
+            browser = 0
+            for child in self._process.children(recursive=True):
+                try:
+                    browser += child.memory_info().rss
+                except psutil.Error:
+                    continue  # Renderer exited between listing and reading
+        except psutil.Error:
+            return None
+        self.samples += 1
+        self.browser_peak_mb = max(self.browser_peak_mb, round(browser / MB, 1))
+        total = round((own + browser) / MB, 1)
+        self.total_peak_mb = max(self.total_peak_mb, total)
+        return total
+
+    def report(self):
+        """Peak RSS figures for the results JSON"""
+        report = {'python_peak_rss_mb': peak_rss_mb()}
+        if self._process is not None:
+            self.sample()
+            report['browser_peak_rss_mb'] = self.browser_peak_mb
+            report['total_peak_rss_mb'] = self.total_peak_mb
+            report['samples'] = self.samples
+        return report
+
+class PageRecycler:
+    """One page whose browser context is replaced every recycle_after navigations
+
+    Usage:
+        recycler = PageRecycler(browser, recycle_after=50)
+        with recycler.use() as page:
+            page.goto(url)
+        recycler.close()
+    """
+
+    def __init__(self, browser, recycle_after=None, context_factory=None, monitor=None, on_page=None):
+        self.browser = browser
+        self.recycle_after = recycle_after
+        self.context_factory = context_factory or create_browser_context
+        self.monitor = monitor
+        self.on_page = on_page  # Called with every new page (e.g. to attach event listeners)
+        self.recycles = 0
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._navigations = 0
+        self._context = self.context_factory(browser)
+        self._page = self._new_page()
+
+    def _new_page(self):
+        page = self._context.new_page()
+        if self.on_page is not None:
+            self.on_page(page)
+        return page
+
+    @property
+    def page(self):
+        return self._page
+
+    def _recycle(self):
+        self._context.close()
+        self._context = self.context_factory(self.browser)
+        self._page = self._new_page()
+        self._navigations = 0
+        self.recycles += 1
+        log_debug("  ♻️ Recycled browser context (%d so far)", self.recycles)
+
+    @contextmanager
+    def use(self):
+        """Borrow the page for one navigation"""
+        with self._lock:
+            if self.recycle_after and self._navigations >= self.recycle_after and self._in_use == 0:
+                self._recycle()
+            self._in_use += 1
+            self._navigations += 1
+            page = self._page
+        try:
+            yield page
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            if self.monitor is not None:
+                self.monitor.sample()
+
+    def close(self):
+        with self._lock:
+            self._context.close()
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Buyee Price Series
+
+Market price history per camera model, fed by each scrape run.
+
+Every listing with a recognized brand/model (buyee_entities) and a
+reference-currency price (buyee_prices) is recorded as an observation in
+two series: the model across all conditions, and the model in its
+condition grade. Junk/for-parts listings (condition_grade 'Poor') only go
+into their condition series so they don't drag down the model's value.
+
+    nikon/new fm2          all conditions except Poor
+    nikon/new fm2/good     condition_grade Good only
+
+Series are stored as typed arrays (array module), one file per series:
+raw observations (timestamp, price, listing key) plus daily and weekly
+rollup rows (bucket start, count, p25, median, p75). A listing observed
+several times within one bucket counts once (its latest price). When new
+observations arrive, only the buckets they fall into are recomputed, and
+value queries read rollup rows instead of rescanning observations.
+
+Layout:
+    {PRICE_SERIES_DIR}/index.json             series key -> metadata
+    {PRICE_SERIES_DIR}/series/<slug>.bin      observations + rollups
+
+Used by:
+- buyee_details.py (when PRICE_SERIES_ENABLED is True)
+- buyee_valuation.py
+
+Can also be run directly:
+    python buyee_price_series.py add validation/results/buyee_details_results.json
+    python buyee_price_series.py value "Nikon" "New FM2" [--condition Good]
+"""
+
+import os
+import re
+import sys
+import json
+import struct
+import hashlib
+import argparse
+import tempfile
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+
+from buyee_listing import result_listings
+from buyee_utils import PRICE_SERIES_DIR, PRICE_SERIES_VALUE_WINDOW_DAYS, log_info, log_warning
+
+DAY = 86400
+WEEK = 7 * DAY
+# Weekly buckets start on Monday (the Unix epoch was a Thursday)
+WEEK_OFFSET = 3 * DAY
+
+RESOLUTIONS = {'daily': (DAY, 0), 'weekly': (WEEK, WEEK_OFFSET)}
+ROLLUP_WIDTH = 5  # bucket_start, count, p25, median, p75
+
+FILE_MAGIC = b'BPS1'
+HEADER = struct.Struct('<4sIII')  # magic, observations, daily rows, weekly rows
+
+def _normalize(text):
+    return re.sub(r'\s+', ' ', (text or '').strip().lower().replace('-', ''))
+
+def series_key(brand, model, condition=None):
+    """Normalized series key: 'nikon/new fm2' or 'nikon/new fm2/good'"""
+    key = f"{_normalize(brand)}/{_normalize(model)}"
+    if condition:
+        key += f"/{_normalize(condition)}"
+    return key
+
+def listing_key(listing_id):
+    """Stable 63-bit integer key for a listing ID"""
+    digest = hashlib.blake2b(str(listing_id).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') >> 1
+
+def _slug(key):
+    readable = re.sub(r'[^a-z0-9]+', '-', key).strip('-')[:60]
+    return f"{readable}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:8]}"
+
+def quantile(sorted_values, q):
+    """Linear-interpolated quantile of an already sorted sequence"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+def bucket_start(timestamp, resolution):
+    size, offset = RESOLUTIONS[resolution]
+    return ((int(timestamp) + offset) // size) * size - offset
+
+class PriceSeries:
+    """Observations and rollups for one series, kept sorted by timestamp"""
+
+    def __init__(self, key):
+        self.key = key
+        self.timestamps = array('d')
+        self.prices = array('d')
+        self.listing_keys = array('q')
+        self.rollups = {resolution: array('d') for resolution in RESOLUTIONS}
+        self.dirty_buckets = {resolution: set() for resolution in RESOLUTIONS}
+
+    def add(self, timestamp, price, key):
+        """Record one observation (out-of-order timestamps are inserted in place)"""
+        if not self.timestamps or timestamp >= self.timestamps[-1]:
+            self.timestamps.append(timestamp)
+            self.prices.append(price)
+            self.listing_keys.append(key)
+        else:
+            position = bisect_right(self.timestamps, timestamp)
+            self.timestamps.insert(position, timestamp)
+            self.prices.insert(position, price)
+            self.listing_keys.insert(position, key)
+        for resolution in RESOLUTIONS:
+            self.dirty_buckets[resolution].add(bucket_start(timestamp, resolution))
+
+    def _bucket_prices(self, start, size):
+        """Prices in [start, start + size), latest observation per listing"""
+        lo = bisect_left(self.timestamps, start)
+        hi = bisect_left(self.timestamps, start + size)
+        latest = {}
+        for i in range(lo, hi):
+            latest[self.listing_keys[i]] = self.prices[i]
+        return sorted(latest.values())
+
+    def refresh_rollups(self):
+        """Recompute only the rollup rows for buckets that received observations"""
+        for resolution, dirty in self.dirty_buckets.items():
+            if not dirty:
+                continue
+            size, _ = RESOLUTIONS[resolution]
+            rows = {}
+            table = self.rollups[resolution]
+            for i in range(0, len(table), ROLLUP_WIDTH):
+                rows[table[i]] = table[i:i + ROLLUP_WIDTH]
+            for start in dirty:
+                prices = self._bucket_prices(start, size)
+                rows[float(start)] = array('d', [start, len(prices), quantile(prices, 0.25),
+                                                 quantile(prices, 0.5), quantile(prices, 0.75)])
+            table = array('d')
+            for start in sorted(rows):
+                table.extend(rows[start])
+            self.rollups[resolution] = table
+            dirty.clear()
+
+    def rollup_rows(self, resolution='daily', start=None, end=None):
+        """Rollup rows as dicts, optionally limited to buckets starting in [start, end]"""
+        table = self.rollups[resolution]
+        rows = []
+        for i in range(0, len(table), ROLLUP_WIDTH):
+            bucket, count, p25, median, p75 = table[i:i + ROLLUP_WIDTH]
+            if (start is not None and bucket < start) or (end is not None and bucket > end):
+                continue
+            rows.append({
+                'bucket_start': datetime.fromtimestamp(bucket, timezone.utc).strftime('%Y-%m-%d'),
+                'count': int(count), 'p25': p25, 'median': median, 'p75': p75,
+            })
+        return rows
+
+    def to_bytes(self):
+        header = HEADER.pack(FILE_MAGIC, len(self.timestamps),
+                             len(self.rollups['daily']) // ROLLUP_WIDTH,
+                             len(self.rollups['weekly']) // ROLLUP_WIDTH)
+        return b''.join([header, self.timestamps.tobytes(), self.prices.tobytes(),
+                         self.listing_keys.tobytes(), self.rollups['daily'].tobytes(),
+                         self.rollups['weekly'].tobytes()])
+
+    @classmethod
+    def from_bytes(cls, key, data):
+        magic, observations, daily_rows, weekly_rows = HEADER.unpack_from(data)
+        if magic != FILE_MAGIC:
+            raise ValueError(f"Not a price series file: {key}")
+        series = cls(key)
+        offset = HEADER.size
+        for target, count in ((series.timestamps, observations), (series.prices, observations),
+                              (series.listing_keys, observations),
+                              (series.rollups['daily'], daily_rows * ROLLUP_WIDTH),
+                              (series.rollups['weekly'], weekly_rows * ROLLUP_WIDTH)):
+            size = count * target.itemsize
+            target.frombytes(data[offset:offset + size])
+            offset += size
+        return series
+
+class PriceSeriesStore:
+    """Directory of price series, loaded lazily and saved when changed"""
+
+    def __init__(self, store_dir=PRICE_SERIES_DIR):
+        self.store_dir = store_dir
+        self.index = {}
+        self.series = {}
+        self.changed = set()
+        index_path = os.path.join(store_dir, 'index.json')
+        if os.path.exists(index_path):
+            try:
+                with open(index_path, 'r', encoding='utf-8') as f:
+                    self.index = json.load(f)
+            except (json.JSONDecodeError, OSError) as e:
+                log_warning(f"Could not read price series index {index_path}: {e}")
+
+    def _path(self, key):
+        return os.path.join(self.store_dir, 'series', f"{_slug(key)}.bin")
+
+    def get(self, key, create=False):
+        """Return the series for a key (None if unknown and create is False)"""
+        if key in self.series:
+            return self.series[key]
+        if key in self.index:
+            with open(self._path(key), 'rb') as f:
+                self.series[key] = PriceSeries.from_bytes(key, f.read())
+        elif create:
+            self.series[key] = PriceSeries(key)
+        return self.series.get(key)
+
+    def add(self, key, timestamp, price, listing_id):
+        self.get(key, create=True).add(timestamp, price, listing_key(listing_id))
+        self.changed.add(key)
+
+    def add_listings(self, listings, observed_at=None):
+        """Record the reference prices of tagged listings
+
+        Returns:
+            Set of series keys that received observations
+        """
+        observed_at = observed_at or datetime.now(timezone.utc)
+        timestamp = observed_at.timestamp()
+        touched = set()
+        for listing in listings:
+            brand, model = listing.get('brand'), listing.get('model')
+            price = listing.get('price_reference')
+            if not brand or not model or price is None or not listing.get('listing_id'):
+                continue
+            condition = listing.get('condition_grade')
+            keys = [series_key(brand, model, condition)] if condition else []
+            if condition != 'Poor':
+                keys.append(series_key(brand, model))
+            for key in keys:
+                self.add(key, timestamp, float(price), listing['listing_id'])
+                touched.add(key)
+        return touched
+
+    def save(self):
+        """Refresh rollups and write every changed series plus the index"""
+        if not self.changed:
+            return
+        os.makedirs(os.path.join(self.store_dir, 'series'), exist_ok=True)
+        now = datetime.now().isoformat()
+        for key in sorted(self.changed):
+            series = self.series[key]
+            series.refresh_rollups()
+            path = self._path(key)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(series.to_bytes())
+            os.replace(tmp_path, path)
+            self.index[key] = {
+                'observations': len(series.timestamps),
+                'last_observed_at': datetime.fromtimestamp(series.timestamps[-1], timezone.utc).isoformat(),
+                'updated_at': now,
+            }
+        fd, tmp_path = tempfile.mkstemp(dir=self.store_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(self.store_dir, 'index.json'))
+        self.changed.clear()
+
+    def keys_updated_since(self, since_iso):
+        """Series keys whose observations changed after an ISO timestamp (all if None)"""
+        if not since_iso:
+            return set(self.index)
+        return {key for key, meta in self.index.items() if meta.get('updated_at', '') > since_iso}
+
+    def market_value(self, key, window_days=PRICE_SERIES_VALUE_WINDOW_DAYS, now=None):
+        """Estimate current market value from the weekly rollups in a trailing window
+
+        The median/p25/p75 are count-weighted medians of the weekly values,
+        which approximates the quantiles of the underlying observations.
+
+        Returns:
+            dict (median, p25, p75, count, weeks, last_bucket) or None if no data
+        """
+        series = self.get(key)
+        if series is None:
+            return None
+        series.refresh_rollups()
+        now = now or datetime.now(timezone.utc)
+        start = bucket_start(now.timestamp() - window_days * DAY, 'weekly')
+        rows = [row for row in series.rollup_rows('weekly', start=start) if row['count']]
+        if not rows:
+            return None
+        return {
+            'median': _weighted_median([(row['median'], row['count']) for row in rows]),
+            'p25': _weighted_median([(row['p25'], row['count']) for row in rows]),
+            'p75': _weighted_median([(row['p75'], row['count']) for row in rows]),
+            'count': sum(row['count'] for row in rows),
+            'weeks': len(rows),
+            'last_bucket': rows[-1]['bucket_start'],
+        }
+
+def _weighted_median(pairs):
+    pairs = sorted(pairs)
+    half = sum(weight for _, weight in pairs) / 2
+    running = 0
+    for value, weight in pairs:
+        running += weight
+        if running >= half:
+            return value
+    return pairs[-1][0]
+
+def record_run(listings, observed_at=None, store_dir=PRICE_SERIES_DIR):
+    """Add one run's listings to the price series store and save it
+
+    Returns:
+        Number of series updated
+    """
+    store = PriceSeriesStore(store_dir)
+    touched = store.add_listings(listings, observed_at)
+    store.save()
+    log_info(f"  📈 Price series: {len(touched)} series updated")
+    return len(touched)
+
+def parse_arguments():
+    """Parse command-line arguments"""
+    parser = argparse.ArgumentParser(
+        description='Per-model market price series from Buyee results',
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--store-dir', dest='store_dir', default=PRICE_SERIES_DIR,
+                        help=f'Series directory (default: {PRICE_SERIES_DIR})')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    add_parser = subparsers.add_parser('add', help='Record the listings of a results JSON file')
+    add_parser.add_argument('input_file', help='Results JSON from buyee_details.py or buyee_search.py')
+
+    value_parser = subparsers.add_parser('value', help='Show the market value and weekly rollups of a model')
+    value_parser.add_argument('brand')
+    value_parser.add_argument('model')
+    value_parser.add_argument('--condition', default=None, help='Condition grade (Mint, Excellent, Good, Fair, Poor)')
+    value_parser.add_argument('--days', type=int, default=PRICE_SERIES_VALUE_WINDOW_DAYS,
+                              help=f'Trailing window in days (default: {PRICE_SERIES_VALUE_WINDOW_DAYS})')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    if args.command == 'add':
+        with open(args.input_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        listings = result_listings(data)
+        # Older results files predate price normalization / entity tagging
+        if listings and 'price_reference' not in listings[0]:
+            from buyee_prices import normalize_listing_prices
+            normalize_listing_prices(listings)
+        if listings and 'brand' not in listings[0]:
+            from buyee_entities import tag_listings
+            tag_listings(listings)
+        observed_at = datetime.fromisoformat(data['test_date']).astimezone(timezone.utc) if data.get('test_date') else None
+        record_run(listings, observed_at, args.store_dir)
+        sys.exit(0)
+
+    store = PriceSeriesStore(args.store_dir)
+    key = series_key(args.brand, args.model, args.condition)
+    value = store.market_value(key, args.days)
+    if value is None:
+        log_warning(f"No observations for {key}")
+        sys.exit(1)
+    print(json.dumps({'series': key, 'value': value,
+                      'weekly': store.get(key).rollup_rows('weekly')}, indent=2))
+    sys.exit(0)
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Buyee Price Normalization
+
+Parses scraped price strings into (amount, currency) once, so later sorting,
+filtering and stats work on numbers instead of re-parsing strings.
+
+Scraped prices come in several shapes:
+- "35.93", "1,431.42"     (Phase 1 display-currency prices, no symbol)
+- "¥12,000", "12,000円"   (JPY from the JPY-first regexes)
+- "BRL 190.50", "USD 35"  (other display currencies)
+
+A whole column of strings is parsed in one regex pass (the strings are
+joined with newlines and matched line by line in C), and amounts are
+converted with NumPy when it is available. Amounts are converted to
+PRICE_REFERENCE_CURRENCY using a local FX table.
+
+Used by:
+- buyee_search.py (Phase 1 listings)
+- buyee_details.py (Phase 2 listings, after detail prices are merged)
+"""
+
+import re
+import os
+import json
+from decimal import Decimal, InvalidOperation
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+from buyee_utils import (
+    PRICE_REFERENCE_CURRENCY, PRICE_FX_RATES_FILE, PRICE_FX_RATES,
+    log_warning
+)
+
+# Currency markers -> ISO code
+CURRENCY_MARKERS = {
+    '¥': 'JPY', '￥': 'JPY', '円': 'JPY', 'YEN': 'JPY', 'JPY': 'JPY',
+    'US$': 'USD', '$': 'USD', 'USD': 'USD',
+    'R$': 'BRL', 'BRL': 'BRL',
+    '€': 'EUR', 'EUR': 'EUR',
+}
+
+_MARKER_PATTERN = '|'.join(re.escape(m) for m in sorted(CURRENCY_MARKERS, key=len, reverse=True))
+
+# One line = one price string: optional marker, number, optional marker, anything else
+PRICE_LINE_RE = re.compile(
+    rf'^[^\S\n]*(?P<pre>{_MARKER_PATTERN})?[^\S\n]*(?P<num>\d[\d,]*(?:\.\d+)?)?'
+    rf'[^\S\n]*(?P<post>{_MARKER_PATTERN})?[^\n]*$',
+    re.MULTILINE | re.IGNORECASE
+)
+
+# Any marker inside free text (e.g. "US $35.93", "¥5,000 (approx.)", a header "JPY")
+CURRENCY_MARKER_RE = re.compile(rf'(?<![A-Za-z])(?:{_MARKER_PATTERN})(?![A-Za-z])', re.IGNORECASE)
+
+def _currency_code(marker):
+    if not marker:
+        return None
+    return CURRENCY_MARKERS.get(marker) or CURRENCY_MARKERS.get(marker.upper())
+
+def parse_price(text, default_currency=None):
+    """Parse a single price string
+
+    Returns:
+        (Decimal amount or None, currency code or None)
+    """
+    if not text:
+        return None, None
+    match = PRICE_LINE_RE.match(' '.join(str(text).split()))
+    if not match or not match.group('num'):
+        return None, None
+    try:
+        amount = Decimal(match.group('num').replace(',', ''))
+    except InvalidOperation:
+        return None, None
+    currency = _currency_code(match.group('pre')) or _currency_code(match.group('post')) or default_currency
+    return amount, currency
+
+def detect_currency(texts):
+    """Return the one currency marked across texts
+
+    Returns None when no text carries a marker or the markers disagree, so
+    an unverified display currency is never guessed.
+    """
+    codes = {_currency_code(marker) for text in texts if text
+             for marker in CURRENCY_MARKER_RE.findall(str(text))}
+    return codes.pop() if len(codes) == 1 else None
+
+def parse_prices(values, default_currency=None):
+    """Parse a column of price strings in one pass
+
+    Args:
+        values: Sequence of price strings (None/'' allowed)
+        default_currency: Currency for values without a marker (e.g. the
+            session display currency), or None to leave it unknown
+
+    Returns:
+        (amounts, currencies) - NumPy float64 array (NaN for unparseable) and
+        object array when NumPy is available, otherwise two lists
+        (None for unparseable)
+    """
+    # Newlines inside a value would break the one-line-per-value mapping
+    lines = [' '.join(str(v).split()) if v else '' for v in values]
+    numbers = []
+    currencies = []
+    for match in PRICE_LINE_RE.finditer('\n'.join(lines)):
+        num = match.group('num')
+        numbers.append(num.replace(',', '') if num else None)
+        if num:
+            currencies.append(_currency_code(match.group('pre')) or
+                              _currency_code(match.group('post')) or default_currency)
+        else:
+            currencies.append(None)
+
+    if NUMPY_AVAILABLE:
+        amounts = np.array([n if n is not None else 'nan' for n in numbers], dtype=np.float64)
+        return amounts, np.array(currencies, dtype=object)
+    return [float(n) if n is not None else None for n in numbers], currencies
+
+def load_fx_rates(path=PRICE_FX_RATES_FILE):
+    """Return the FX table (reference units per 1 unit), local file overriding defaults"""
+    rates = dict(PRICE_FX_RATES)
+    if path and os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                rates.update({k.upper(): float(v) for k, v in json.load(f).items()})
+        except (json.JSONDecodeError, OSError, ValueError, AttributeError) as e:
+            log_warning(f"Could not read FX rates {path}: {e}")
+    return rates
+
+def convert_prices(amounts, currencies, to_currency=PRICE_REFERENCE_CURRENCY, rates=None):
+    """Convert parsed amounts to one currency
+
+    Unknown currencies (or currencies missing from the FX table) give NaN/None.
+    """
+    rates = rates or load_fx_rates()
+    target = rates.get(to_currency)
+    if not target:
+        log_warning(f"No FX rate for reference currency {to_currency}")
+        target = float('nan')
+
+    if NUMPY_AVAILABLE and isinstance(amounts, np.ndarray):
+        factors = np.array([rates.get(c, np.nan) if c else np.nan for c in currencies], dtype=np.float64)
+        return amounts * factors / target
+
+    converted = []
+    for amount, currency in zip(amounts, currencies):
+        rate = rates.get(currency) if currency else None
+        converted.append(amount * rate / target if amount is not None and rate else None)
+    return converted
+
+# Fields holding a price string, in order of preference for the listing's main price
+PRICE_FIELDS = ('price', 'current_price', 'buyout_price')
+
+def _to_json_number(value):
+    if value is None:
+        return None
+    value = float(value)
+    if value != value:  # NaN
+        return None
+    return round(value, 2)
+
+def normalize_listing_prices(listings, default_currency=None, to_currency=PRICE_REFERENCE_CURRENCY):
+    """Add parsed price fields to listings in place, one column at a time
+
+    For every price string field present ('price', 'current_price',
+    'buyout_price') adds '<field>_amount'. Each listing also gets:
+    - 'price_amount' / 'price_currency': the main price (first non-empty of PRICE_FIELDS)
+    - 'price_reference': price_amount converted to to_currency
+
+    A listing's own 'currency' field (set by the search session) takes
+    precedence over default_currency for values without a marker.
+    """
+    if not listings:
+        return listings
+    rates = load_fx_rates()
+
+    main_amounts = [None] * len(listings)
+    main_currencies = [None] * len(listings)
+
+    for field in PRICE_FIELDS:
+        rows = [i for i, l in enumerate(listings) if l.get(field)]
+        if not rows:
+            continue
+        column = [listings[i][field] for i in rows]
+        amounts, currencies = parse_prices(column)
+        for pos, i in enumerate(rows):
+            listing = listings[i]
+            # Unmarked value: the listing's recorded display currency, then the default
+            currency = currencies[pos] or listing.get('currency') or default_currency
+            amount = _to_json_number(amounts[pos])
+            listing[f'{field}_amount'] = amount
+            if main_amounts[i] is None and amount is not None:
+                main_amounts[i] = amount
+                main_currencies[i] = currency
+
+    if NUMPY_AVAILABLE:
+        reference = convert_prices(
+            np.array([a if a is not None else np.nan for a in main_amounts], dtype=np.float64),
+            main_currencies, to_currency, rates)
+    else:
+        reference = convert_prices(main_amounts, main_currencies, to_currency, rates)
+
+    for i, listing in enumerate(listings):
+        listing['price_amount'] = main_amounts[i]
+        listing['price_currency'] = main_currencies[i]
+        listing['price_reference'] = _to_json_number(reference[i])
+    return listings
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Buyee Adaptive Rate Limiter
+
+One limiter paces every request the scrapers make to Buyee (search
+pagination and Phase 2 detail workers), combining two controls:
+
+- Token bucket: requests start at most `rate` per second (with a small
+  burst allowance).
+- AIMD concurrency window: at most `limit` requests are in flight.
+
+Both adapt to how the site responds:
+
+    success            rate += RATE_LIMIT_INCREASE_STEP, limit += 1/limit   (additive increase)
+    slow response      rate, limit x RATE_LIMIT_SLOW_DECREASE_FACTOR        (gentle decrease)
+    throttled (429...) rate, limit x RATE_LIMIT_DECREASE_FACTOR             (multiplicative decrease)
+                       + pause for Retry-After when the site sends one
+
+Decreases happen at most once per RATE_LIMIT_DECREASE_COOLDOWN_S, so a
+burst of 429s from requests that were already in flight counts as one
+congestion signal. The result hovers just below the highest rate the site
+accepts instead of a fixed delay tuned for the worst case.
+
+Phase 2 paces each shop (Yahoo Japan Auctions, Mercari, ...) with its own
+limiter when PHASE2_PER_SHOP_LIMITS is on: get_shop_limiter(shop_name)
+applies the PHASE2_SHOP_LIMITS overrides, so a slow backend only slows
+down its own listings. Every request also takes a slot from the
+process-wide limiter, which stays the ceiling for the whole process (and
+backs everything off when any shop gets throttled); Phase 2 runs at most
+PHASE2_MAX_WORKERS workers across all shops (allocate_workers).
+
+Usage:
+    limiter = get_limiter()
+    with limiter.slot() as slot:
+        page.goto(url)
+        if looks_throttled:
+            slot.throttled()
+
+Exceptions raised inside slot() are classified with is_throttle_error();
+a buyee_throttle.ThrottledError carries the Retry-After delay.
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+
+from buyee_throttle import ThrottledError
+from buyee_utils import (
+    RATE_LIMIT_INITIAL_RATE, RATE_LIMIT_MIN_RATE, RATE_LIMIT_MAX_RATE, RATE_LIMIT_BURST,
+    RATE_LIMIT_INITIAL_CONCURRENCY, RATE_LIMIT_MAX_CONCURRENCY,
+    RATE_LIMIT_INCREASE_STEP, RATE_LIMIT_DECREASE_FACTOR, RATE_LIMIT_SLOW_DECREASE_FACTOR,
+    RATE_LIMIT_DECREASE_COOLDOWN_S, RATE_LIMIT_SLOW_RESPONSE_S,
+    PHASE2_PER_SHOP_LIMITS, PHASE2_SHOP_LIMITS, PHASE2_MAX_WORKERS,
+    log_info, log_debug
+)
+
+THROTTLE_ERROR_MARKERS = ('429', 'rate limit', 'too many requests', 'timeout')
+
+def is_throttle_error(error):
+    """True if an exception looks like the site pushing back (ThrottledError, 429, timeouts)"""
+    if isinstance(error, ThrottledError):
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in THROTTLE_ERROR_MARKERS)
+
+class Slot:
+    """Outcome of one request made under AdaptiveLimiter.slot()"""
+
+    __slots__ = ('outcome', 'retry_after')
+
+    def __init__(self):
+        self.outcome = 'ok'
+        self.retry_after = None
+
+    def throttled(self, retry_after=None):
+        """Mark the request as throttled (429, error page, ...)"""
+        self.outcome = 'throttled'
+        self.retry_after = retry_after
+
+    def failed(self):
+        """Mark the request as failed for reasons unrelated to load (no rate change)"""
+        self.outcome = 'failed'
+
+class AdaptiveLimiter:
+    """Token bucket + AIMD concurrency window shared by all scraper threads"""
+
+    def __init__(self, rate=RATE_LIMIT_INITIAL_RATE, min_rate=RATE_LIMIT_MIN_RATE, max_rate=RATE_LIMIT_MAX_RATE,
+                 burst=RATE_LIMIT_BURST, concurrency=RATE_LIMIT_INITIAL_CONCURRENCY,
+                 max_concurrency=RATE_LIMIT_MAX_CONCURRENCY, increase_step=RATE_LIMIT_INCREASE_STEP,
+                 decrease_factor=RATE_LIMIT_DECREASE_FACTOR, slow_decrease_factor=RATE_LIMIT_SLOW_DECREASE_FACTOR,
+                 cooldown_s=RATE_LIMIT_DECREASE_COOLDOWN_S, slow_response_s=RATE_LIMIT_SLOW_RESPONSE_S, name=None):
+        self.name = name
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.limit = float(concurrency)
+        self.max_concurrency = max_concurrency
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.slow_decrease_factor = slow_decrease_factor
+        self.cooldown_s = cooldown_s
+        self.slow_response_s = slow_response_s
+
+        self._cond = threading.Condition()
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self.stats = {'requests': 0, 'throttled': 0, 'slow': 0, 'failed': 0, 'decreases': 0,
+                      'wait_s': 0.0, 'min_rate': rate, 'peak_rate': rate}
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def acquire(self):
+        """Block until a concurrency slot and a token are available"""
+        started = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._in_flight >= max(1, int(self.limit)):
+                    wait = None  # Woken by release()
+                elif self._tokens < 1:
+                    wait = (1 - self._tokens) / self.rate
+                else:
+                    self._tokens -= 1
+                    self._in_flight += 1
+                    self.stats['requests'] += 1
+                    self.stats['wait_s'] += now - started
+                    return now
+                self._cond.wait(wait)
+
+    def release(self, started, outcome='ok', retry_after=None):
+        """Report the outcome of a request started with acquire()"""
+        now = time.monotonic()
+        with self._cond:
+            self._in_flight -= 1
+            if outcome == 'throttled':
+                self.stats['throttled'] += 1
+                if retry_after:
+                    self._paused_until = max(self._paused_until, now + retry_after)
+                self._decrease(now, self.decrease_factor, 'throttled')
+            elif outcome == 'failed':
+                self.stats['failed'] += 1
+            elif now - started > self.slow_response_s:
+                self.stats['slow'] += 1
+                self._decrease(now, self.slow_decrease_factor, 'slow response')
+            else:
+                self.rate = min(self.max_rate, self.rate + self.increase_step)
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+                self.stats['peak_rate'] = max(self.stats['peak_rate'], self.rate)
+            self._cond.notify_all()
+
+    def _decrease(self, now, factor, reason):
+        if now - self._last_decrease < self.cooldown_s:
+            return  # Same congestion event as the last decrease
+        self._last_decrease = now
+        self.rate = max(self.min_rate, self.rate * factor)
+        self.limit = max(1.0, self.limit * factor)
+        self._tokens = min(self._tokens, 0.0)
+        self.stats['decreases'] += 1
+        self.stats['min_rate'] = min(self.stats['min_rate'], self.rate)
+        label = f"{self.name}, {reason}" if self.name else reason
+        log_info(f"  🐢 Backing off ({label}): {self.rate:.2f} req/s, {int(self.limit)} concurrent")
+
+    @contextmanager
+    def slot(self):
+        """Run one request under the limiter; exceptions are classified automatically"""
+        started = self.acquire()
+        slot = Slot()
+        try:
+            yield slot
+        except Exception as e:
+            if is_throttle_error(e):
+                slot.throttled(getattr(e, 'retry_after', None))
+            else:
+                slot.failed()
+            raise
+        finally:
+            self.release(started, slot.outcome, slot.retry_after)
+            log_debug("  Limiter: %s, %.2f req/s, window %.1f", slot.outcome, self.rate, self.limit)
+
+    def summary(self):
+        """Limiter state and counters for the results JSON"""
+        with self._cond:
+            return {
+                **{k: round(v, 3) if isinstance(v, float) else v for k, v in self.stats.items()},
+                'final_rate': round(self.rate, 3),
+                'final_concurrency': round(self.limit, 2),
+            }
+
+_limiter = None
+_shop_limiters = {}
+_share = 1.0
+_limiter_lock = threading.Lock()
+
+def _limiter_settings(shop_name=None):
+    """AdaptiveLimiter arguments: RATE_LIMIT_* with the shop's overrides, scaled by this process's share"""
+    limits = PHASE2_SHOP_LIMITS.get(shop_name, {}) if shop_name else {}
+    max_rate = limits.get('max_rate', RATE_LIMIT_MAX_RATE)
+    return {
+        'rate': min(limits.get('initial_rate', RATE_LIMIT_INITIAL_RATE), max_rate) * _share,
+        'min_rate': limits.get('min_rate', RATE_LIMIT_MIN_RATE) * _share,
+        'max_rate': max_rate * _share,
+        'increase_step': RATE_LIMIT_INCREASE_STEP * _share,
+        'max_concurrency': limits.get('max_concurrency', RATE_LIMIT_MAX_CONCURRENCY),
+        'name': shop_name,
+    }
+
+def get_limiter():
+    """Process-wide limiter shared by search pagination and detail workers"""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = AdaptiveLimiter(**_limiter_settings())
+        return _limiter
+
+class ShopLimiter:
+    """A shop's limiter under the process-wide one: slot() takes a slot from both
+
+    The shop slot is taken first, so a request waiting for its own shop
+    doesn't tie up a slot of the shared limiter. Throttling and slow
+    responses count for both limiters.
+    """
+
+    def __init__(self, limiter, shared):
+        self.limiter = limiter
+        self.shared = shared
+
+    @contextmanager
+    def slot(self):
+        with self.limiter.slot() as slot:
+            with self.shared.slot() as shared_slot:
+                yield slot
+                # Outcomes marked on the shop slot (slot.throttled()) count for the shared limiter too
+                shared_slot.outcome, shared_slot.retry_after = slot.outcome, slot.retry_after
+
+    def summary(self):
+        return self.limiter.summary()
+
+def get_shop_limiter(shop_name):
+    """Limiter for one shop's detail pages (the shared limiter when PHASE2_PER_SHOP_LIMITS is off)"""
+    shared = get_limiter()
+    if not PHASE2_PER_SHOP_LIMITS:
+        return shared
+    with _limiter_lock:
+        limiter = _shop_limiters.get(shop_name)
+        if limiter is None:
+            limiter = _shop_limiters[shop_name] = AdaptiveLimiter(**_limiter_settings(shop_name))
+    return ShopLimiter(limiter, shared)
+
+def shop_workers(shop_name):
+    """Phase 2 workers wanted for one shop's listings (PHASE2_MAX_WORKERS when per-shop limits are off)"""
+    if not PHASE2_PER_SHOP_LIMITS:
+        return PHASE2_MAX_WORKERS
+    return PHASE2_SHOP_LIMITS.get(shop_name, {}).get('max_concurrency', RATE_LIMIT_MAX_CONCURRENCY)
+
+def allocate_workers(lane_sizes):
+    """Phase 2 workers per shop lane, PHASE2_MAX_WORKERS in total
+
+    Workers are handed out one per lane in turn (up to the lane's size and
+    shop_workers()), so every lane gets one before any gets a second. With
+    more lanes than PHASE2_MAX_WORKERS, the last lanes get 0 and are served
+    by workers whose own lane is empty.
+
+    Args:
+        lane_sizes: {shop_name: number of listings}, in lane order
+    """
+    wanted = {shop: max(1, min(size, shop_workers(shop))) for shop, size in lane_sizes.items()}
+    workers = dict.fromkeys(wanted, 0)
+    remaining = max(1, PHASE2_MAX_WORKERS)
+    while remaining:
+        open_lanes = [shop for shop in wanted if workers[shop] < wanted[shop]]
+        if not open_lanes:
+            break
+        for shop in open_lanes[:remaining]:
+            workers[shop] += 1
+        remaining -= min(remaining, len(open_lanes))
+    return workers
+
+def shop_limiter_summaries():
+    """summary() of every per-shop limiter created so far"""
+    with _limiter_lock:
+        limiters = dict(_shop_limiters)
+    return {str(shop_name or 'Unknown'): limiter.summary()
+            for shop_name, limiter in sorted(limiters.items(), key=lambda item: str(item[0]))}
+
+def phase2_limiter_summary():
+    """Limiter figures for the Phase 2 results: the shared limiter, plus per shop"""
+    if PHASE2_PER_SHOP_LIMITS:
+        return {'shared': get_limiter().summary(), 'by_shop': shop_limiter_summaries()}
+    return get_limiter().summary()
+
+def init_limiter(share=1.0):
+    """Replace the process-wide limiters with ones paced at `share` of the configured rates
+
+    Used by shard processes (buyee_shards.py): each runs its own limiters, so
+    K shards get 1/K of the request budget each (per shop as well).
+    """
+    global _limiter, _share
+    with _limiter_lock:
+        _share = share
+        _shop_limiters.clear()
+        _limiter = AdaptiveLimiter(**_limiter_settings())
+        return _limiter
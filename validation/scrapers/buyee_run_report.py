@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Buyee Run Report
+
+Per-run throughput and transfer figures for the scrapers:
+
+- wall time per phase, listings processed and listings/second
+- navigations (main-frame loads) per run
+- responses and bytes transferred per resource type (document, script,
+  image, xhr, ...), collected with page.on('response'); sizes come from the
+  Content-Length header, so chunked responses are counted but not sized
+- HTTP status counts (429s, 5xx) and the retries / rate-limit events the
+  scrapers report
+- browser memory (from buyee_memory.MemoryMonitor)
+
+The report is written into the results JSON under 'run_report' and
+appended to a rolling JSON lines history file (last RUN_REPORT_HISTORY_MAX_RUNS
+runs) tagged with the git revision, so runs can be compared across changes:
+
+    python buyee_run_report.py                      # last runs, both phases
+    python buyee_run_report.py --phase details -n 20
+
+Used by:
+- buyee_search.py / buyee_details.py (when RUN_REPORT_ENABLED is True)
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import subprocess
+from collections import defaultdict
+from datetime import datetime
+
+from buyee_utils import RUN_REPORT_HISTORY_FILE, RUN_REPORT_HISTORY_MAX_RUNS, log_info, log_warning
+
+class RunReport:
+    """Collects phase timings, navigation and transfer counters for one run"""
+
+    def __init__(self, phase_name):
+        self.phase_name = phase_name
+        self.started = self._last_mark = time.perf_counter()
+        self.phases = {}
+        self.counters = defaultdict(int)
+        self.status_counts = defaultdict(int)
+        self.transfer = defaultdict(lambda: {'responses': 0, 'bytes': 0, 'unsized': 0})
+        self._lock = threading.Lock()
+
+    # -- browser hooks -------------------------------------------------
+
+    def attach(self, page):
+        """Count navigations and response sizes of a page"""
+        page.on('response', self._on_response)
+        page.on('framenavigated', lambda frame: self._on_navigation(page, frame))
+
+    def _on_navigation(self, page, frame):
+        if frame == page.main_frame:
+            self.count('navigations')
+
+    def _on_response(self, response):
+        try:
+            resource_type = response.request.resource_type
+            length = response.headers.get('content-length')
+            status = response.status
+        except Exception:
+            return  # Page closed while the event was in flight
+        with self._lock:
+            entry = self.transfer[resource_type]
+            entry['responses'] += 1
+            if length and length.isdigit():
+                entry['bytes'] += int(length)
+            else:
+                entry['unsized'] += 1
+            if status >= 400:
+                self.status_counts[str(status)] += 1
+
+    # -- scraper hooks -------------------------------------------------
+
+    def count(self, name, amount=1):
+        """Increment a counter (e.g. 'retries', 'rate_limited')"""
+        with self._lock:
+            self.counters[name] += amount
+
+    def merge(self, summary):
+        """Add the navigations, transfer and counters of another run's summary (a shard process)"""
+        with self._lock:
+            self.counters['navigations'] += summary.get('navigations', 0)
+            for name, value in summary.get('counters', {}).items():
+                self.counters[name] += value
+            for status, value in summary.get('http_errors', {}).items():
+                self.status_counts[status] += value
+            for resource_type, entry in summary.get('transfer', {}).items():
+                for key, value in entry.items():
+                    self.transfer[resource_type][key] += value
+
+    def mark(self, name, listings=None):
+        """End a phase: records the time since the previous mark (or the start)
+
+        Args:
+            listings: Listings the phase processed (for listings/second)
+        """
+        now = time.perf_counter()
+        stats = {'wall_s': round(now - self._last_mark, 3)}
+        if listings is not None:
+            stats['listings'] = listings
+        self.phases[name] = stats
+        self._last_mark = now
+
+    # -- output --------------------------------------------------------
+
+    def summary(self, memory=None):
+        """Report dict for the results JSON"""
+        wall_s = round(time.perf_counter() - self.started, 3)
+        phases = {}
+        for name, stats in self.phases.items():
+            stats = dict(stats)
+            if stats.get('listings') and stats.get('wall_s'):
+                stats['listings_per_s'] = round(stats['listings'] / stats['wall_s'], 3)
+            phases[name] = stats
+        with self._lock:
+            transfer = {rtype: dict(entry) for rtype, entry in sorted(self.transfer.items())}
+            counters = dict(self.counters)
+            statuses = dict(self.status_counts)
+        listings = max((p.get('listings', 0) for p in phases.values()), default=0)
+        report = {
+            'phase': self.phase_name,
+            'wall_s': wall_s,
+            'listings': listings,
+            'listings_per_s': round(listings / wall_s, 3) if wall_s else 0,
+            'navigations': counters.pop('navigations', 0),
+            'phases': phases,
+            'transfer': transfer,
+            'bytes_total': sum(entry['bytes'] for entry in transfer.values()),
+            'responses_total': sum(entry['responses'] for entry in transfer.values()),
+            'http_errors': statuses,
+            'counters': counters,
+        }
+        if memory:
+            report['memory'] = memory
+        return report
+
+def git_revision():
+    """Short git revision of the scraper code (None outside a checkout)"""
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                timeout=5, cwd=os.path.dirname(os.path.abspath(__file__)))
+        return result.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def append_history(report, path=RUN_REPORT_HISTORY_FILE, max_runs=RUN_REPORT_HISTORY_MAX_RUNS):
+    """Append a run to the rolling history file (keeps the last max_runs lines)"""
+    if not path:
+        return
+    entry = {'run_at': datetime.now().isoformat(), 'revision': git_revision(), **report}
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    lines = []
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            lines = [line for line in f if line.strip()]
+    lines.append(json.dumps(entry, ensure_ascii=False) + '\n')
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.writelines(lines[-max_runs:] if max_runs else lines)
+    os.replace(tmp_path, path)
+
+def finish_report(report, memory=None):
+    """Summarize a run, log one line, append it to the history; returns the summary"""
+    summary = report.summary(memory)
+    log_info(f"  📈 Run report: {summary['listings']} listings in {summary['wall_s']}s "
+             f"({summary['listings_per_s']}/s), {summary['navigations']} navigations, "
+             f"{summary['bytes_total'] / 1024 / 1024:.1f} MB transferred")
+    try:
+        append_history(summary)
+    except OSError as e:
+        log_warning(f"Could not update run history {RUN_REPORT_HISTORY_FILE}: {e}")
+    return summary
+
+def load_history(path=RUN_REPORT_HISTORY_FILE, phase=None):
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        runs = [json.loads(line) for line in f if line.strip()]
+    return [r for r in runs if phase is None or r.get('phase') == phase]
+
+def parse_arguments():
+    """Parse command-line arguments"""
+    parser = argparse.ArgumentParser(
+        description='Show recent scraper run reports',
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--phase', choices=['search', 'details'], help='Only show one phase')
+    parser.add_argument('-n', type=int, default=10, help='Number of runs to show (default: 10)')
+    parser.add_argument('--history-file', dest='history_file', default=RUN_REPORT_HISTORY_FILE,
+                        help=f'History file (default: {RUN_REPORT_HISTORY_FILE})')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    runs = load_history(args.history_file, args.phase)[-args.n:]
+    if not runs:
+        print("No runs recorded")
+        sys.exit(0)
+    print(f"{'run_at':<20} {'rev':<9} {'phase':<8} {'listings':>8} {'wall_s':>9} {'per_s':>7} {'navs':>6} {'MB':>8} {'429':>5}")
+    for run in runs:
+        print(f"{run['run_at'][:19]:<20} {run.get('revision') or '-':<9} {run['phase']:<8} {run['listings']:>8} "
+              f"{run['wall_s']:>9} {run['listings_per_s']:>7} {run['navigations']:>6} "
+              f"{run['bytes_total'] / 1024 / 1024:>8.1f} {run['http_errors'].get('429', 0):>5}")
+    sys.exit(0)
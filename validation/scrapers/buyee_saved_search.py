@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Buyee Saved Search Matcher
+
+Matches a batch of scraped listings against every saved search in one pass.
+
+Instead of testing each listing against each saved search, all saved
+searches are compiled into an inverted index from normalized title token to
+the searches that require it. For a listing, only the searches that share at
+least one token are touched; a search matches when all of its keyword
+tokens were seen, none of its excluded tokens are present, and the price,
+source, shop and brand/model filters pass. Brand/model filters compare the
+fields tagged by buyee_entities instead of scanning titles.
+
+SavedSearch.query_params (JSON) fields understood here:
+    keywords          "nikon fm2"            all tokens must appear in the title
+    exclude_keywords  "junk parts"           none of these tokens may appear
+    min_price         10000                  in the reference currency (PRICE_REFERENCE_CURRENCY)
+    max_price         50000
+    sources           ["buyee"]              listing source
+    shops             ["Mercari", "Rakuma"]  Buyee shop_name
+    brand             "Nikon"                extracted brand (buyee_entities), case-insensitive
+    model             "FM2"                  extracted model, case-insensitive
+
+Used by:
+- buyee_details.py (Phase 2 only, when SAVED_SEARCH_MATCHING_ENABLED is True)
+"""
+
+import json
+from collections import defaultdict
+
+from buyee_text import token_set
+from buyee_utils import log_info, log_warning
+
+DEFAULT_SOURCE = 'buyee'  # Source of listings scraped by these scripts
+
+class SavedSearchMatcher:
+    """Saved searches compiled into an inverted index over title tokens"""
+
+    def __init__(self, saved_searches):
+        self.searches = []  # [(search_id, required tokens, excluded tokens, filters)]
+        self.postings = defaultdict(list)  # token -> [search index]
+        self.match_all = []  # searches without keywords (filters only)
+
+        for search in saved_searches:
+            compiled = self._compile(search)
+            if compiled is None:
+                continue
+            index = len(self.searches)
+            self.searches.append(compiled)
+            if compiled[1]:
+                for token in compiled[1]:
+                    self.postings[token].append(index)
+            else:
+                self.match_all.append(index)
+
+    @staticmethod
+    def _compile(search):
+        params = search.get('query_params') or {}
+        if isinstance(params, str):
+            try:
+                params = json.loads(params)
+            except json.JSONDecodeError:
+                log_warning(f"Saved search {search.get('id')} has invalid query_params - skipped")
+                return None
+
+        required = frozenset(token_set(params.get('keywords', '')))
+        excluded = frozenset(token_set(params.get('exclude_keywords', '')))
+        filters = {
+            'min_price': params.get('min_price'),
+            'max_price': params.get('max_price'),
+            'sources': frozenset(s.lower() for s in params.get('sources') or []),
+            'shops': frozenset(params.get('shops') or []),
+            'brand': (params.get('brand') or '').strip().lower() or None,
+            'model': (params.get('model') or '').strip().lower() or None,
+        }
+        return search.get('id'), required, excluded, filters
+
+    @staticmethod
+    def _passes_filters(filters, listing):
+        if filters['sources'] and listing.get('source', DEFAULT_SOURCE).lower() not in filters['sources']:
+            return False
+        if filters['shops'] and listing.get('shop_name') not in filters['shops']:
+            return False
+        if filters['brand'] or filters['model']:
+            entities = listing
+            if 'brand' not in listing:
+                # Listing wasn't tagged in Phase 1 - extract for matching only (listing left as is)
+                from buyee_entities import get_extractor
+                entities = get_extractor().extract(listing.get('title', ''))
+            if filters['brand'] and (entities.get('brand') or '').lower() != filters['brand']:
+                return False
+            if filters['model'] and (entities.get('model') or '').lower() != filters['model']:
+                return False
+        if filters['min_price'] is not None or filters['max_price'] is not None:
+            price = listing.get('price_reference')
+            if price is None:
+                return False
+            if filters['min_price'] is not None and price < filters['min_price']:
+                return False
+            if filters['max_price'] is not None and price > filters['max_price']:
+                return False
+        return True
+
+    def match_listing(self, listing):
+        """Return the IDs of saved searches that match one listing"""
+        tokens = token_set(listing.get('title', ''))
+        hits = defaultdict(int)
+        for token in tokens:
+            for index in self.postings.get(token, ()):
+                hits[index] += 1
+
+        candidates = [i for i, count in hits.items() if count == len(self.searches[i][1])]
+        candidates.extend(self.match_all)
+
+        matched = []
+        for index in sorted(candidates):
+            search_id, _, excluded, filters = self.searches[index]
+            if excluded and not excluded.isdisjoint(tokens):
+                continue
+            if self._passes_filters(filters, listing):
+                matched.append(search_id)
+        return matched
+
+    def match(self, listings):
+        """Match a batch of listings in one pass
+
+        Returns:
+            list of (search_id, listing_id) tuples
+        """
+        matches = []
+        for listing in listings:
+            listing_id = listing.get('listing_id')
+            for search_id in self.match_listing(listing):
+                matches.append((search_id, listing_id))
+        return matches
+
+    def __len__(self):
+        return len(self.searches)
+
+def match_saved_searches(listings, saved_searches=None):
+    """Match listings against all saved searches and record the hits
+
+    The searches are compiled once and the hits recorded in one call.
+
+    Args:
+        listings: Scraped listings, any iterable (normalized prices are used for price filters)
+        saved_searches: Saved searches (defaults to get_saved_searches())
+
+    Returns:
+        list of (search_id, listing_id) tuples
+    """
+    from buyee_utils import get_saved_searches, record_saved_search_matches
+    if saved_searches is None:
+        saved_searches = get_saved_searches()
+    if not saved_searches:
+        return []
+
+    matcher = SavedSearchMatcher(saved_searches)
+    matches = []
+    listing_count = 0
+    for listing in listings:
+        listing_count += 1
+        matches.extend(matcher.match([listing]))
+    if not listing_count:
+        return []
+    log_info(f"  📊 Saved searches: {len(matches)} matches ({len(matcher)} searches, {listing_count} listings)")
+    if matches:
+        record_saved_search_matches(matches)
+    return matches
@@ -26,17 +26,79 @@ except ImportError:
 # Import shared utilities
 from buyee_utils import (
     BASE_URL, DEFAULT_SEARCH_TERM,
-    PAGINATION_ENABLED, PAGINATION_MAX_PAGES, PAGINATION_DELAY_BETWEEN_PAGES,
+    PAGINATION_ENABLED, PAGINATION_MAX_PAGES, PAGINATION_RETRY_ATTEMPTS,
     FILTER_NEW_LISTINGS_ONLY, filter_new_listings,
+    TITLE_CLUSTERING_ENABLED, ENTITY_EXTRACTION_ENABLED,
+    COMPACT_LISTING_RECORDS,
+    MEMORY_BOUNDED_MODE, MEMORY_KEEP_RAW_HTML, MEMORY_RECYCLE_AFTER_NAVIGATIONS, RUN_REPORT_ENABLED,
     LOG_ENABLED,
-    setup_logging, log_info, log_warning, log_error, log_debug, log_success,
+    collect_timings, setup_logging, log_info, log_warning, log_error, log_debug, log_success, debug_enabled,
     translate_japanese, contains_japanese, extract_listing_id,
-    validate_search_result
+    validate_search_result, IMAGE_VARIANTS
 )
+from buyee_image_urls import sized_image_url
+from buyee_prices import normalize_listing_prices, detect_currency
+from buyee_clusters import assign_clusters
+from buyee_entities import tag_listings
+from buyee_listing import Listing, ListingWriter, json_default
+from buyee_memory import MemoryMonitor, PageRecycler
+from buyee_run_report import RunReport, finish_report
+from buyee_rate_limit import get_limiter
+from buyee_throttle import ThrottledError, EmptyResultError, check_response, get_watcher, is_no_results_page
+from buyee_timing import StageTimer, span
 
 import logging
 
-def scrape_search_results(page):
+def page_display_currency(page):
+    """Read the display currency the search page actually rendered
+
+    The header currency selector is checked first; without one, the price
+    texts on the item cards must all carry the same currency marker. The
+    session cookies only request a currency, so this returns None instead of
+    assuming the pinned one when the page doesn't show it.
+    """
+    try:
+        rendered = page.evaluate(r'''
+            () => {
+                const text = el => (el.textContent || el.value || '').trim().substring(0, 80);
+                const headerSelectors = [
+                    'select[name*="currency" i] option:checked',
+                    '[class*="currency" i] [class*="current" i]',
+                    '[class*="currency" i] [class*="selected" i]',
+                    '[class*="currency" i]',
+                    '[id*="currency" i]'
+                ];
+                let header = [];
+                for (const sel of headerSelectors) {
+                    header = Array.from(document.querySelectorAll(sel)).slice(0, 3).map(text).filter(t => t);
+                    if (header.length > 0) break;
+                }
+                const prices = Array.from(document.querySelectorAll(
+                    'li.itemCard [class*="price" i], li[class*="itemCard"] [class*="price" i]'
+                )).slice(0, 40).map(text).filter(t => /\d/.test(t));
+                return {header: header, prices: prices};
+            }
+        ''')
+    except Exception as e:
+        log_warning(f"Could not read display currency: {e}")
+        return None
+    currency = detect_currency(rendered.get('header', [])) or detect_currency(rendered.get('prices', []))
+    if currency is None:
+        log_warning("Display currency not verified on page - prices recorded without a currency")
+    return currency
+
+def listing_currency(prices, page_currency):
+    """Currency of one listing's price strings
+
+    A marker in the string itself wins; unmarked strings are in the page's
+    verified display currency. Returns None when they can't be reconciled.
+    """
+    resolved = {detect_currency([p]) or page_currency for p in prices if p}
+    if not resolved:
+        return page_currency
+    return resolved.pop() if len(resolved) == 1 else None
+
+def scrape_search_results(page, keep_html=MEMORY_KEEP_RAW_HTML):
     """Phase 1: Scrape search results page
     
     Extracts limited fields from search results:
@@ -46,12 +108,17 @@ def scrape_search_results(page):
     - Thumbnail Image URL
     - Listing URL
     - Listing ID (derived from URL)
+    
+    The page HTML is only returned when keep_html is True (None otherwise).
     """
+    timer = StageTimer('search')
     try:
         # Wait for page to load
         log_info("Waiting for page to load...")
         page.wait_for_load_state('networkidle', timeout=30000)
+        timer.mark('wait_load')
         time.sleep(3)  # Additional wait for content to render
+        timer.mark('sleep')
         
         # Extract listings using JavaScript
         log_info("Extracting listings from page...")
@@ -429,11 +496,13 @@ def scrape_search_results(page):
             }
         ''')
         
+        page_currency = page_display_currency(page)
+        timer.mark('evaluate')
         listings = listings_data.get('listings', [])
         count = listings_data.get('count', 0)
         
         log_info(f"  Found {count} listings")
-        if listings_data.get('debug'):
+        if listings_data.get('debug') and debug_enabled():
             debug = listings_data['debug']
             log_debug("  Debug Info:")
             log_debug(f"    - Page Title: {debug.get('pageTitle', 'N/A')}")
@@ -476,13 +545,20 @@ def scrape_search_results(page):
             # Extract listing ID from URL
             listing_id = extract_listing_id(href)
             
+            # Request the thumbnail at the size the feed card renders (proxy URLs only)
+            card_width, card_height = IMAGE_VARIANTS['card'][:2]
+            image_url = sized_image_url(item.get('imageUrl', ''), card_width, card_height)
+            
             # Build listing data with shop-specific price fields
             listing_data = {
                 'title': title,
-                'image_url': item.get('imageUrl', ''),
+                'image_url': image_url,
                 'listing_url': href,
                 'listing_id': listing_id,
                 'shop_name': shop_name if shop_name else None,
+                # Verified from the rendered page (None if unknown - never assumed from the cookies)
+                'currency': listing_currency(
+                    [item.get('price'), item.get('buyoutPrice'), item.get('currentPrice')], page_currency),
             }
             
             # Add price fields based on shop
@@ -492,6 +568,9 @@ def scrape_search_results(page):
             else:
                 listing_data['price'] = item.get('price', '')
             
+            if COMPACT_LISTING_RECORDS:
+                listing_data = Listing.from_dict(listing_data)
+            
             # Validate listing
             is_valid, errors = validate_search_result(listing_data)
             if is_valid:
@@ -504,8 +583,11 @@ def scrape_search_results(page):
         if invalid_count > 0:
             log_warning(f"Skipped {invalid_count} invalid listings")
         
+        timer.mark('build_listings')
+        
         # Get HTML for inspection
-        html_content = page.content()
+        html_content = page.content() if keep_html else None
+        timer.mark('page_content')
         
         # Check for pagination (next page)
         has_next_page = False
@@ -635,6 +717,9 @@ def scrape_search_results(page):
             # Don't use fallback URL construction - only use actual next page links from page_navi
             # This prevents blindly incrementing page numbers for pages that don't exist
         
+        timer.mark('pagination')
+        timer.finish()
+        
         # Return all listings, HTML, count, and pagination info
         return all_listings, html_content, count, all_listings, has_next_page, next_page_url
         
@@ -644,8 +729,150 @@ def scrape_search_results(page):
         if LOG_ENABLED:
             logging.exception("Full traceback:")
         traceback.print_exc()
-        return [], page.content(), 0, [], False, None
+        return [], page.content() if keep_html else None, 0, [], False, None
+
+
+def record_run_currency(results, currencies, listings):
+    """Update results['currency'] with one page's listing currencies
+
+    The run's currency is the single verified currency seen so far, or None
+    when any page was unverified or pages disagree.
+    """
+    currencies.update(listing.get('currency') for listing in listings)
+    results['currency'] = next(iter(currencies)) if len(currencies) == 1 else None
+
+def stream_listing_batch(listings, writer, results):
+    """Memory-bounded mode: process one page of listings and write it out
+    
+    Runs the per-listing steps (price parsing, entity tagging, new-listing
+    filter) on the page batch, so nothing from
+    earlier pages has to stay in memory.
+    """
+    normalize_listing_prices(listings)
+    if ENTITY_EXTRACTION_ENABLED:
+        tag_listings(listings)
+    if FILTER_NEW_LISTINGS_ONLY:
+        listings = filter_new_listings(listings)
+    writer.write_all(listings)
+    log_info(f"  Streamed {len(listings)} listings ({writer.count} total)")
 
+def build_search_url(search_term):
+    """Direct crosssearch result URL for a search term"""
+    return f"{BASE_URL}/item/crosssearch/query/{quote_plus(search_term)}?conversionType=top_page_search&suggest=1"
+
+def enqueue_searches(search_terms, queue_file=None):
+    """Add the first result page of each search term to the work queue
+    
+    Pages done in an earlier cycle are re-armed, so enqueueing the saved
+    searches again starts a new cycle. Returns the number of pages added.
+    """
+    from buyee_work_queue import open_queue, SEARCH_PAGE
+    queue = open_queue(queue_file)
+    pages = [(build_search_url(term), {'search_term': term, 'url': build_search_url(term), 'page_number': 1})
+             for term in search_terms]
+    added = queue.put_many(SEARCH_PAGE, pages, requeue_done=True)
+    queue.close()
+    log_info(f"Enqueued {added}/{len(pages)} search(es) in {queue.path}")
+    return added
+
+def run_worker(output_file=None, queue_file=None):
+    """Worker mode: scrape search_page tasks from the work queue until it is drained
+    
+    Each page's listings go through the per-page steps of the
+    memory-bounded mode (stream_listing_batch) and are enqueued as detail
+    tasks for buyee_details.py --worker; the next result page is enqueued as
+    another search_page task, so any worker can pick it up.
+    
+    Returns:
+        dict: Worker results (pages scraped, listings enqueued, queue counts)
+    """
+    from buyee_work_queue import open_queue, work, worker_name, TaskWriter, SEARCH_PAGE
+    
+    if output_file is None:
+        output_file = 'validation/results/buyee_search_worker_results.json'
+    
+    log_filepath = setup_logging()
+    if not PLAYWRIGHT_AVAILABLE:
+        log_error("Playwright is not available. Please install it first.")
+        return {'error': 'Playwright not available'}
+    
+    worker_id = worker_name()
+    queue = open_queue(queue_file)
+    log_info("=" * 60)
+    log_info(f"Buyee Search Scraper - Queue Worker {worker_id}")
+    log_info("=" * 60)
+    log_info(f"Queue: {queue.path}")
+    if log_filepath:
+        log_info(f"Log file: {log_filepath}")
+    
+    results = {
+        'test_date': datetime.now().isoformat(),
+        'worker': worker_id,
+        'queue_file': queue.path,
+        'currency': None,
+        'pages_scraped': 0,
+        'challenges': [],
+        'notes': []
+    }
+    task_writer = TaskWriter(queue)
+    
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        limiter = get_limiter()
+        watcher = get_watcher()
+        recycler = PageRecycler(browser, MEMORY_RECYCLE_AFTER_NAVIGATIONS if MEMORY_BOUNDED_MODE else None,
+                                on_page=watcher.attach)
+        
+        currencies_seen = set()
+        
+        def scrape_page(task):
+            payload = task.payload
+            page_number = payload['page_number']
+            log_info(f"\n--- {payload['search_term']}: page {page_number} ---")
+            with recycler.use() as page:
+                with limiter.slot(), span('search.goto'):
+                    response = page.goto(payload['url'], wait_until='domcontentloaded', timeout=60000)
+                    check_response(page, response, watcher)
+                time.sleep(3)
+                _, _, total_count, all_listings, has_next_page, next_page_url = scrape_search_results(page)
+                # scrape_search_results() returns no cards on errors too: only ack a real empty result
+                if not total_count and not is_no_results_page(page):
+                    raise EmptyResultError(f"Search page {page_number} yielded no listings")
+            record_run_currency(results, currencies_seen, all_listings)
+            stream_listing_batch(all_listings, task_writer, results)
+            
+            if PAGINATION_ENABLED and has_next_page and next_page_url and not (
+                    PAGINATION_MAX_PAGES and page_number >= PAGINATION_MAX_PAGES):
+                queue.put(SEARCH_PAGE, next_page_url,
+                          {'search_term': payload['search_term'], 'url': next_page_url, 'page_number': page_number + 1},
+                          requeue_done=True)
+            results['pages_scraped'] += 1
+            return {'listings': total_count}
+        
+        try:
+            results['queue'] = work(queue, SEARCH_PAGE, scrape_page, worker_id)
+        except Exception as e:
+            results['challenges'].append(f"Error during scraping: {str(e)}")
+            log_error(f"Error: {e}")
+            import traceback
+            traceback.print_exc()
+        finally:
+            results['listings_found'] = task_writer.count
+            results['detail_tasks_added'] = task_writer.added
+            results['rate_limiter'] = limiter.summary()
+            results['throttle_signals'] = dict(watcher.counts)
+            browser.close()
+            queue.close()
+    
+    results['timings'] = collect_timings('search')
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False, default=json_default)
+    
+    log_success(f"\nWorker done: {results['pages_scraped']} pages, "
+                f"{results['detail_tasks_added']} new detail tasks ({results['listings_found']} listings seen)")
+    log_info(f"Results saved to: {output_file}")
+    return results
 
 def parse_arguments():
     """Parse command-line arguments"""
@@ -664,8 +891,28 @@ def parse_arguments():
         '-o', '--output',
         dest='output_file',
         type=str,
-        default='validation/results/buyee_search_results.json',
-        help='Output JSON file path'
+        default=None,
+        help='Output JSON file path (default: validation/results/buyee_search_results.json, '
+             'or buyee_search_worker_results.json with --worker)'
+    )
+    parser.add_argument(
+        '--enqueue',
+        dest='enqueue_terms',
+        action='append',
+        metavar='TERM',
+        help='Add a search term to the work queue instead of scraping (repeatable)'
+    )
+    parser.add_argument(
+        '--worker',
+        action='store_true',
+        help='Scrape search pages from the work queue until it is drained (see buyee_work_queue.py)'
+    )
+    parser.add_argument(
+        '--queue',
+        dest='queue_file',
+        type=str,
+        default=None,
+        help='Work queue database (default: WORK_QUEUE_FILE)'
     )
     return parser.parse_args()
 
@@ -708,6 +955,7 @@ def main(search_term=None, output_file=None):
     results = {
         'test_date': datetime.now().isoformat(),
         'search_term': search_term,
+        'currency': None,
         'access_test': False,
         'search_test': False,
         'listings_found': 0,
@@ -716,20 +964,31 @@ def main(search_term=None, output_file=None):
         'all_listings_basic': []
     }
     
-    search_url = f"{BASE_URL}/item/crosssearch/query/{quote_plus(search_term)}?conversionType=top_page_search&suggest=1"
+    search_url = build_search_url(search_term)
     
     with sync_playwright() as p:
         log_info("Launching browser...")
         browser = p.chromium.launch(headless=True)
-        context = browser.new_context(
-            user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            locale='ja-JP',
-            timezone_id='Asia/Tokyo',
-            extra_http_headers={
-                'Accept-Language': 'ja,ja-JP;q=0.9,en;q=0.8'
-            }
-        )
-        page = context.new_page()
+        monitor = MemoryMonitor()
+        limiter = get_limiter()
+        report = RunReport('search') if RUN_REPORT_ENABLED else None
+        watcher = get_watcher()
+        
+        def on_page(new_page):
+            watcher.attach(new_page)
+            if report:
+                report.attach(new_page)
+        
+        recycler = PageRecycler(browser, MEMORY_RECYCLE_AFTER_NAVIGATIONS if MEMORY_BOUNDED_MODE else None,
+                                monitor=monitor, on_page=on_page)
+        page = recycler.page
+        
+        # Memory-bounded mode: listings are processed per page and streamed to a JSON lines file
+        listing_writer = None
+        if MEMORY_BOUNDED_MODE:
+            listings_file = os.path.splitext(output_file)[0] + '.listings.jsonl'
+            listing_writer = ListingWriter(listings_file)
+            results['listings_file'] = listings_file
         
         try:
             # Navigate to homepage first
@@ -800,7 +1059,8 @@ def main(search_term=None, output_file=None):
                 log_success("Search submitted")
             else:
                 log_info(f"\nSearch form not found, trying direct URL: {search_url}")
-                page.goto(search_url, wait_until='domcontentloaded', timeout=60000)
+                with span('search.goto'):
+                    page.goto(search_url, wait_until='domcontentloaded', timeout=60000)
                 time.sleep(3)
             
             # Check if we're on an error page
@@ -816,10 +1076,13 @@ def main(search_term=None, output_file=None):
                 log_warning("Page appears to be an error page")
             
             results['search_test'] = True
+            if report:
+                report.mark('browse')
             
             # Phase 1: Scrape search results with pagination
             log_info("\nPhase 1: Scraping search results...")
             all_listings_combined = []
+            currencies_seen = set()
             page_number = 1
             total_count_all_pages = 0
             
@@ -828,8 +1091,13 @@ def main(search_term=None, output_file=None):
                 listings, html_content, total_count, all_listings, has_next_page, next_page_url = scrape_search_results(page)
                 
                 log_info(f"  Found {total_count} listings on page {page_number}")
-                all_listings_combined.extend(all_listings)
                 total_count_all_pages += total_count
+                record_run_currency(results, currencies_seen, all_listings)
+                if listing_writer:
+                    stream_listing_batch(all_listings, listing_writer, results)
+                else:
+                    all_listings_combined.extend(all_listings)
+                del listings, all_listings, html_content
                 
                 # Check if we should continue pagination
                 if not PAGINATION_ENABLED:
@@ -843,49 +1111,102 @@ def main(search_term=None, output_file=None):
                     log_info(f"  Reached maximum page limit ({PAGINATION_MAX_PAGES})")
                     break
                 
-                # Navigate to next page
+                # Navigate to next page (a throttled page is retried after the limiter backs off)
                 log_info("  Navigating to next page...")
-                time.sleep(PAGINATION_DELAY_BETWEEN_PAGES)
-                try:
-                    page.goto(next_page_url, wait_until='domcontentloaded', timeout=60000)
-                    time.sleep(3)
-                    page_number += 1
-                except Exception as e:
-                    log_warning(f"Error navigating to next page: {e}")
+                navigated = False
+                for attempt in range(1, PAGINATION_RETRY_ATTEMPTS + 2):
+                    try:
+                        # Paced by the adaptive limiter (shared with the Phase 2 workers)
+                        with limiter.slot(), recycler.use() as page, span('search.goto'):
+                            response = page.goto(next_page_url, wait_until='domcontentloaded', timeout=60000)
+                            check_response(page, response, watcher)
+                        navigated = True
+                        break
+                    except ThrottledError as e:
+                        if report:
+                            report.count('rate_limited')
+                        log_warning(f"{e.reason} on page {page_number + 1} (attempt {attempt})")
+                    except Exception as e:
+                        log_warning(f"Error navigating to next page: {e}")
+                        break
+                if not navigated:
+                    results['challenges'].append(f"Stopped before page {page_number + 1}: navigation failed")
                     break
+                time.sleep(3)
+                page_number += 1
+            
+            if report:
+                report.mark('pagination', listings=listing_writer.count if listing_writer else len(all_listings_combined))
             
-            log_info(f"\n{'='*60}")
-            log_info(f"TOTAL LISTINGS FOUND (all pages): {len(all_listings_combined)}")
-            log_info(f"Pages scraped: {page_number}")
-            log_info(f"{'='*60}\n")
+            if listing_writer:
+                results['total_listings_count'] = total_count_all_pages
+                results['pages_scraped'] = page_number
+                results['listings_found'] = listing_writer.count
+                log_info(f"\n{'='*60}")
+                log_info(f"TOTAL LISTINGS WRITTEN (all pages): {listing_writer.count} -> {listings_file}")
+                log_info(f"{'='*60}\n")
+                if TITLE_CLUSTERING_ENABLED:
+                    results['notes'].append("Duplicate clustering skipped in memory-bounded mode (needs all listings at once)")
+            else:
+                log_info(f"\n{'='*60}")
+                log_info(f"TOTAL LISTINGS FOUND (all pages): {len(all_listings_combined)}")
+                log_info(f"Pages scraped: {page_number}")
+                log_info(f"{'='*60}\n")
+            
+                # Parse price strings once into amount/currency (+ reference currency)
+                normalize_listing_prices(all_listings_combined)
             
-            results['total_listings_count'] = total_count_all_pages
-            results['pages_scraped'] = page_number
-            results['all_listings_basic'] = all_listings_combined
-            results['listings_found'] = len(all_listings_combined)
+                # Tag brand/model/lens/rank from titles (one automaton pass per title)
+                if ENTITY_EXTRACTION_ENABLED:
+                    tagged = tag_listings(all_listings_combined)
+                    log_info(f"  📊 Recognized brand/model in {tagged}/{len(all_listings_combined)} titles")
             
-            # Filter new listings only (if enabled)
-            if FILTER_NEW_LISTINGS_ONLY:
-                log_info("\n🔍 Filtering for new listings only...")
-                all_listings_combined = filter_new_listings(all_listings_combined)
-                log_info(f"  After filtering: {len(all_listings_combined)} new listings")
+                results['total_listings_count'] = total_count_all_pages
+                results['pages_scraped'] = page_number
                 results['all_listings_basic'] = all_listings_combined
                 results['listings_found'] = len(all_listings_combined)
             
+                # Filter new listings only (if enabled)
+                if FILTER_NEW_LISTINGS_ONLY:
+                    log_info("\n🔍 Filtering for new listings only...")
+                    all_listings_combined = filter_new_listings(all_listings_combined)
+                    log_info(f"  After filtering: {len(all_listings_combined)} new listings")
+                    results['all_listings_basic'] = all_listings_combined
+                    results['listings_found'] = len(all_listings_combined)
+            
+                # Group cross-shop duplicates of the same item (if enabled)
+                if TITLE_CLUSTERING_ENABLED:
+                    log_info("\n🔍 Clustering duplicate listings...")
+                    results['duplicate_clusters'] = assign_clusters(all_listings_combined)
+            
+            if report:
+                report.mark('postprocess', listings=results['listings_found'])
+            
         except Exception as e:
             results['challenges'].append(f"Error during scraping: {str(e)}")
             log_error(f"Error: {e}")
             import traceback
             traceback.print_exc()
         finally:
+            if listing_writer:
+                listing_writer.close()
+            results['memory'] = monitor.report()
+            results['memory']['context_recycles'] = recycler.recycles
+            results['rate_limiter'] = limiter.summary()
+            results['throttle_signals'] = dict(watcher.counts)
+            if report:
+                results['run_report'] = finish_report(report, results['memory'])
             browser.close()
     
+    # Per-stage timing summary (p50/p95/max) plus optional Prometheus/trace exports
+    results['timings'] = collect_timings('search')
+    
     # Ensure output directory exists
     os.makedirs(os.path.dirname(output_file), exist_ok=True)
     
     # Save results to JSON
     with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(results, f, indent=2, ensure_ascii=False)
+        json.dump(results, f, indent=2, ensure_ascii=False, default=json_default)
     
     log_info(f"\n{'='*60}")
     log_info("Phase 1 Complete")
@@ -904,6 +1225,14 @@ if __name__ == "__main__":
     # Parse command-line arguments
     args = parse_arguments()
     
+    if args.enqueue_terms:
+        enqueue_searches(args.enqueue_terms, args.queue_file)
+        sys.exit(0)
+    
+    if args.worker:
+        results = run_worker(output_file=args.output_file, queue_file=args.queue_file)
+        sys.exit(1 if results.get('error') or results['challenges'] else 0)
+    
     # Run main function
     results = main(search_term=args.search_term, output_file=args.output_file)
     
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Buyee Search Index
+
+Full-text keyword search over scraped listings (titles and descriptions),
+backed by SQLite FTS5.
+
+SQLite's built-in tokenizers split "F1.4" and "Ai-s" apart and know nothing
+about Japanese, so text is tokenized in Python with the camera-aware
+tokenizer (buyee_text.tokenize) and stored as space-separated tokens; FTS5
+then only splits on spaces (tokenchars keep '.' and '/' inside tokens).
+Queries are tokenized the same way, so "FM-2 f1.4" and "ＦＭ２ F1.4" match
+the same listings.
+
+Indexing is incremental: a listing is only re-tokenized when its title or
+description changed since it was last indexed.
+
+Used by:
+- buyee_details.py (when SEARCH_INDEX_ENABLED is True)
+
+Command line:
+    python buyee_search_index.py index validation/results/buyee_details_results.json
+    python buyee_search_index.py query "nikon fm2 f1.4"
+    python buyee_search_index.py benchmark --listings 100000
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import sqlite3
+import argparse
+import tempfile
+from datetime import datetime
+
+from buyee_listing import result_listings
+from buyee_text import tokenize
+from buyee_utils import SEARCH_INDEX_FILE, log_info
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    rowid INTEGER PRIMARY KEY,
+    listing_id TEXT UNIQUE NOT NULL,
+    title TEXT,
+    shop_name TEXT,
+    listing_url TEXT,
+    image_url TEXT,
+    price_reference REAL,
+    content_hash TEXT,
+    indexed_at TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS listings_fts USING fts5(
+    title_tokens,
+    description_tokens,
+    tokenize = "unicode61 remove_diacritics 0 tokenchars './'"
+);
+"""
+
+# bm25() column weights: title matches count more than description matches
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+def open_index(path=SEARCH_INDEX_FILE):
+    """Open (creating if needed) the search index database"""
+    if path != ':memory:':
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.executescript(SCHEMA)
+    return conn
+
+def _content_hash(title, description):
+    return hashlib.sha1(f"{title}\x00{description}".encode('utf-8')).hexdigest()
+
+def index_listings(conn, listings):
+    """Add or update listings in the index (unchanged listings are skipped)
+
+    Returns:
+        (added, updated, unchanged) counts
+    """
+    added = updated = unchanged = 0
+    now = datetime.now().isoformat()
+    existing = {}
+    ids = [l.get('listing_id') for l in listings if l.get('listing_id')]
+    # Look up known hashes in chunks (SQLite's host parameter limit)
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        placeholders = ','.join('?' * len(chunk))
+        for rowid, listing_id, content_hash in conn.execute(
+                f"SELECT rowid, listing_id, content_hash FROM listings WHERE listing_id IN ({placeholders})", chunk):
+            existing[listing_id] = (rowid, content_hash)
+
+    with conn:
+        for listing in listings:
+            listing_id = listing.get('listing_id')
+            if not listing_id:
+                continue
+            title = listing.get('title') or ''
+            description = listing.get('description') or ''
+            content_hash = _content_hash(title, description)
+            row = (title, listing.get('shop_name'), listing.get('listing_url'), listing.get('image_url'),
+                   listing.get('price_reference'), content_hash, now)
+
+            known = existing.get(listing_id)
+            if known and known[1] == content_hash:
+                # Text unchanged - only refresh the non-text columns
+                conn.execute(
+                    "UPDATE listings SET title=?, shop_name=?, listing_url=?, image_url=?, "
+                    "price_reference=?, content_hash=?, indexed_at=? WHERE rowid=?", row + (known[0],))
+                unchanged += 1
+                continue
+
+            tokens = (' '.join(tokenize(title)), ' '.join(tokenize(description)))
+            if known:
+                rowid = known[0]
+                conn.execute(
+                    "UPDATE listings SET title=?, shop_name=?, listing_url=?, image_url=?, "
+                    "price_reference=?, content_hash=?, indexed_at=? WHERE rowid=?", row + (rowid,))
+                conn.execute("DELETE FROM listings_fts WHERE rowid=?", (rowid,))
+                updated += 1
+            else:
+                cursor = conn.execute(
+                    "INSERT INTO listings (listing_id, title, shop_name, listing_url, image_url, "
+                    "price_reference, content_hash, indexed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (listing_id,) + row)
+                rowid = cursor.lastrowid
+                existing[listing_id] = (rowid, content_hash)
+                added += 1
+            conn.execute("INSERT INTO listings_fts (rowid, title_tokens, description_tokens) VALUES (?, ?, ?)",
+                         (rowid,) + tokens)
+    return added, updated, unchanged
+
+def build_match_expression(query, prefix_last=False):
+    """Turn a user query into an FTS5 MATCH expression (all tokens required)
+
+    Returns None if the query has no searchable tokens.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return None
+    terms = ['"' + token.replace('"', '""') + '"' for token in tokens]
+    if prefix_last:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+def search(conn, query, limit=20, shops=None, prefix_last=False):
+    """Keyword search over titles and descriptions, best matches first
+
+    Args:
+        conn: Index connection from open_index()
+        query: Free-text query ("nikon fm2 f1.4", "ニコン FM2")
+        limit: Maximum results
+        shops: Optional list of shop names to restrict to
+        prefix_last: Treat the last token as a prefix (search-as-you-type)
+
+    Returns:
+        list of dicts (listing_id, title, shop_name, listing_url, image_url, price_reference, score)
+    """
+    expression = build_match_expression(query, prefix_last)
+    if expression is None:
+        return []
+    sql = ("SELECT l.listing_id, l.title, l.shop_name, l.listing_url, l.image_url, l.price_reference, "
+           f"bm25(listings_fts, {TITLE_WEIGHT}, {DESCRIPTION_WEIGHT}) AS score "
+           "FROM listings_fts JOIN listings l ON l.rowid = listings_fts.rowid "
+           "WHERE listings_fts MATCH ?")
+    params = [expression]
+    if shops:
+        sql += f" AND l.shop_name IN ({','.join('?' * len(shops))})"
+        params.extend(shops)
+    sql += " ORDER BY score LIMIT ?"
+    params.append(limit)
+    columns = ('listing_id', 'title', 'shop_name', 'listing_url', 'image_url', 'price_reference', 'score')
+    return [dict(zip(columns, row)) for row in conn.execute(sql, params)]
+
+# ====================================================================
+# BENCHMARK
+# ====================================================================
+
+BENCHMARK_VOCABULARY = {
+    'brands': ['Nikon', 'Canon', 'Pentax', 'Olympus', 'Minolta', 'Leica', 'Contax', 'Mamiya', 'Fujica', 'Konica',
+               'ニコン', 'キヤノン', 'ペンタックス', 'オリンパス'],
+    'models': ['FM2', 'New FM2', 'FE2', 'F3', 'F-1', 'AE-1', 'A-1', 'OM-1N', 'OM-2', 'X-700', 'M6', 'M3',
+               'RB67', 'K1000', 'LX', 'ME Super', 'G2', 'ST801'],
+    'lenses': ['50mm F1.4', '50mm F1.8', 'Ai-s 35mm F2', 'Ai 105mm F2.5', 'FD 50mm F1.4', 'Zuiko 50mm F1.8',
+               'Summicron 50mm f/2', 'Planar 50mm F1.7'],
+    'words': ['Black', 'Silver', 'body', 'Excellent', 'Maintained', 'SLR', 'Film Camera', 'Rank AB', 'Junk',
+              'with strap', 'working', '動作確認済み', '美品', 'ジャンク', 'フィルムカメラ', 'ボディ'],
+}
+
+def synthetic_listings(count, seed=0):
+    """Generate synthetic listings with camera-like titles for benchmarking"""
+    rng = random.Random(seed)
+    v = BENCHMARK_VOCABULARY
+    shops = ['Yahoo Japan Auctions', 'Yahoo Japan Fleamarket', 'Mercari', 'Rakuma']
+    listings = []
+    for i in range(count):
+        title = ' '.join([rng.choice(v['words']), rng.choice(v['brands']), rng.choice(v['models']),
+                          rng.choice(v['lenses']), rng.choice(v['words'])])
+        description = ' '.join(rng.choice(v['words']) for _ in range(rng.randint(10, 40)))
+        listings.append({
+            'listing_id': f"b{i:08d}",
+            'title': title,
+            'description': description,
+            'shop_name': rng.choice(shops),
+            'price_reference': float(rng.randint(3000, 300000)),
+        })
+    return listings
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def benchmark(listing_count=100000, query_count=500, seed=0):
+    """Build an index of synthetic listings and measure indexing and query latency
+
+    Returns:
+        dict with build/update timings and query latency p50/p95/max (ms)
+    """
+    listings = synthetic_listings(listing_count, seed)
+    rng = random.Random(seed + 1)
+    v = BENCHMARK_VOCABULARY
+    queries = [
+        rng.choice([
+            lambda: f"{rng.choice(v['brands'])} {rng.choice(v['models'])}",
+            lambda: rng.choice(v['models']),
+            lambda: rng.choice(v['lenses']),
+            lambda: f"{rng.choice(v['models'])} {rng.choice(v['words'])}",
+        ])()
+        for _ in range(query_count)
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        conn = open_index(os.path.join(tmp_dir, 'bench.sqlite3'))
+
+        start = time.perf_counter()
+        index_listings(conn, listings)
+        build_seconds = time.perf_counter() - start
+
+        # Incremental update: 1% changed, rest unchanged
+        changed = listings[:max(1, listing_count // 100)]
+        for listing in changed:
+            listing['title'] += ' Rank A'
+        start = time.perf_counter()
+        added, updated, unchanged = index_listings(conn, listings)
+        update_seconds = time.perf_counter() - start
+
+        latencies = []
+        hits = 0
+        for query in queries:
+            start = time.perf_counter()
+            hits += len(search(conn, query, limit=20))
+            latencies.append((time.perf_counter() - start) * 1000)
+        conn.close()
+
+    return {
+        'listings': listing_count,
+        'build_seconds': round(build_seconds, 2),
+        'build_listings_per_second': round(listing_count / build_seconds),
+        'incremental_update_seconds': round(update_seconds, 2),
+        'incremental_updated': updated,
+        'incremental_unchanged': unchanged,
+        'queries': query_count,
+        'query_ms_p50': round(_percentile(latencies, 0.50), 2),
+        'query_ms_p95': round(_percentile(latencies, 0.95), 2),
+        'query_ms_max': round(max(latencies), 2),
+        'avg_hits': round(hits / query_count, 1),
+    }
+
+def parse_arguments():
+    """Parse command-line arguments"""
+    parser = argparse.ArgumentParser(
+        description='Buyee listing full-text search index',
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--index-file', dest='index_file', default=SEARCH_INDEX_FILE,
+                        help=f'Index database (default: {SEARCH_INDEX_FILE})')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    index_parser = subparsers.add_parser('index', help='Add listings from a results JSON file')
+    index_parser.add_argument('input_file', help='Results JSON from buyee_details.py or buyee_search.py')
+
+    query_parser = subparsers.add_parser('query', help='Search the index')
+    query_parser.add_argument('query', help='Search keywords')
+    query_parser.add_argument('-n', '--limit', type=int, default=20, help='Maximum results (default: 20)')
+
+    bench_parser = subparsers.add_parser('benchmark', help='Measure indexing and query latency')
+    bench_parser.add_argument('--listings', type=int, default=100000, help='Synthetic listings (default: 100000)')
+    bench_parser.add_argument('--queries', type=int, default=500, help='Queries to time (default: 500)')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    if args.command == 'benchmark':
+        print(json.dumps(benchmark(args.listings, args.queries), indent=2))
+        sys.exit(0)
+
+    conn = open_index(args.index_file)
+    if args.command == 'index':
+        with open(args.input_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        listings = result_listings(data)
+        added, updated, unchanged = index_listings(conn, listings)
+        log_info(f"Indexed {len(listings)} listings: {added} added, {updated} updated, {unchanged} unchanged")
+    else:
+        for result in search(conn, args.query, limit=args.limit):
+            print(f"{result['score']:8.2f}  {result['listing_id']:<14} {result['shop_name'] or '':<24} {result['title']}")
+    conn.close()
+    sys.exit(0)
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Buyee Sharded Detail Scraping
+
+Runs Phase 2 in K worker processes instead of one. Within one process the
+BeautifulSoup parsing and regex work of scrape_listing_details is
+serialized by the GIL however many Phase 2 threads run; separate processes
+use all cores of the runner.
+
+- Listings are split by a stable hash of listing_id (CRC32, not hash(),
+  which is salted per process), so a listing always lands in the same shard
+- Each shard process launches its own browser, paces itself with 1/K of
+  the rate limiter budget and writes its listings to a JSON lines file
+- The parent merges the shard files back into input order (the output is
+  the same whichever shard finishes first) and runs the post-processing
+  (saved searches, archive, search index, ...) once on the merged listings
+- In memory-bounded mode the input is split into the shard files as it is
+  read and the shard outputs are streamed to the caller instead of merged
+
+A shard that fails leaves its listings with their Phase 1 data; the
+failure is recorded in results['challenges'] and the shard files are kept
+for inspection.
+
+Used by:
+- buyee_details.py (when PHASE2_SHARDS > 1, or --shards K)
+"""
+
+import os
+import zlib
+import shutil
+import multiprocessing
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from buyee_utils import (
+    COMPACT_LISTING_RECORDS, RUN_REPORT_ENABLED,
+    extract_listing_id, setup_logging, stop_logging, log_info, log_warning, log_success
+)
+from buyee_listing import ListingWriter, iter_listings
+from buyee_memory import peak_rss_mb
+from buyee_timing import TIMINGS
+
+def shard_of(listing, shard_count):
+    """Shard index of a listing (stable across processes and runs)"""
+    listing_url = listing.get('listing_url') or ''
+    key = listing.get('listing_id') or extract_listing_id(listing_url) or listing_url
+    return zlib.crc32(str(key).encode('utf-8')) % shard_count
+
+def run_shard(shard_index, shard_count, input_path, output_path, stream=False):
+    """Shard process entry point: scrape the listings of input_path into output_path
+
+    With stream (memory-bounded mode) the listings are read and scraped a
+    batch at a time and written as they finish, so output_path is not in
+    input order.
+
+    Returns the shard's results (memory, rate limiter, timings, run report).
+    """
+    from buyee_details import scrape_details
+    from buyee_rate_limit import init_limiter
+    from buyee_run_report import RunReport
+
+    setup_logging(f"shard{shard_index}")
+    try:
+        init_limiter(1.0 / shard_count)
+        listings = iter_listings(input_path, compact=COMPACT_LISTING_RECORDS)
+        report = RunReport('details') if RUN_REPORT_ENABLED else None
+        results = {'shard': shard_index}
+        writer = ListingWriter(output_path)
+        if stream:
+            log_info(f"Shard {shard_index + 1}/{shard_count}: streaming {input_path}")
+            results['failed'] = scrape_details(listings, results, report, on_done=writer.write)
+        else:
+            listings = list(listings)
+            log_info(f"Shard {shard_index + 1}/{shard_count}: {len(listings)} listings")
+            results['failed'] = scrape_details(listings, results, report)
+            writer.write_all(listings)
+        writer.close()
+        results['listings'] = writer.count
+        results['timings'] = TIMINGS.summary()
+        if report:
+            results['run_report'] = report.summary(results.get('memory'))
+        return results
+    finally:
+        stop_logging()  # Pool workers exit without running atexit handlers
+
+def scrape_sharded(listings, results, output_file, shard_count, report=None, on_done=None):
+    """Scrape listings in shard_count processes
+
+    With on_done (memory-bounded mode), listings may be any iterable: it is
+    written to the shard input files as it is read, the shards stream their
+    listings, and on_done(listing) is called for every listing of the shard
+    outputs instead of merging them into a list.
+
+    Returns:
+        list: The listings with their detail data, in input order (None with on_done)
+    """
+    if on_done is None:
+        shard_count = min(shard_count, len(listings))
+    shard_dir = os.path.splitext(output_file)[0] + '.shards'
+    os.makedirs(shard_dir, exist_ok=True)
+
+    writers = {}
+    order = array('H')  # Shard index of each input position (to merge back into input order)
+    for listing in listings:
+        index = shard_of(listing, shard_count)
+        writer = writers.get(index)
+        if writer is None:
+            writer = writers[index] = ListingWriter(os.path.join(shard_dir, f"shard{index}.input.jsonl"))
+        writer.write(listing)
+        if on_done is None:
+            order.append(index)
+    paths = {}
+    for index, writer in sorted(writers.items()):
+        writer.close()
+        paths[index] = (writer.path, os.path.join(shard_dir, f"shard{index}.jsonl"))
+
+    total = sum(writer.count for writer in writers.values())
+    log_info(f"\nPhase 2: Scraping {total} listings in {len(paths)} processes "
+             f"({', '.join(str(writers[index].count) for index in paths)} listings per shard)")
+
+    summaries = []
+    failed_shards = set()
+    # spawn: Playwright's driver connection and the logging thread don't survive fork()
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=max(1, len(paths)), mp_context=context) as executor:
+        futures = {index: executor.submit(run_shard, index, shard_count, input_path, output_path, on_done is not None)
+                   for index, (input_path, output_path) in paths.items()}
+        for index, future in futures.items():
+            try:
+                summary = future.result()
+            except Exception as e:
+                failed_shards.add(index)
+                results['challenges'].append(f"Shard {index} failed: {e}")
+                log_warning(f"Shard {index} failed, its listings keep their Phase 1 data: {e}")
+                continue
+            if report and summary.get('run_report'):
+                report.merge(summary.pop('run_report'))
+            summaries.append(summary)
+
+    # A failed shard's listings are read back from its input file (Phase 1 data)
+    sources = {index: paths[index][0] if index in failed_shards else paths[index][1] for index in paths}
+    if on_done is None:
+        # Each shard's output is in its input order: take the next listing of the shard of each position
+        readers = {index: iter_listings(path, compact=COMPACT_LISTING_RECORDS) for index, path in sources.items()}
+        merged = [next(readers[index]) for index in order]
+    else:
+        merged = None
+        for path in sources.values():
+            for listing in iter_listings(path, compact=COMPACT_LISTING_RECORDS):
+                on_done(listing)
+
+    failed = sum(summary['failed'] for summary in summaries)
+    throttle_signals = {}
+    for summary in summaries:
+        for status, count in summary.get('throttle_signals', {}).items():
+            throttle_signals[status] = throttle_signals.get(status, 0) + count
+    results['shards'] = summaries
+    results['throttle_signals'] = throttle_signals
+    results['memory'] = {
+        'python_peak_rss_mb': peak_rss_mb(),
+        'shard_peak_rss_mb': [summary['memory'].get('total_peak_rss_mb') or summary['memory'].get('python_peak_rss_mb')
+                              for summary in summaries],
+        'context_recycles': sum(summary['memory'].get('context_recycles', 0) for summary in summaries),
+    }
+
+    if not failed_shards:
+        shutil.rmtree(shard_dir, ignore_errors=True)
+    log_success(f"Merged {len(summaries)}/{len(paths)} shards ({failed} listing(s) failed)")
+    return merged
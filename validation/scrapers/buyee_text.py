@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Buyee Text Utilities
+
+Title normalization and camera-aware tokenization shared by the matching,
+search and clustering modules.
+
+Tokens keep model and lens designations intact instead of splitting on
+punctuation. Hyphens are folded so "FM-2"/"FM2" and "Ai-s"/"AiS" agree:
+    "Nikon New FM2 Ai-s 50mm F1.4"  ->  nikon, new, fm2, ais, 50mm, f1.4
+
+Japanese text (kana/kanji runs) is split into overlapping character
+bigrams, since it has no word separators:
+    "ニコン"  ->  ニコ, コン
+
+Used by:
+- buyee_saved_search.py
+- buyee_search_index.py
+"""
+
+import re
+import unicodedata
+
+# Latin/digit tokens, allowing internal '.', '-' and '/' ("f1.4", "ai-s", "1/1000")
+LATIN_TOKEN_RE = r'[0-9a-z]+(?:[.\-/][0-9a-z]+)*'
+# Runs of Hiragana, Katakana (incl. prolonged sound mark) and Kanji
+CJK_RUN_RE = r'[぀-ゟ゠-ヿ一-鿿]+'
+
+TOKEN_RE = re.compile(rf'{LATIN_TOKEN_RE}|{CJK_RUN_RE}')
+
+def normalize_text(text):
+    """NFKC-normalize and lowercase (full-width 'ＦＭ２' becomes 'fm2')"""
+    if not text:
+        return ''
+    return unicodedata.normalize('NFKC', text).lower()
+
+def _is_cjk(token):
+    return '぀' <= token[0] <= '鿿'
+
+def tokenize(text):
+    """Return the list of normalized tokens in text (order preserved, duplicates kept)"""
+    tokens = []
+    for token in TOKEN_RE.findall(normalize_text(text)):
+        if _is_cjk(token):
+            if len(token) == 1:
+                tokens.append(token)
+            else:
+                tokens.extend(token[i:i + 2] for i in range(len(token) - 1))
+        else:
+            tokens.append(token.replace('-', ''))
+    return tokens
+
+def token_set(text):
+    """Return the set of normalized tokens in text"""
+    return set(tokenize(text))
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Buyee Throttle Detection
+
+Detects throttling from what the browser actually received instead of
+from exception text:
+
+- HTTP status of document responses (main frame and iframes such as the
+  item description): 429, 403 and 5xx, seen through page.on('response')
+  and the response returned by page.goto()
+- Retry-After headers (seconds or HTTP date)
+- error / captcha interstitials: '/errors' URLs and error page titles
+
+check_response() raises ThrottledError for any of these. The scrapers let
+it propagate to their retry loop, and the adaptive limiter
+(buyee_rate_limit) treats it as a congestion signal, so a throttled page is
+retried at a lower rate instead of being saved as an empty listing.
+EmptyResultError marks pages that loaded without any listing data;
+is_no_results_page() tells a search that matched nothing apart from one
+whose result cards failed to render.
+
+Used by:
+- buyee_search.py (pagination) / buyee_details.py (detail pages)
+"""
+
+import re
+import time
+import threading
+from email.utils import parsedate_to_datetime
+
+THROTTLE_STATUSES = frozenset([403, 429])
+ERROR_URL_MARKERS = ('/errors', '/error/', 'captcha')
+ERROR_TITLE_RE = re.compile(
+    r'captcha|too many requests|access denied|forbidden|^\s*error\b|^\s*エラー|アクセスが集中|混み合って',
+    re.I
+)
+
+# Search result pages that legitimately matched nothing
+NO_RESULTS_RE = re.compile(
+    r'no (?:matching )?(?:items|results)(?: were)? found|\bno results\b|該当する商品|見つかりませんでした',
+    re.I
+)
+
+class ThrottledError(Exception):
+    """The site refused or deflected a request (429/403/5xx, error or captcha page)"""
+
+    def __init__(self, reason, retry_after=None):
+        super().__init__(f"Throttled: {reason}")
+        self.reason = reason
+        self.retry_after = retry_after
+
+class EmptyResultError(Exception):
+    """A page loaded but yielded no listing data"""
+
+def is_throttle_status(status):
+    return status in THROTTLE_STATUSES or status >= 500
+
+def retry_after_seconds(headers):
+    """Seconds from a Retry-After header (delta-seconds or HTTP date), or None"""
+    value = (headers or {}).get('retry-after')
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class ResponseWatcher:
+    """Records throttle signals per page from page.on('response')
+
+    Only document responses count (the main frame and iframes); a throttled
+    image or script doesn't make the listing data wrong.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._signals = {}
+        self.counts = {}
+
+    def attach(self, page):
+        page.on('response', lambda response: self._on_response(page, response))
+
+    def _on_response(self, page, response):
+        try:
+            if response.request.resource_type != 'document':
+                return
+            status = response.status
+            if not is_throttle_status(status):
+                return
+            signal = (f"HTTP {status} {response.url[:80]}", retry_after_seconds(response.headers))
+        except Exception:
+            return  # Page closed while the event was in flight
+        with self._lock:
+            self._signals.setdefault(id(page), signal)
+            key = str(status)
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def pop(self, page):
+        """First throttle signal seen on a page since the last pop, or None"""
+        with self._lock:
+            return self._signals.pop(id(page), None)
+
+_watcher = ResponseWatcher()
+
+def get_watcher():
+    """Process-wide response watcher"""
+    return _watcher
+
+def check_response(page, response=None, watcher=None):
+    """Raise ThrottledError if the page was throttled or is an error/captcha page
+
+    Args:
+        page: Playwright page after navigation
+        response: Response returned by page.goto() (optional)
+        watcher: ResponseWatcher attached to the page (optional; catches iframes)
+    """
+    signal = watcher.pop(page) if watcher is not None else None
+    if response is not None and is_throttle_status(response.status):
+        raise ThrottledError(f"HTTP {response.status}", retry_after_seconds(response.headers))
+    if signal:
+        raise ThrottledError(*signal)
+    url = page.url.lower()
+    for marker in ERROR_URL_MARKERS:
+        if marker in url:
+            raise ThrottledError(f"redirected to {page.url[:80]}")
+    title = page.title()
+    if ERROR_TITLE_RE.search(title or ''):
+        raise ThrottledError(f"error page '{title[:60]}'")
+
+def is_no_results_page(page):
+    """True if a search page says the search matched nothing (rather than failing to render)"""
+    try:
+        text = page.evaluate("() => document.body ? document.body.innerText : ''")
+    except Exception:
+        return False
+    return bool(NO_RESULTS_RE.search(text or ''))
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Buyee Timing
+
+Lightweight span/timer instrumentation for the scraper hot paths.
+
+Two ways to time code:
+
+    with span('details.goto'):            # one block
+        page.goto(url)
+
+    timer = StageTimer('details')         # consecutive sections of one function
+    page.goto(url)
+    timer.mark('goto')                    # records details.goto
+    time.sleep(4)
+    timer.mark('sleep')                   # records details.sleep
+
+    @timed('translate')                   # every call of a function
+
+Durations are collected per stage (thread-safe, so parallel Phase 2
+workers share one recorder) and summarized as count, total, p50, p95 and
+max. The summary goes into the results JSON under 'timings'; it can also be
+exported as a Prometheus text file (node_exporter textfile collector format)
+or a Chrome trace (chrome://tracing, Perfetto) when span events are kept.
+
+This module has no dependencies on the rest of the scraper so buyee_utils
+can import it.
+"""
+
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+class TimingRecorder:
+    """Collects durations per stage and (optionally) individual trace events"""
+
+    def __init__(self, enabled=True, keep_events=False):
+        self.enabled = enabled
+        self.keep_events = keep_events
+        self._lock = threading.Lock()
+        self._durations = {}
+        self._events = []
+        self._origin = time.perf_counter()
+
+    def configure(self, enabled=True, keep_events=False):
+        self.enabled = enabled
+        self.keep_events = keep_events
+
+    def reset(self):
+        with self._lock:
+            self._durations = {}
+            self._events = []
+            self._origin = time.perf_counter()
+
+    def record(self, stage, start, end):
+        """Record one span given perf_counter() start/end values"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._durations.setdefault(stage, []).append(end - start)
+            if self.keep_events:
+                self._events.append((stage, start, end - start, threading.get_ident()))
+
+    def summary(self):
+        """Per-stage statistics (milliseconds, except total_s), sorted by total time"""
+        with self._lock:
+            durations = {stage: sorted(values) for stage, values in self._durations.items()}
+        stats = {}
+        for stage, values in sorted(durations.items(), key=lambda item: -sum(item[1])):
+            stats[stage] = {
+                'count': len(values),
+                'total_s': round(sum(values), 3),
+                'p50_ms': round(_percentile(values, 0.50) * 1000, 1),
+                'p95_ms': round(_percentile(values, 0.95) * 1000, 1),
+                'max_ms': round(values[-1] * 1000, 1),
+            }
+        return stats
+
+    def export_prometheus(self, path, prefix='buyee_scraper'):
+        """Write the summary in Prometheus text exposition format (atomic replace)"""
+        lines = [
+            f"# HELP {prefix}_stage_seconds Time spent per scraper stage",
+            f"# TYPE {prefix}_stage_seconds summary",
+        ]
+        for stage, stats in self.summary().items():
+            label = stage.replace('\\', '\\\\').replace('"', '\\"')
+            lines.append(f'{prefix}_stage_seconds{{stage="{label}",quantile="0.5"}} {stats["p50_ms"] / 1000}')
+            lines.append(f'{prefix}_stage_seconds{{stage="{label}",quantile="0.95"}} {stats["p95_ms"] / 1000}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{label}"}} {stats["total_s"]}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{label}"}} {stats["count"]}')
+        _write_atomic(path, '\n'.join(lines) + '\n')
+
+    def export_chrome_trace(self, path):
+        """Write kept span events as a Chrome trace (chrome://tracing, ui.perfetto.dev)"""
+        with self._lock:
+            events = list(self._events)
+        pid = os.getpid()
+        trace = {
+            'traceEvents': [
+                {
+                    'name': stage,
+                    'cat': stage.split('.', 1)[0],
+                    'ph': 'X',
+                    'ts': round((start - self._origin) * 1e6),
+                    'dur': round(duration * 1e6),
+                    'pid': pid,
+                    'tid': tid,
+                }
+                for stage, start, duration, tid in events
+            ],
+            'displayTimeUnit': 'ms',
+        }
+        _write_atomic(path, json.dumps(trace))
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+def _write_atomic(path, text):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+# Process-wide recorder used by the scrapers
+TIMINGS = TimingRecorder()
+
+@contextmanager
+def span(stage, recorder=None):
+    """Time a block under a stage name"""
+    recorder = recorder or TIMINGS
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        recorder.record(stage, start, time.perf_counter())
+
+def timed(stage):
+    """Decorator: time every call of a function under a stage name"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                TIMINGS.record(stage, start, time.perf_counter())
+        return wrapper
+    return decorator
+
+class StageTimer:
+    """Times consecutive sections of one function with mark() calls
+
+    Each mark(name) records the time since the previous mark (or since the
+    timer was created) as '<prefix>.<name>'. finish() records the whole
+    run as '<prefix>.total'.
+    """
+
+    def __init__(self, prefix, recorder=None):
+        self.prefix = prefix
+        self.recorder = recorder or TIMINGS
+        self.started = self.last = time.perf_counter()
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.recorder.record(f"{self.prefix}.{name}", self.last, now)
+        self.last = now
+
+    def finish(self):
+        now = time.perf_counter()
+        self.recorder.record(f"{self.prefix}.total", self.started, now)
+        self.last = now
+
+def export_timings(prometheus_file=None, trace_file=None, recorder=None):
+    """Return the timing summary and write the optional export files"""
+    recorder = recorder or TIMINGS
+    if prometheus_file:
+        recorder.export_prometheus(prometheus_file)
+    if trace_file:
+        recorder.export_chrome_trace(trace_file)
+    return recorder.summary()
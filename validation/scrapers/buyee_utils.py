@@ -19,6 +19,10 @@ import time
 import os
 import requests
 import logging
+import logging.handlers
+import copy
+import queue
+import atexit
 import argparse
 import sys
 from datetime import datetime
@@ -26,6 +30,8 @@ from urllib.parse import urlparse, quote_plus
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from threading import Lock
 
+from buyee_timing import TIMINGS, timed, export_timings
+
 try:
     from playwright.sync_api import sync_playwright
     PLAYWRIGHT_AVAILABLE = True
@@ -35,29 +41,152 @@ except ImportError:
     print("Then run: playwright install chromium")
 
 # Test configuration
-BASE_URL = "https://buyee.jp"
+BASE_URL = os.environ.get('BUYEE_BASE_URL', "https://buyee.jp").rstrip('/')  # Override to point at buyee_local_server.py
 DEFAULT_SEARCH_TERM = "Nikon FM2"  # Default search term if not provided as argument
 
+# Browser session settings
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+SESSION_PIN_DISPLAY_SETTINGS = True  # Pin Buyee's display currency/language via cookies before browsing
+SESSION_DISPLAY_CURRENCY = 'JPY'  # Display currency to request (Phase 1 prices are trusted only once the page shows JPY)
+SESSION_LANGUAGE = 'en'  # Display language to pin
+SESSION_COOKIES = {  # Cookies set on .buyee.jp by Buyee's currency/language switchers
+    'currencyCode': SESSION_DISPLAY_CURRENCY,
+    'lang': SESSION_LANGUAGE,
+}
+PHASE2_TRUST_PHASE1_JPY_PRICES = True  # Skip detail-page price extraction when Phase 1 recorded JPY prices
+
 # Phase 2 parallelization settings
 PHASE2_PARALLEL = False  # Set to False to process sequentially (True causes thread errors with Playwright sync API)
 PHASE2_MAX_WORKERS = 3  # Number of concurrent detail page scrapes (3-5 recommended for stability)
 PHASE2_RETRY_ATTEMPTS = 2  # Number of retry attempts for failed scrapes
-PHASE2_DELAY_BETWEEN_REQUESTS = 0.5  # Delay in seconds between requests (helps avoid rate limiting)
-PHASE2_RATE_LIMIT_THRESHOLD = 3  # Number of rate limit errors before switching to sequential
-PHASE2_FAILURE_THRESHOLD = 0.3  # Fraction of failures (0.3 = 30%) before switching to sequential
+PHASE2_SHARDS = 1  # Worker processes for Phase 2, each with its own browser (>1 = sharded mode, see buyee_shards.py)
+
+# Adaptive rate limiter settings (see buyee_rate_limit.py) - paces search pagination and Phase 2 workers
+RATE_LIMIT_INITIAL_RATE = 2.0  # Requests per second to start with
+RATE_LIMIT_MIN_RATE = 0.1  # Never go slower than this (requests per second)
+RATE_LIMIT_MAX_RATE = 5.0  # Never go faster than this (requests per second)
+RATE_LIMIT_BURST = 2  # Token bucket size (requests that may start back to back)
+RATE_LIMIT_INITIAL_CONCURRENCY = 1  # Requests in flight to start with (AIMD window)
+RATE_LIMIT_MAX_CONCURRENCY = PHASE2_MAX_WORKERS  # Upper bound of the AIMD window
+RATE_LIMIT_INCREASE_STEP = 0.05  # Rate added per successful request (additive increase)
+RATE_LIMIT_DECREASE_FACTOR = 0.5  # Rate/window multiplier on throttling (multiplicative decrease)
+RATE_LIMIT_SLOW_DECREASE_FACTOR = 0.8  # Rate/window multiplier on slow responses
+RATE_LIMIT_DECREASE_COOLDOWN_S = 5.0  # Treat throttling within this window as one congestion event
+RATE_LIMIT_SLOW_RESPONSE_S = 20.0  # Requests slower than this count as a congestion signal
+
+# Per-shop Phase 2 limits (see buyee_rate_limit.py) - each marketplace's detail pages and images come from
+# a different backend/CDN, so each shop gets its own adaptive limiter and its own Phase 2 workers (still
+# under the shared limiter and PHASE2_MAX_WORKERS workers in total)
+PHASE2_PER_SHOP_LIMITS = True  # False = all shops share one limiter and PHASE2_MAX_WORKERS workers
+PHASE2_SHOP_LIMITS = {  # Keyed by the Phase 1 shop_name; overrides initial_rate, min_rate, max_rate, max_concurrency
+    'Yahoo Japan Auctions': {'max_rate': 3.0, 'max_concurrency': 3},
+    'Yahoo Japan Fleamarket': {'max_rate': 2.0, 'max_concurrency': 2},
+    'Mercari': {'max_rate': 2.0, 'max_concurrency': 2},
+    'Rakuma': {'max_rate': 1.0, 'max_concurrency': 1},
+}  # Shops not listed use the RATE_LIMIT_* settings
 
 # Pagination settings
 PAGINATION_ENABLED = True  # Set to False to only scrape first page
 PAGINATION_MAX_PAGES = None  # Maximum pages to scrape (None = all pages, or set a number like 5)
-PAGINATION_DELAY_BETWEEN_PAGES = 1.0  # Delay in seconds between page loads
+PAGINATION_RETRY_ATTEMPTS = 2  # Retries per page when the site throttles (429/403/5xx or error page)
 
 # Logging settings
 LOG_ENABLED = True  # Enable/disable logging
 LOG_DIR = 'validation/results/logs'  # Directory for log files
 LOG_LEVEL = logging.INFO  # Logging level: DEBUG, INFO, WARNING, ERROR, CRITICAL
 LOG_CONSOLE = True  # Also output to console (in addition to log file)
+LOG_FORMAT = 'json'  # Log file format: 'json' (one structured record per line) or 'text'
 LOG_FILE_PREFIX = 'buyee_scraper'  # Prefix for log file names
 
+# Timing instrumentation settings (see buyee_timing.py)
+TIMING_ENABLED = True  # Record per-stage timings (summary written to results JSON under 'timings')
+TIMING_PROMETHEUS_FILE = None  # e.g. 'validation/results/{phase}_timings.prom' - Prometheus text export
+TIMING_TRACE_FILE = None  # e.g. 'validation/results/{phase}_trace.json' - Chrome trace export (keeps every span)
+TIMINGS.configure(enabled=TIMING_ENABLED, keep_events=bool(TIMING_TRACE_FILE))
+
+# Image store settings (see buyee_image_store.py)
+IMAGE_STORE_ENABLED = True  # Download images through the content-addressed store (dedup + conditional revalidation)
+IMAGE_STORE_DIR = 'validation/results/images'  # Root directory of the image store
+IMAGE_STORE_INDEX_FILE = 'index.json'  # URL -> SHA-256 index file (inside IMAGE_STORE_DIR)
+
+# Image variant settings (see buyee_image_pipeline.py)
+IMAGE_VARIANTS_DIR = 'validation/results/images/variants'  # Output directory for generated variants
+IMAGE_PIPELINE_MAX_WORKERS = None  # Worker processes for variant generation (None = CPU count)
+IMAGE_VARIANTS = {
+    # name: (width, height, mode, format) - mode 'fit' keeps aspect ratio, 'pad' letterboxes onto white
+    'card': (400, 300, 'fit', 'JPEG'),  # Feed card thumbnail
+    'detail': (800, 600, 'fit', 'JPEG'),  # Listing detail page
+    'retina': (1600, 1200, 'fit', 'JPEG'),  # Detail page on 2x displays
+}
+IMAGE_VARIANT_QUALITY = 85  # JPEG quality for generated variants
+
+# Duplicate image detection settings (see buyee_image_hash.py)
+IMAGE_DEDUP_ENABLED = False  # Check Phase 1 thumbnails against known listings before Phase 2 (downloads thumbnails)
+IMAGE_DEDUP_SKIP_PHASE2 = True  # Skip detail scraping for listings whose thumbnail matches a known listing
+IMAGE_HASH_ALGORITHM = 'phash'  # Perceptual hash to use: 'phash' (DCT) or 'dhash' (gradient)
+IMAGE_HASH_MAX_DISTANCE = 6  # Max Hamming distance (of 64 bits) to consider two images the same
+IMAGE_HASH_INDEX_FILE = 'validation/results/image_hash_index.json'  # Persistent perceptual hash index
+
+# Listing record settings (see buyee_listing.py)
+COMPACT_LISTING_RECORDS = True  # Hold listings as slotted Listing records instead of dicts (converted back for JSON)
+
+# Title entity extraction settings (see buyee_entities.py)
+ENTITY_EXTRACTION_ENABLED = True  # Tag Phase 1 listings with brand/model/lens/rank/condition_grade
+
+# Cross-shop duplicate clustering settings (see buyee_clusters.py)
+TITLE_CLUSTERING_ENABLED = True  # Tag Phase 1 listings with cluster_id/cluster_size/cluster_primary
+CLUSTER_SKIP_SECONDARY_PHASE2 = False  # Only scrape the primary listing of each duplicate cluster in Phase 2
+CLUSTER_MIN_SIMILARITY = 0.6  # Title token Jaccard similarity two listings must exceed to be duplicates (brand/model must agree too)
+CLUSTER_MINHASH_PERMUTATIONS = 128  # MinHash signature length
+CLUSTER_LSH_BANDS = 32  # LSH bands (rows per band = permutations / bands; more bands = more candidates)
+CLUSTER_CONFIRM_WITH_IMAGE = False  # Also require near-identical thumbnails (downloads thumbnails)
+
+# Price normalization settings (see buyee_prices.py)
+PRICE_REFERENCE_CURRENCY = 'JPY'  # Currency that all prices are converted to for sorting/stats
+PRICE_FX_RATES_FILE = 'validation/results/fx_rates.json'  # Local FX table override: {"USD": 150.0, ...} in reference units
+PRICE_FX_RATES = {  # Fallback FX table (reference currency units per 1 unit of currency)
+    'JPY': 1.0,
+    'USD': 150.0,
+    'EUR': 162.0,
+    'BRL': 27.0,
+}
+
+# Listing archive settings (see buyee_archive.py)
+ARCHIVE_ENABLED = False  # Append each Phase 2 run to the columnar archive (requires pyarrow)
+ARCHIVE_DIR = 'validation/results/archive'  # Root of the Parquet dataset (partitioned by date and shop_name)
+
+# Price series settings (see buyee_price_series.py)
+PRICE_SERIES_ENABLED = False  # Record Phase 2 prices into the per-model price series
+PRICE_SERIES_DIR = 'validation/results/price_series'  # Series files (observations + daily/weekly rollups)
+PRICE_SERIES_VALUE_WINDOW_DAYS = 90  # Trailing window used for market value estimates
+
+# Full-text search index settings (see buyee_search_index.py)
+SEARCH_INDEX_ENABLED = False  # Add Phase 2 listings to the full-text search index
+SEARCH_INDEX_FILE = 'validation/results/listings_index.sqlite3'  # SQLite database holding the FTS5 index
+
+# Recorded fixture settings (see buyee_fixtures.py)
+FIXTURES_DIR = 'validation/fixtures'  # Recorded pages (HAR + manifest per fixture)
+FIXTURE_BLOCKED_RESOURCES = ('image', 'media', 'font')  # Not recorded or replayed (the scrapers don't read them)
+BENCHMARK_REGRESSION_THRESHOLD = 0.20  # Flag stages whose p50 is this much slower than the baseline
+
+# Memory-bounded mode settings (see buyee_memory.py)
+MEMORY_BOUNDED_MODE = False  # Stream listings to a JSON lines file, drop raw HTML and recycle browser contexts
+MEMORY_KEEP_RAW_HTML = False  # Keep page.content() of search pages (debugging only; never needed by the pipeline)
+MEMORY_RECYCLE_AFTER_NAVIGATIONS = 50  # Replace a page's browser context after this many navigations (None = never)
+MEMORY_PHASE2_BATCH_SIZE = 200  # Phase 2 listings read, pre-filtered and scraped per batch (cluster secondaries are only found within a batch if Phase 1 didn't cluster)
+
+# Run report settings (see buyee_run_report.py)
+RUN_REPORT_ENABLED = True  # Record wall time, listings/s, navigations, bytes by resource type, retries per run
+RUN_REPORT_HISTORY_FILE = 'validation/results/run_history.jsonl'  # Rolling history of run reports (one line per run)
+RUN_REPORT_HISTORY_MAX_RUNS = 500  # Runs kept in the history file
+
+# Work queue settings (see buyee_work_queue.py)
+WORK_QUEUE_FILE = 'validation/results/work_queue.sqlite3'  # SQLite database shared by --worker processes
+WORK_QUEUE_VISIBILITY_TIMEOUT_S = 300  # A leased task becomes available again if not acked within this time
+WORK_QUEUE_MAX_ATTEMPTS = 3  # Leases per task before it is dead-lettered
+WORK_QUEUE_RETRY_DELAY_S = 30  # Backoff before a failed task is leased again (multiplied by the attempt number)
+WORK_QUEUE_POLL_INTERVAL_S = 5  # How often an idle worker checks for tasks while others still hold leases
+
 # Future features (require database integration - not yet implemented)
 # ====================================================================
 # FEATURE 1: Filter New Listings Only
@@ -84,6 +213,35 @@ FILTER_NEW_LISTINGS_ONLY = False  # Set to True when database is ready
 STATUS_UPDATE_MODE = False  # Set to True when database is ready
 STATUS_UPDATE_SKIP_PHASE2 = True  # Skip Phase 2 for status-only updates (faster)
 
+# ====================================================================
+# FEATURE 3: Saved Search Matching
+# ====================================================================
+# When enabled, each batch of scraped listings is matched against all
+# users' saved searches in one pass (see buyee_saved_search.py).
+# Requires:
+# - Database connection to load saved searches
+# - Function: get_saved_searches() -> list of dicts (id, user_id, name, query_params)
+# - Function: record_saved_search_matches(matches) -> None
+SAVED_SEARCH_MATCHING_ENABLED = False  # Set to True when database is ready
+SAVED_SEARCHES_FILE = None  # Optional local JSON file of saved searches (used instead of the database)
+SAVED_SEARCH_RECORD_BATCH_SIZE = 100  # Queue worker: matches buffered per record_saved_search_matches() call
+
+# ====================================================================
+# FEATURE 4: Collection Valuation
+# ====================================================================
+# When enabled, every user's collection cameras are revalued after each
+# Phase 2 run from the per-model price series (see buyee_valuation.py).
+# Requires:
+# - PRICE_SERIES_ENABLED (market prices per model/condition)
+# - Database connection to load and update collection cameras
+# - Function: get_collection_cameras() -> list of dicts (id, brand, model, condition, current_value)
+# - Function: update_collection_values(updates) -> None
+COLLECTION_VALUATION_ENABLED = False  # Set to True when database is ready
+COLLECTION_CAMERAS_FILE = None  # Optional local JSON file of collection cameras (used instead of the database)
+VALUATION_MIN_COMPARABLES = 3  # Minimum observations in the window to value an item
+VALUATION_STATE_FILE = 'validation/results/valuation_state.json'  # Last run time (for incremental runs)
+
+@timed('translate')
 def translate_japanese(text, target_lang='en'):
     """Translate Japanese text to English (or other language)"""
     if not text:
@@ -188,100 +346,213 @@ def validate_listing_details(detail, shop_name):
     is_valid = True  # Phase 2 is more lenient - we keep the data even with warnings
     return is_valid, errors
 
+# ====================================================================
+# BROWSER SESSION SETUP
+# ====================================================================
+
+def create_browser_context(browser, **context_options):
+    """Create a browser context with the scraper's standard settings
+
+    When SESSION_PIN_DISPLAY_SETTINGS is True, Buyee's display currency and
+    language cookies are set before the first navigation so every page in the
+    context renders prices in SESSION_DISPLAY_CURRENCY. The cookies only
+    request it: the currency actually shown is read back from each search
+    page (buyee_search.page_display_currency).
+
+    Extra keyword arguments are passed to browser.new_context() (e.g.
+    record_har_path when recording fixtures).
+    """
+    context = browser.new_context(
+        user_agent=USER_AGENT,
+        locale='ja-JP',
+        timezone_id='Asia/Tokyo',
+        extra_http_headers={
+            'Accept-Language': 'ja,ja-JP;q=0.9,en;q=0.8'
+        },
+        **context_options
+    )
+    if SESSION_PIN_DISPLAY_SETTINGS:
+        # A local stand-in server (BUYEE_BASE_URL) gets the cookies on its own origin
+        scope = {'domain': '.buyee.jp', 'path': '/'} if BASE_URL == 'https://buyee.jp' else {'url': BASE_URL}
+        context.add_cookies([
+            {'name': name, 'value': value, **scope}
+            for name, value in SESSION_COOKIES.items()
+        ])
+    return context
+
+# ====================================================================
+# TIMING
+# ====================================================================
+
+def collect_timings(phase):
+    """Return the per-stage timing summary and write the configured exports for a phase"""
+    return export_timings(
+        prometheus_file=TIMING_PROMETHEUS_FILE.format(phase=phase) if TIMING_PROMETHEUS_FILE else None,
+        trace_file=TIMING_TRACE_FILE.format(phase=phase) if TIMING_TRACE_FILE else None,
+    )
+
 # ====================================================================
 # LOGGING SETUP
 # ====================================================================
 
-def setup_logging():
+class JsonLogFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, thread, message, plus any structured fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class ConsoleLogFormatter(logging.Formatter):
+    """Bare message with the level marker the scrapers have always printed"""
+
+    PREFIXES = {logging.DEBUG: '🔍 ', logging.WARNING: '⚠️ ', logging.ERROR: '❌ ', logging.CRITICAL: '❌ '}
+
+    def format(self, record):
+        return self.PREFIXES.get(record.levelno, '') + record.getMessage()
+
+class TracebackQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that keeps a record's traceback in exc_text instead of appending it to the message"""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+_logger = logging.getLogger('buyee')
+_logger.setLevel(LOG_LEVEL)
+_log_listener = None
+
+def setup_logging(name_suffix=None):
     """Setup logging configuration
     
-    Creates a log file with timestamp and configures logging to both
-    file and console (if enabled).
+    Creates a log file with timestamp (plus name_suffix, e.g. 'shard2' for a
+    shard process, so concurrent processes don't share a file) and routes all scraper logging through
+    a QueueHandler: callers only enqueue records, and a QueueListener thread
+    writes them to the log file (JSON lines, or text when LOG_FORMAT is
+    'text') and the console. Records below LOG_LEVEL are dropped before any
+    formatting happens.
     """
-    if not LOG_ENABLED:
-        # Disable logging
-        logging.disable(logging.CRITICAL)
-        return None
-    
-    # Create log directory if it doesn't exist
-    os.makedirs(LOG_DIR, exist_ok=True)
-    
-    # Create log filename with timestamp
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    log_filename = f"{LOG_FILE_PREFIX}_{timestamp}.log"
-    log_filepath = os.path.join(LOG_DIR, log_filename)
-    
-    # Configure logging format
-    log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    date_format = '%Y-%m-%d %H:%M:%S'
+    global _log_listener
+    log_filepath = None
+    handlers = []
     
-    # Configure root logger
-    logger = logging.getLogger()
-    logger.setLevel(LOG_LEVEL)
+    # Stop a listener from a previous setup_logging() call
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
     
-    # Remove existing handlers to avoid duplicates
-    logger.handlers = []
-    
-    # File handler (always enabled if logging is enabled)
-    file_handler = logging.FileHandler(log_filepath, encoding='utf-8')
-    file_handler.setLevel(LOG_LEVEL)
-    file_formatter = logging.Formatter(log_format, date_format)
-    file_handler.setFormatter(file_formatter)
-    logger.addHandler(file_handler)
+    if LOG_ENABLED:
+        # Create log directory if it doesn't exist
+        os.makedirs(LOG_DIR, exist_ok=True)
+        
+        # Create log filename with timestamp
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        extension = 'jsonl' if LOG_FORMAT == 'json' else 'log'
+        name = f"{LOG_FILE_PREFIX}_{name_suffix}" if name_suffix else LOG_FILE_PREFIX
+        log_filepath = os.path.join(LOG_DIR, f"{name}_{timestamp}.{extension}")
+        
+        file_handler = logging.FileHandler(log_filepath, encoding='utf-8')
+        if LOG_FORMAT == 'json':
+            file_handler.setFormatter(JsonLogFormatter())
+        else:
+            file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                                                        '%Y-%m-%d %H:%M:%S'))
+        handlers.append(file_handler)
     
     # Console handler (if enabled)
     if LOG_CONSOLE:
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel(LOG_LEVEL)
-        console_formatter = logging.Formatter(log_format, date_format)
-        console_handler.setFormatter(console_formatter)
-        logger.addHandler(console_handler)
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(ConsoleLogFormatter())
+        handlers.append(console_handler)
+    
+    if not handlers:
+        return None
+    
+    # Scraper threads only put records on the queue; the listener thread does the I/O
+    log_queue = queue.SimpleQueue()
+    _logger.setLevel(LOG_LEVEL)
+    _logger.handlers = [TracebackQueueHandler(log_queue)]
+    _logger.propagate = False
+    _log_listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=False)
+    _log_listener.start()
     
     # Log initial message
-    logger.info("=" * 60)
-    logger.info("Buyee Scraper - Logging Started")
-    logger.info("=" * 60)
-    logger.info(f"Log file: {log_filepath}")
-    logger.info(f"Log level: {logging.getLevelName(LOG_LEVEL)}")
-    logger.info(f"Console output: {LOG_CONSOLE}")
-    logger.info("")
+    _logger.info("=" * 60)
+    _logger.info("Buyee Scraper - Logging Started")
+    _logger.info("=" * 60)
+    _logger.info(f"Log file: {log_filepath or 'disabled'}")
+    _logger.info(f"Log level: {logging.getLevelName(LOG_LEVEL)}")
+    _logger.info(f"Console output: {LOG_CONSOLE}")
+    _logger.info("")
     
     return log_filepath
 
-def log_info(message):
-    """Log info message"""
-    if LOG_ENABLED:
-        logging.info(message)
-    if LOG_CONSOLE:
-        print(message)
+def stop_logging():
+    """Flush queued log records and stop the listener thread"""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+
+# Registered once; stops whichever listener is running at exit
+atexit.register(stop_logging)
 
-def log_warning(message):
+def debug_enabled():
+    """True if debug records would be emitted (guard expensive debug-only work with this)"""
+    return _logger.isEnabledFor(logging.DEBUG)
+
+def _log(level, message, args, fields):
+    if not _logger.isEnabledFor(level):
+        return
+    exc_info = fields.pop('exc_info', None)
+    if _log_listener is None:
+        # setup_logging() not called (e.g. module used as a library): console only
+        if LOG_CONSOLE:
+            print(ConsoleLogFormatter.PREFIXES.get(level, '') + (message % args if args else message))
+        return
+    _logger.log(level, message, *args, exc_info=exc_info, extra={'fields': fields} if fields else None)
+
+def log_info(message, *args, **fields):
+    """Log info message
+    
+    Extra positional args are %-formatted lazily (only if the level is
+    enabled); keyword args are added as structured fields in the JSON log,
+    except exc_info, which is passed to logging as usual.
+    """
+    _log(logging.INFO, message, args, fields)
+
+def log_warning(message, *args, **fields):
     """Log warning message"""
-    if LOG_ENABLED:
-        logging.warning(message)
-    if LOG_CONSOLE:
-        print(f"⚠️ {message}")
+    _log(logging.WARNING, message, args, fields)
 
-def log_error(message):
+def log_error(message, *args, **fields):
     """Log error message"""
-    if LOG_ENABLED:
-        logging.error(message)
-    if LOG_CONSOLE:
-        print(f"❌ {message}")
+    _log(logging.ERROR, message, args, fields)
 
-def log_debug(message):
+def log_debug(message, *args, **fields):
     """Log debug message"""
-    if LOG_ENABLED:
-        logging.debug(message)
-    if LOG_CONSOLE:
-        print(f"🔍 {message}")
+    _log(logging.DEBUG, message, args, fields)
 
-def log_success(message):
+def log_success(message, *args, **fields):
     """Log success message"""
-    if LOG_ENABLED:
-        logging.info(f"✅ {message}")
-    if LOG_CONSOLE:
-        print(f"✅ {message}")
+    _log(logging.INFO, f"✅ {message}", args, fields)
 
 # ====================================================================
 # FUTURE FEATURE PLACEHOLDERS - Database Integration Required
@@ -367,6 +638,77 @@ def is_listing_status_changed(listing_id, new_status):
     # Placeholder - always returns True (assume status changed)
     return True
 
+def get_saved_searches():
+    """PLACEHOLDER: Load all users' saved searches from database
+    
+    TODO: Implement database query to load saved searches
+    Returns: list of dicts with keys id, user_id, name, query_params
+    
+    Until then, saved searches are read from SAVED_SEARCHES_FILE if set.
+    
+    Example implementation:
+        connection = get_database_connection()
+        query = "SELECT id, user_id, name, query_params FROM saved_searches"
+        return [dict(row) for row in connection.execute(query)]
+    """
+    if SAVED_SEARCHES_FILE and os.path.exists(SAVED_SEARCHES_FILE):
+        with open(SAVED_SEARCHES_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    # Placeholder - no saved searches
+    return []
+
+def record_saved_search_matches(matches):
+    """PLACEHOLDER: Store saved search matches (and trigger notifications)
+    
+    TODO: Implement database insert for (search_id, listing_id) pairs
+    Args:
+        matches: list of (search_id, listing_id) tuples
+    
+    Example implementation:
+        connection = get_database_connection()
+        query = "INSERT INTO saved_search_matches (search_id, listing_id, matched_at) VALUES (?, ?, ?)"
+        connection.executemany(query, [(s, l, datetime.now()) for s, l in matches])
+        connection.commit()
+    """
+    # Placeholder - no-op
+    pass
+
+def get_collection_cameras():
+    """PLACEHOLDER: Load all users' collection cameras from database
+    
+    TODO: Implement database query to load collection cameras
+    Returns: list of dicts with keys id, brand, model, condition, current_value
+    
+    Until then, items are read from COLLECTION_CAMERAS_FILE if set.
+    
+    Example implementation:
+        connection = get_database_connection()
+        query = "SELECT id, brand, model, condition, current_value FROM collection_cameras"
+        return [dict(row) for row in connection.execute(query)]
+    """
+    if COLLECTION_CAMERAS_FILE and os.path.exists(COLLECTION_CAMERAS_FILE):
+        with open(COLLECTION_CAMERAS_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    # Placeholder - no collection items
+    return []
+
+def update_collection_values(updates):
+    """PLACEHOLDER: Write estimated values back to collection cameras
+    
+    TODO: Implement database update (current_value plus a value_confidence column)
+    Args:
+        updates: list of dicts with keys id, current_value, value_confidence,
+                 value_basis, comparables, valued_at
+    
+    Example implementation:
+        connection = get_database_connection()
+        query = "UPDATE collection_cameras SET current_value = ?, value_confidence = ? WHERE id = ?"
+        connection.executemany(query, [(u['current_value'], u['value_confidence'], u['id']) for u in updates])
+        connection.commit()
+    """
+    # Placeholder - no-op
+    pass
+
 def filter_new_listings(listings):
     """Filter listings to return only new ones (not yet in database)
     
@@ -446,7 +788,7 @@ def validate_search_result(listing):
     
     if not listing.get('listing_url'):
         errors.append("Missing listing URL")
-    elif not listing['listing_url'].startswith('https://buyee.jp'):
+    elif not listing['listing_url'].startswith(('https://buyee.jp', BASE_URL)):
         errors.append(f"Invalid listing URL format: {listing.get('listing_url')}")
     
     if not listing.get('listing_id'):
@@ -478,10 +820,32 @@ def validate_search_result(listing):
     return is_valid, errors
 
 def download_image(image_url, output_dir, listing_index, image_index=0):
-    """Download an image from URL and save it locally"""
+    """Download an image from URL and save it locally
+
+    When IMAGE_STORE_ENABLED is True the image is fetched through the
+    content-addressed image store (buyee_image_store.py): identical images are
+    stored once, and a URL fetched on a previous run is revalidated with a
+    conditional request instead of being downloaded again. The returned
+    filename is then a hard link (or copy) of the stored object.
+    """
+    if IMAGE_STORE_ENABLED:
+        from buyee_image_store import fetch_image, link_to
+        try:
+            # The store index is saved at the end of the run (buyee_image_store.save_all_indexes)
+            entry = fetch_image(image_url)
+            if not entry:
+                return None
+            ext = os.path.splitext(entry['path'])[1] or '.jpg'
+            filename = f"listing_{listing_index}_image_{image_index}{ext}"
+            link_to(entry, os.path.join(output_dir, filename))
+            return filename
+        except Exception as e:
+            print(f"Error downloading image {image_url}: {e}")
+            return None
+
     try:
         headers = {
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+            'User-Agent': USER_AGENT
         }
         response = requests.get(image_url, headers=headers, timeout=10, stream=True)
         if response.status_code == 200:
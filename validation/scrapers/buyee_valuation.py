@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Buyee Collection Valuation
+
+Estimates CollectionCamera.current_value from scraped market prices.
+
+All collection items (every user's) are valued in one batch: items are
+grouped by their price series key (normalized brand/model + condition), the
+market value of each distinct key is read once from the price series
+rollups (buyee_price_series), and the result is applied to every item in
+the group. A thousand FM2s in Good condition cost one lookup, not a
+thousand queries.
+
+When the condition series has fewer than VALUATION_MIN_COMPARABLES
+observations in the window, the model's all-condition series is used
+instead, at lower confidence.
+
+Confidence (0-1) combines:
+    sample size   1 - exp(-count / 10)       more comparables -> higher
+    spread        1 - IQR / median           tight prices -> higher
+    fallback      x0.75                      condition series not used
+
+Runs are incremental: only items whose series received observations since
+the last run (plus items that were never valued) are recomputed.
+
+Used by:
+- buyee_details.py (when COLLECTION_VALUATION_ENABLED is True)
+
+Can also be run directly:
+    python buyee_valuation.py            # incremental
+    python buyee_valuation.py --full     # revalue every item
+"""
+
+import os
+import sys
+import json
+import math
+import argparse
+from collections import defaultdict
+from datetime import datetime
+
+from buyee_price_series import PriceSeriesStore, series_key
+from buyee_utils import (
+    PRICE_SERIES_DIR, PRICE_SERIES_VALUE_WINDOW_DAYS,
+    VALUATION_MIN_COMPARABLES, VALUATION_STATE_FILE,
+    get_collection_cameras, update_collection_values,
+    log_info, log_warning
+)
+
+FALLBACK_CONFIDENCE_FACTOR = 0.75
+
+def confidence_score(value, fallback=False):
+    """Confidence (0-1) of a market value estimate"""
+    if not value or not value.get('median'):
+        return 0.0
+    sample = 1 - math.exp(-value['count'] / 10)
+    spread = max(0.0, 1 - (value['p75'] - value['p25']) / value['median'])
+    score = sample * spread * (FALLBACK_CONFIDENCE_FACTOR if fallback else 1.0)
+    return round(score, 3)
+
+def item_keys(item):
+    """(condition series key, model series key) for a collection item, or None"""
+    if not item.get('brand') or not item.get('model'):
+        return None
+    model_key = series_key(item['brand'], item['model'])
+    condition = item.get('condition')
+    return (series_key(item['brand'], item['model'], condition) if condition else None), model_key
+
+def load_state(path=VALUATION_STATE_FILE):
+    if path and os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            log_warning(f"Could not read valuation state {path}: {e}")
+    return {}
+
+def save_state(state, path=VALUATION_STATE_FILE):
+    if not path:
+        return
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+def value_collection(items, store, changed_keys=None, window_days=PRICE_SERIES_VALUE_WINDOW_DAYS,
+                     min_comparables=VALUATION_MIN_COMPARABLES):
+    """Value collection items against the price series in one grouped pass
+
+    Args:
+        items: CollectionCamera dicts (id, brand, model, condition, current_value)
+        store: PriceSeriesStore
+        changed_keys: Series keys with new observations (None = revalue everything)
+        window_days: Trailing window for market values
+        min_comparables: Minimum observations to use the condition series
+
+    Returns:
+        list of update dicts (id, current_value, value_confidence, value_basis, comparables, valued_at)
+    """
+    groups = defaultdict(list)
+    for item in items:
+        keys = item_keys(item)
+        if keys is None:
+            continue
+        condition_key, model_key = keys
+        needs_value = item.get('current_value') is None
+        if changed_keys is None or needs_value or condition_key in changed_keys or model_key in changed_keys:
+            groups[keys].append(item)
+
+    values = {}
+    def market_value(key):
+        # Each distinct series is read once per run
+        if key not in values:
+            values[key] = store.market_value(key, window_days) if key else None
+        return values[key]
+
+    valued_at = datetime.now().isoformat()
+    updates = []
+    for (condition_key, model_key), group in groups.items():
+        value, basis, fallback = market_value(condition_key), condition_key, False
+        if value is None or value['count'] < min_comparables:
+            value, basis, fallback = market_value(model_key), model_key, True
+        if value is None or value['count'] < min_comparables:
+            continue
+        confidence = confidence_score(value, fallback)
+        for item in group:
+            updates.append({
+                'id': item.get('id'),
+                'current_value': round(value['median']),
+                'value_confidence': confidence,
+                'value_basis': basis,
+                'comparables': value['count'],
+                'valued_at': valued_at,
+            })
+    log_info(f"  💴 Valuation: {len(updates)} items updated "
+             f"({len(groups)} model/condition groups, {len(values)} series read)")
+    return updates
+
+def run_valuation(full=False, store_dir=PRICE_SERIES_DIR, state_file=VALUATION_STATE_FILE):
+    """Value the collection incrementally and write back current_value
+
+    Returns:
+        Number of items updated
+    """
+    state = {} if full else load_state(state_file)
+    started_at = datetime.now().isoformat()
+    store = PriceSeriesStore(store_dir)
+    changed_keys = None if full or not state.get('last_run_at') else store.keys_updated_since(state['last_run_at'])
+
+    items = get_collection_cameras()
+    if not items:
+        log_info("  💴 Valuation: no collection items")
+        return 0
+    updates = value_collection(items, store, changed_keys)
+    if updates:
+        update_collection_values(updates)
+    save_state({'last_run_at': started_at, 'items_updated': len(updates)}, state_file)
+    return len(updates)
+
+def parse_arguments():
+    """Parse command-line arguments"""
+    parser = argparse.ArgumentParser(
+        description='Value collection cameras from scraped market prices',
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--full', action='store_true', help='Revalue every item, not only changed models')
+    parser.add_argument('--store-dir', dest='store_dir', default=PRICE_SERIES_DIR,
+                        help=f'Price series directory (default: {PRICE_SERIES_DIR})')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    run_valuation(full=args.full, store_dir=args.store_dir)
+    sys.exit(0)
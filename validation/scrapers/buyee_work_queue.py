@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Buyee Work Queue
+
+Durable task queue so several scraper processes (or runners sharing a
+local disk) can split the work of many saved searches without scraping
+anything twice. Search result pages and detail listings become tasks:
+
+    search_page   one search result page (payload: search term, URL, page number)
+    detail        one listing for Phase 2 (payload: the Phase 1 listing)
+
+Semantics:
+
+- put: tasks are unique per (kind, key) - a listing found by two saved
+  searches is enqueued once. Search pages can be re-armed for the next
+  cycle with requeue_done=True; detail tasks that are done stay done.
+- lease: a worker takes the oldest available task for visibility_timeout
+  seconds. If it is not acked in time (the worker died or hung) the task
+  becomes available again and counts another attempt.
+- ack / fail: ack marks the task done (storing its result); fail makes it
+  available again after a backoff (or the Retry-After of a throttled
+  request). After WORK_QUEUE_MAX_ATTEMPTS leases the task is
+  dead-lettered instead and left for inspection (retry_dead requeues).
+
+WorkQueue is the interface; SqliteWorkQueue implements it with one SQLite
+file (WAL mode, BEGIN IMMEDIATE for leases) and needs no external
+service. SQLite locking is only reliable on local disks, not on NFS/SMB
+shares.
+
+Used by:
+- buyee_search.py --enqueue / --worker (search_page tasks, enqueues detail tasks)
+- buyee_details.py --worker (detail tasks)
+
+Command line:
+    python buyee_work_queue.py stats
+    python buyee_work_queue.py dead [--kind detail]
+    python buyee_work_queue.py retry-dead [--kind detail]
+    python buyee_work_queue.py export -o validation/results/queue_details_results.json
+    python buyee_details.py --postprocess validation/results/queue_details_results.json
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import argparse
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+from buyee_listing import json_default
+from buyee_utils import (
+    WORK_QUEUE_FILE, WORK_QUEUE_VISIBILITY_TIMEOUT_S, WORK_QUEUE_MAX_ATTEMPTS,
+    WORK_QUEUE_RETRY_DELAY_S, WORK_QUEUE_POLL_INTERVAL_S,
+    log_info, log_warning, log_error
+)
+
+SEARCH_PAGE = 'search_page'
+DETAIL = 'detail'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    task_key TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'ready',      -- ready | leased | done | dead
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,               -- not leasable before (lease expiry, retry backoff)
+    lease_owner TEXT,
+    lease_token TEXT,
+    result TEXT,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    UNIQUE (kind, task_key)
+);
+CREATE INDEX IF NOT EXISTS tasks_available ON tasks (kind, state, available_at);
+"""
+
+class Task:
+    """A leased task; pass it back to ack() or fail()"""
+
+    __slots__ = ('id', 'kind', 'key', 'payload', 'attempts', 'token')
+
+    def __init__(self, id, kind, key, payload, attempts, token):
+        self.id = id
+        self.kind = kind
+        self.key = key
+        self.payload = payload
+        self.attempts = attempts
+        self.token = token
+
+    def __repr__(self):
+        return f"Task({self.kind} {self.key!r}, attempt {self.attempts})"
+
+class WorkQueue(ABC):
+    """Work queue interface (lease/ack with visibility timeout and dead-lettering)"""
+
+    @abstractmethod
+    def put(self, kind, key, payload, requeue_done=False):
+        """Enqueue a task; returns True if it was added (or re-armed)"""
+
+    def put_many(self, kind, items, requeue_done=False):
+        """Enqueue (key, payload) pairs; returns the number added"""
+        return sum(self.put(kind, key, payload, requeue_done) for key, payload in items)
+
+    @abstractmethod
+    def lease(self, kind, worker_id, visibility_timeout=None):
+        """Take the next available task of a kind, or None"""
+
+    @abstractmethod
+    def ack(self, task, result=None):
+        """Mark a leased task done; False if the lease had already expired"""
+
+    @abstractmethod
+    def fail(self, task, error, retry_after=None):
+        """Release a leased task after an error; returns its new state ('ready' or 'dead')"""
+
+    @abstractmethod
+    def pending(self, kinds):
+        """Number of tasks of the given kinds that are ready or leased"""
+
+    def close(self):
+        pass
+
+class SqliteWorkQueue(WorkQueue):
+    """WorkQueue stored in a SQLite file shared by all worker processes"""
+
+    def __init__(self, path=WORK_QUEUE_FILE, visibility_timeout=WORK_QUEUE_VISIBILITY_TIMEOUT_S,
+                 max_attempts=WORK_QUEUE_MAX_ATTEMPTS, retry_delay=WORK_QUEUE_RETRY_DELAY_S):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        # Autocommit mode: transactions are opened explicitly (BEGIN IMMEDIATE for leases)
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+
+    def put(self, kind, key, payload, requeue_done=False):
+        now = time.time()
+        data = json.dumps(payload, ensure_ascii=False, default=json_default)
+        sql = ("INSERT INTO tasks (kind, task_key, payload, available_at, created_at, updated_at) "
+               "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (kind, task_key) DO ")
+        if requeue_done:
+            sql += ("UPDATE SET state='ready', attempts=0, payload=excluded.payload, available_at=excluded.available_at, "
+                    "result=NULL, last_error=NULL, updated_at=excluded.updated_at WHERE tasks.state='done'")
+        else:
+            sql += "NOTHING"
+        cursor = self._conn.execute(sql, (kind, str(key), data, now, now, now))
+        return cursor.rowcount > 0
+
+    def put_many(self, kind, items, requeue_done=False):
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            added = super().put_many(kind, items, requeue_done)
+        except BaseException:
+            self._conn.execute('ROLLBACK')
+            raise
+        self._conn.execute('COMMIT')
+        return added
+
+    def lease(self, kind, worker_id, visibility_timeout=None):
+        now = time.time()
+        timeout = visibility_timeout or self.visibility_timeout
+        token = uuid.uuid4().hex
+        self._conn.execute('BEGIN IMMEDIATE')  # Write lock: no other worker can lease the same row
+        try:
+            # Expired leases that used up their attempts go to the dead letters
+            self._conn.execute(
+                "UPDATE tasks SET state='dead', last_error=COALESCE(last_error, 'lease expired'), updated_at=? "
+                "WHERE kind=? AND state='leased' AND available_at<=? AND attempts>=?",
+                (now, kind, now, self.max_attempts))
+            row = self._conn.execute(
+                "SELECT id, task_key, payload, attempts FROM tasks "
+                "WHERE kind=? AND state IN ('ready', 'leased') AND available_at<=? "
+                "ORDER BY available_at, id LIMIT 1", (kind, now)).fetchone()
+            if row is None:
+                self._conn.execute('COMMIT')
+                return None
+            task_id, key, payload, attempts = row
+            self._conn.execute(
+                "UPDATE tasks SET state='leased', attempts=?, available_at=?, lease_owner=?, lease_token=?, updated_at=? "
+                "WHERE id=?", (attempts + 1, now + timeout, worker_id, token, now, task_id))
+        except BaseException:
+            self._conn.execute('ROLLBACK')
+            raise
+        self._conn.execute('COMMIT')
+        return Task(task_id, kind, key, json.loads(payload), attempts + 1, token)
+
+    def extend(self, task, visibility_timeout=None):
+        """Push a lease's expiry out (long-running task); False if the lease was lost"""
+        now = time.time()
+        cursor = self._conn.execute(
+            "UPDATE tasks SET available_at=?, updated_at=? WHERE id=? AND state='leased' AND lease_token=?",
+            (now + (visibility_timeout or self.visibility_timeout), now, task.id, task.token))
+        return cursor.rowcount > 0
+
+    def ack(self, task, result=None):
+        data = json.dumps(result, ensure_ascii=False, default=json_default) if result is not None else None
+        cursor = self._conn.execute(
+            "UPDATE tasks SET state='done', result=?, lease_token=NULL, updated_at=? "
+            "WHERE id=? AND state='leased' AND lease_token=?", (data, time.time(), task.id, task.token))
+        return cursor.rowcount > 0
+
+    def fail(self, task, error, retry_after=None):
+        now = time.time()
+        state = 'dead' if task.attempts >= self.max_attempts else 'ready'
+        delay = retry_after if retry_after is not None else self.retry_delay * task.attempts
+        cursor = self._conn.execute(
+            "UPDATE tasks SET state=?, available_at=?, last_error=?, lease_token=NULL, updated_at=? "
+            "WHERE id=? AND state='leased' AND lease_token=?",
+            (state, now + delay, str(error)[:500], now, task.id, task.token))
+        return state if cursor.rowcount else 'lost'
+
+    def pending(self, kinds):
+        placeholders = ','.join('?' * len(kinds))
+        return self._conn.execute(
+            f"SELECT COUNT(*) FROM tasks WHERE kind IN ({placeholders}) AND state IN ('ready', 'leased')",
+            tuple(kinds)).fetchone()[0]
+
+    def stats(self):
+        """Task counts per kind and state"""
+        counts = {}
+        for kind, state, count in self._conn.execute(
+                "SELECT kind, state, COUNT(*) FROM tasks GROUP BY kind, state ORDER BY kind, state"):
+            counts.setdefault(kind, {})[state] = count
+        return counts
+
+    def dead_letters(self, kind=None):
+        """Dead-lettered tasks: (kind, key, attempts, last_error)"""
+        sql = "SELECT kind, task_key, attempts, last_error FROM tasks WHERE state='dead'"
+        params = ()
+        if kind:
+            sql += " AND kind=?"
+            params = (kind,)
+        return self._conn.execute(sql + " ORDER BY updated_at", params).fetchall()
+
+    def retry_dead(self, kind=None):
+        """Make dead-lettered tasks available again; returns how many"""
+        sql = "UPDATE tasks SET state='ready', attempts=0, available_at=?, updated_at=? WHERE state='dead'"
+        now = time.time()
+        params = (now, now)
+        if kind:
+            sql += " AND kind=?"
+            params += (kind,)
+        return self._conn.execute(sql, params).rowcount
+
+    def results(self, kind):
+        """Results of the done tasks of a kind, in enqueue order"""
+        for (result,) in self._conn.execute(
+                "SELECT result FROM tasks WHERE kind=? AND state='done' AND result IS NOT NULL ORDER BY id", (kind,)):
+            yield json.loads(result)
+
+    def close(self):
+        self._conn.close()
+
+def open_queue(path=None):
+    """Open (creating if needed) the work queue"""
+    return SqliteWorkQueue(path or WORK_QUEUE_FILE)
+
+def worker_name():
+    """Worker ID recorded with leases: host:pid"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class TaskWriter:
+    """ListingWriter-compatible sink that enqueues listings as detail tasks
+
+    Lets the search worker reuse buyee_search.stream_listing_batch.
+    """
+
+    def __init__(self, queue):
+        self.queue = queue
+        self.count = 0
+        self.added = 0
+
+    def write_all(self, listings):
+        items = [(listing.get('listing_id') or listing.get('listing_url'), listing) for listing in listings]
+        self.added += self.queue.put_many(DETAIL, items)
+        self.count += len(items)
+
+def work(queue, kind, handler, worker_id=None, wait_for=(), poll_interval=WORK_QUEUE_POLL_INTERVAL_S):
+    """Lease and run tasks of one kind until the queue is drained
+
+    handler(task) returns the task result (acked) or raises (failed; a
+    ThrottledError's retry_after sets the backoff). The worker stops once no
+    task of `kind` or of the `wait_for` kinds (that produce more work) is
+    ready or leased.
+
+    Returns:
+        dict: done / retried / dead / lost counts
+    """
+    worker_id = worker_id or worker_name()
+    stats = {'done': 0, 'retried': 0, 'dead': 0, 'lost': 0}
+    while True:
+        task = queue.lease(kind, worker_id)
+        if task is None:
+            if not queue.pending((kind,) + tuple(wait_for)):
+                break
+            time.sleep(poll_interval)  # Other workers hold leases or are still producing tasks
+            continue
+        try:
+            result = handler(task)
+        except Exception as e:
+            state = queue.fail(task, e, getattr(e, 'retry_after', None))
+            stats['retried' if state == 'ready' else state] += 1
+            if state == 'dead':
+                log_error(f"Dead-lettered {task.kind} {task.key} after {task.attempts} attempts: {e}")
+            else:
+                log_warning(f"{task.kind} {task.key} failed (attempt {task.attempts}): {str(e)[:100]}")
+            continue
+        if queue.ack(task, result):
+            stats['done'] += 1
+        else:
+            stats['lost'] += 1  # Lease expired while running; another worker may have taken it
+            log_warning(f"Lease of {task.kind} {task.key} expired before ack")
+    return stats
+
+def parse_arguments():
+    """Parse command-line arguments"""
+    parser = argparse.ArgumentParser(
+        description='Inspect and manage the scraper work queue',
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('command', choices=['stats', 'dead', 'retry-dead', 'export'])
+    parser.add_argument('--queue', dest='queue_file', default=WORK_QUEUE_FILE,
+                        help=f'Queue database (default: {WORK_QUEUE_FILE})')
+    parser.add_argument('--kind', choices=[SEARCH_PAGE, DETAIL], help='Only this task kind')
+    parser.add_argument('-o', '--output', dest='output_file',
+                        default='validation/results/queue_details_results.json',
+                        help='export: results JSON of the done detail tasks')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    queue = open_queue(args.queue_file)
+    if args.command == 'stats':
+        print(json.dumps(queue.stats(), indent=2))
+    elif args.command == 'dead':
+        for kind, key, attempts, error in queue.dead_letters(args.kind):
+            print(f"{kind:<12} {key:<40} {attempts:>3}  {error}")
+    elif args.command == 'retry-dead':
+        log_info(f"Requeued {queue.retry_dead(args.kind)} dead-lettered tasks")
+    else:
+        # Same layout as buyee_details.py results, so downstream tools read it unchanged
+        listings = list(queue.results(DETAIL))
+        os.makedirs(os.path.dirname(args.output_file) or '.', exist_ok=True)
+        with open(args.output_file, 'w', encoding='utf-8') as f:
+            json.dump({'test_date': datetime.now().isoformat(), 'input_file': args.queue_file,
+                       'listings_found': len(listings), 'challenges': [], 'notes': [], 'sample_data': listings},
+                      f, indent=2, ensure_ascii=False)
+        log_info(f"Exported {len(listings)} listings to {args.output_file}")
+    queue.close()
+    sys.exit(0)
@@ -0,0 +1,6 @@
+"""pytest setup: the scrapers are flat modules imported from validation/scrapers"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,28 @@
+"""Tests for buyee_clusters.assign_clusters"""
+
+from buyee_clusters import assign_clusters
+
+
+def _listing(listing_id, title, shop_name):
+    return {'listing_id': listing_id, 'title': title, 'shop_name': shop_name}
+
+
+def test_different_models_and_same_shop_are_not_clustered():
+    listings = [
+        _listing('a', 'Nikon FM2 body black', 'Mercari'),
+        _listing('b', 'Nikon FM2 body silver', 'Mercari'),
+        _listing('c', 'Nikon FE2 body black', 'Rakuma'),
+    ]
+    assert assign_clusters(listings, confirm_with_image=False) == 0
+    assert [l['cluster_size'] for l in listings] == [1, 1, 1]
+    assert all(l['cluster_primary'] for l in listings)
+
+
+def test_same_camera_on_two_shops_is_clustered():
+    listings = [
+        _listing('a', 'Nikon FM2 body black', 'Mercari'),
+        _listing('b', 'Nikon FM2 black body', 'Rakuma'),
+    ]
+    assert assign_clusters(listings, confirm_with_image=False) == 1
+    assert [l['cluster_id'] for l in listings] == ['a', 'a']
+    assert [l['cluster_primary'] for l in listings] == [True, False]
@@ -0,0 +1,22 @@
+"""Tests for buyee_entities.EntityExtractor"""
+
+import pytest
+
+from buyee_entities import EntityExtractor
+
+
+@pytest.fixture(scope='module')
+def extractor():
+    return EntityExtractor()
+
+
+@pytest.mark.parametrize('title, brand, model, lens', [
+    ('Nikon Nikkor 50mm f/1.4 lens', 'Nikon', None, 'Nikkor 50mm F1.4'),
+    ('Nikon F body', 'Nikon', 'F', None),
+    ('Pentax SP 55mm F1.8', 'Pentax', 'Spotmatic', '55mm F1.8'),
+    ('Nikon SP rangefinder', 'Nikon', 'SP', None),
+    ('Nikon New FM2 Black Ai 50mm F1.4', 'Nikon', 'New FM2', 'Ai 50mm F1.4'),
+])
+def test_extract(extractor, title, brand, model, lens):
+    fields = extractor.extract(title)
+    assert (fields['brand'], fields['model'], fields['lens']) == (brand, model, lens)
@@ -0,0 +1,32 @@
+"""Tests for buyee_image_hash.split_known_relists"""
+
+import buyee_image_store
+from buyee_image_hash import ImageHashIndex, split_known_relists
+
+# Two thumbnails of the same camera: one bit apart
+HASHES = {'a.jpg': 0xF0F0F0F0F0F0F0F0, 'b.jpg': 0xF0F0F0F0F0F0F0F1}
+
+
+def _index(monkeypatch, entries=()):
+    monkeypatch.setattr(buyee_image_store, 'save_index', lambda: None)
+    index = ImageHashIndex(path=None, max_distance=4)
+    monkeypatch.setattr(index, 'hash_image_url', lambda url: (HASHES[url], None))
+    for entry in entries:
+        index._insert(dict(entry))
+    return index
+
+
+def _run(index):
+    listings = [
+        {'listing_id': 'A', 'image_url': 'a.jpg'},
+        {'listing_id': 'B', 'image_url': 'b.jpg'},
+    ]
+    _, relists = split_known_relists(listings, index)
+    return {listing['listing_id']: listing['relist_of'] for listing in relists}
+
+
+def test_original_is_not_flagged_on_later_runs(monkeypatch):
+    index = _index(monkeypatch)
+    assert _run(index) == {'B': 'A'}
+    # Second run over the same listings, with the index from the first
+    assert _run(_index(monkeypatch, index.entries)) == {'B': 'A'}